@@ -20,6 +20,7 @@ from arches.app.utils.date_utils import ExtendedDateFormat
 from arches.app.utils.module_importer import get_class_from_modulename
 from arches.app.utils.permission_backend import user_is_resource_reviewer
 from arches.app.utils.geo_utils import GeoUtils
+from arches.app.utils import mvt
 import arches.app.utils.task_management as task_management
 from arches.app.search.elasticsearch_dsl_builder import Query, Dsl, Bool, Match, Range, Term, Terms, Nested, Exists, RangeDSLException
 from arches.app.search.search_engine_factory import SearchEngineInstance as se
@@ -1119,12 +1120,34 @@ class GeojsonFeatureCollectionDataType(BaseDataType):
     def after_update_all(self, tile=None):
         with connection.cursor() as cursor:
             if tile is not None:
+                previous_extents = mvt.get_geometry_extents(tile.pk)
                 cursor.execute(
                     "SELECT * FROM refresh_tile_geojson_geometries(%s);",
                     [tile.pk],
                 )
+                extents = mvt.get_geometry_extents(tile.pk)
+                nodeids = set(previous_extents) | set(extents)
+                for node in models.Node.objects.filter(nodeid__in=nodeids):
+                    for extent in (previous_extents.get(str(node.pk)), extents.get(str(node.pk))):
+                        mvt.invalidate_tiles(node, extent)
+                        mvt.invalidate_clusters(node, extent)
             else:
                 cursor.execute("SELECT * FROM refresh_geojson_geometries();")
+                if settings.MVT_PRECOMPUTED_CLUSTERS is True:
+                    cursor.execute("SELECT * FROM refresh_geojson_geometry_clusters(%s);", [settings.CLUSTER_DISTANCE_MAX])
+                mvt.clear_tiles()
+
+    def post_tile_delete(self, tile, nodeid, index=True):
+        # the tile's rows in geojson_geometries have already been removed, so the extent comes from the tile data
+        if tile.data and tile.data.get(nodeid):
+            bounds = self.get_bounds_from_value(tile.data[nodeid])
+            if bounds is not None:
+                extent = Polygon.from_bbox(bounds)
+                extent.srid = 4326
+                extent.transform(3857)
+                node = models.Node.objects.get(pk=nodeid)
+                mvt.invalidate_tiles(node, extent.extent)
+                mvt.invalidate_clusters(node, extent.extent)
 
     def default_es_mapping(self):
         mapping = {
@@ -7,19 +7,35 @@ from django.utils.translation import ugettext as _
 
 
 class PrimaryDescriptorsFunction(BaseFunction):
-    def get_primary_descriptor_from_nodes(self, resource, config):
-        datatype_factory = None
+    def get_primary_descriptor_from_nodes(self, resource, config, tiles=None, nodes=None, datatype_factory=None):
+        """
+        Keyword Arguments:
+        tiles -- prefetched tiles of the resource, if supplied they are filtered in memory instead of querying the database
+        nodes -- prefetched nodes of the descriptor's nodegroup, if supplied they are used instead of querying the database
+        datatype_factory -- refernce to the DataTypeFactory instance
+
+        """
+
         try:
             if "nodegroup_id" in config and config["nodegroup_id"] != "" and config["nodegroup_id"] is not None:
-                tiles = models.TileModel.objects.filter(nodegroup_id=uuid.UUID(config["nodegroup_id"]), sortorder=0).filter(
-                    resourceinstance_id=resource.resourceinstanceid
-                )
-                if len(tiles) == 0:
-                    tiles = models.TileModel.objects.filter(nodegroup_id=uuid.UUID(config["nodegroup_id"])).filter(
+                nodegroup_id = uuid.UUID(config["nodegroup_id"])
+                if tiles is None:
+                    tiles = models.TileModel.objects.filter(nodegroup_id=nodegroup_id, sortorder=0).filter(
                         resourceinstance_id=resource.resourceinstanceid
                     )
+                    if len(tiles) == 0:
+                        tiles = models.TileModel.objects.filter(nodegroup_id=nodegroup_id).filter(
+                            resourceinstance_id=resource.resourceinstanceid
+                        )
+                else:
+                    nodegroup_tiles = [tile for tile in tiles if str(tile.nodegroup_id) == str(nodegroup_id)]
+                    tiles = [tile for tile in nodegroup_tiles if tile.sortorder == 0]
+                    if len(tiles) == 0:
+                        tiles = nodegroup_tiles
+                if nodes is None:
+                    nodes = models.Node.objects.filter(nodegroup_id=nodegroup_id)
                 for tile in tiles:
-                    for node in models.Node.objects.filter(nodegroup_id=uuid.UUID(config["nodegroup_id"])):
+                    for node in nodes:
                         data = {}
                         if len(list(tile.data.keys())) > 0:
                             data = tile.data
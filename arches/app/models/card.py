@@ -22,6 +22,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.forms import ModelForm
 from arches.app.models import models
 from arches.app.utils.betterJSONSerializer import JSONSerializer
+from arches.app.utils.permission_backend import has_perms
 from django.core.cache import cache
 
 
@@ -202,7 +203,7 @@ class Card(models.CardModel):
         return self
 
     def confirm_enabled_state(self, user, nodegroup):
-        if user.has_perms(["write_nodegroup"], self.nodegroup) is False:
+        if has_perms(user, "write_nodegroup", [self.nodegroup_id])[0] is False:
             self.disabled = True
 
     def get_edge_to_parent(self):
@@ -222,11 +223,11 @@ class Card(models.CardModel):
 
         """
         if user:
-            if user.has_perm(perm, self.nodegroup):
+            if has_perms(user, perm, [self.nodegroup_id])[0]:
                 self.confirm_enabled_state(user, self.nodegroup)
                 cards = []
-                for card in self.cards:
-                    if user.has_perm(perm, card.nodegroup):
+                for card, permitted in zip(self.cards, has_perms(user, perm, [card.nodegroup_id for card in self.cards])):
+                    if permitted:
                         card.confirm_enabled_state(user, card.nodegroup)
                         cards.append(card)
                 self.cards = cards
@@ -17,18 +17,23 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 import re
+import time
 import uuid
 import copy
+import threading
+from collections import OrderedDict
 from operator import itemgetter
 from operator import methodcaller
+from django.core.cache import cache
 from django.db import transaction, connection
 from django.db.models import Q
 from arches.app.models import models
 from arches.app.models.system_settings import settings
 from arches.app.search.search_engine_factory import SearchEngineInstance as se
-from arches.app.search.elasticsearch_dsl_builder import Term, Query, Bool, Match, Terms
+from arches.app.search.elasticsearch_dsl_builder import Term, Query
 from arches.app.search.mappings import CONCEPTS_INDEX
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
+from arches.app.utils.cache_version import get_cache_version, incr_cache_version_now_and_on_commit
 from django.utils.translation import ugettext as _
 from django.utils.translation import get_language
 from django.db import IntegrityError
@@ -44,6 +49,10 @@ CORE_CONCEPTS = (
     "00000000-0000-0000-0000-000000000006",
 )
 
+# preferred labels of concepts (and the concepts of value ids) recently used in this process, as (expiry time, value) tuples
+_preflabel_cache = OrderedDict()
+_preflabel_cache_lock = threading.Lock()
+
 
 class Concept(object):
     def __init__(self, *args, **kwargs):
@@ -397,6 +406,7 @@ class Concept(object):
                         node.save()
 
                 models.Concept.objects.get(pk=key).delete()
+        clear_preflabel_cache()
         return
 
     def add_relation(self, concepttorelate, relationtype):
@@ -495,7 +505,8 @@ class Concept(object):
         languageid=None,
     ):
         """
-        Recursively builds a list of concept relations for a given concept and all it's subconcepts based on its relationship type and valuetypes.
+        Builds a list of concept relations for a given concept and all it's subconcepts based on its relationship type and valuetypes,
+        read from the concept closure (see models.ConceptClosure)
 
         """
 
@@ -505,178 +516,103 @@ class Concept(object):
         except:
             return []
 
+        refresh_concept_closure()
         languageid = get_language() if languageid is None else languageid
-        relationtypes = " or ".join(["r.relationtype = '%s'" % (relationtype) for relationtype in relationtypes])
-        depth_limit = "and depth < %s" % depth_limit if depth_limit else ""
-        child_valuetypes = ("','").join(
-            child_valuetypes if child_valuetypes else models.DValueType.objects.filter(category="label").values_list("valuetype", flat=True)
-        )
-        limit_clause = " limit %s offset %s" % (limit, offset) if offset is not None else ""
+        params = {
+            "conceptid": conceptid,
+            "hierarchy": _get_concept_hierarchy(relationtypes),
+            "depth_limit": depth_limit,
+            "limit": limit,
+            "offset": offset,
+        }
+        limit_clause = "LIMIT %(limit)s OFFSET %(offset)s" if offset is not None else ""
 
         if order_hierarchically:
             sql = """
-                WITH RECURSIVE
-
-                 ordered_relationships AS (
-                    (
-                        SELECT r.conceptidfrom, r.conceptidto, r.relationtype, (
-                            SELECT value
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('prefLabel')
-                            ORDER BY (
-                                CASE WHEN languageid = '{languageid}' THEN 10
-                                WHEN languageid like '{short_languageid}%' THEN 5
-                                WHEN languageid like '{default_languageid}%' THEN 2
-                                ELSE 0
-                                END
-                            ) desc limit 1
-                        ) as valuesto,
-                        (
-                            SELECT value::int
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('sortorder')
-                            limit 1
-                        ) as sortorder,
-                        (
-                            SELECT value
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('collector')
-                            limit 1
-                        ) as collector
-                        FROM relations r
-                        WHERE r.conceptidfrom = '{conceptid}'
-                        and ({relationtypes})
-                        ORDER BY sortorder, valuesto
-                    )
-                    UNION
-                    (
-                        SELECT r.conceptidfrom, r.conceptidto, r.relationtype,(
-                            SELECT value
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('prefLabel')
-                            ORDER BY (
-                                CASE WHEN languageid = '{languageid}' THEN 10
-                                WHEN languageid like '{short_languageid}%' THEN 5
-                                WHEN languageid like '{default_languageid}%' THEN 2
-                                ELSE 0
-                                END
-                            ) desc limit 1
-                        ) as valuesto,
-                        (
-                            SELECT value::int
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('sortorder')
-                            limit 1
-                        ) as sortorder,
-                        (
-                            SELECT value
-                            FROM values
-                            WHERE conceptid=r.conceptidto
-                            AND valuetype in ('collector')
-                            limit 1
-                        ) as collector
-                        FROM relations r
-                        JOIN ordered_relationships b ON(b.conceptidto = r.conceptidfrom)
-                        WHERE ({relationtypes})
-                        ORDER BY sortorder, valuesto
-                    )
+                WITH matches AS (
+                    SELECT DISTINCT m.descendantid
+                    FROM concept_closure m
+                    JOIN values v ON(v.conceptid = m.descendantid)
+                    WHERE m.ancestorid = %(conceptid)s
+                    AND m.hierarchy = %(hierarchy)s
+                    {match_depth_limit}
+                    AND v.valuetype = 'prefLabel'
+                    AND LOWER(v.value) LIKE %(query)s
                 ),
 
-                children AS (
-                    SELECT r.conceptidfrom, r.conceptidto,
-                        to_char(row_number() OVER (), 'fm000000') as row,
-                        r.collector,
-                        1 AS depth       ---|NonRecursive Part
-                        FROM ordered_relationships r
-                        WHERE r.conceptidfrom = '{conceptid}'
-                        and ({relationtypes})
-                    UNION
-                        SELECT r.conceptidfrom, r.conceptidto,
-                        row || '-' || to_char(row_number() OVER (), 'fm000000'),
-                        r.collector,
-                        depth+1      ---|RecursivePart
-                        FROM ordered_relationships r
-                        JOIN children b ON(b.conceptidto = r.conceptidfrom)
-                        WHERE ({relationtypes})
-                        {depth_limit}
+                page AS (
+                    SELECT c.descendantid, c.depth, c.path, count(*) OVER() AS full_count
+                    FROM concept_closure c
+                    WHERE c.ancestorid = %(conceptid)s
+                    AND c.hierarchy = %(hierarchy)s
+                    {depth_limit}
+                    {query_clause}
+                    ORDER BY c.path {limit_clause}
                 )
 
-                {subquery}
-
                 SELECT
                 (
                     select row_to_json(d)
                     FROM (
                         SELECT *
                         FROM values
-                        WHERE conceptid={recursive_table}.conceptidto
+                        WHERE conceptid = page.descendantid
                         AND valuetype in ('prefLabel')
                         ORDER BY (
-                            CASE WHEN languageid = '{languageid}' THEN 10
-                            WHEN languageid like '{short_languageid}%' THEN 5
-                            WHEN languageid like '{default_languageid}%' THEN 2
+                            CASE WHEN languageid = %(languageid)s THEN 10
+                            WHEN languageid like %(short_languageid)s THEN 5
+                            WHEN languageid like %(default_languageid)s THEN 2
                             ELSE 0
                             END
                         ) desc limit 1
                     ) d
                 ) as valueto,
-                depth, collector, count(*) OVER() AS full_count
-
-               FROM {recursive_table} order by row {limit_clause};
-
+                depth,
+                (
+                    SELECT value
+                    FROM values
+                    WHERE conceptid = page.descendantid
+                    AND valuetype in ('collector')
+                    limit 1
+                ) as collector,
+                full_count
+                FROM page order by path;
             """
 
-            subquery = (
-                """, results as (
-                SELECT c.conceptidfrom, c.conceptidto, c.row, c.depth, c.collector
-                FROM children c
-                JOIN values ON(values.conceptid = c.conceptidto)
-                WHERE LOWER(values.value) like '%%%s%%'
-                AND values.valuetype in ('prefLabel')
-                    UNION
-                SELECT c.conceptidfrom, c.conceptidto, c.row, c.depth, c.collector
-                FROM children c
-                JOIN results r on (r.conceptidfrom=c.conceptidto)
-            )"""
-                % query.lower()
-                if query is not None
-                else ""
-            )
-
-            recursive_table = "results" if query else "children"
+            # matching concepts are listed along with the concepts above them so they are shown in context
+            query_clause = """
+                AND (
+                    c.descendantid IN (SELECT descendantid FROM matches)
+                    OR EXISTS (
+                        SELECT 1 FROM concept_closure x
+                        WHERE x.ancestorid = c.descendantid
+                        AND x.hierarchy = c.hierarchy
+                        AND x.descendantid IN (SELECT descendantid FROM matches)
+                    )
+                )
+            """
 
             sql = sql.format(
-                conceptid=conceptid,
-                relationtypes=relationtypes,
-                child_valuetypes=child_valuetypes,
-                parent_valuetype=parent_valuetype,
-                depth_limit=depth_limit,
+                depth_limit="AND c.depth <= %(depth_limit)s" if depth_limit else "",
+                match_depth_limit="AND m.depth <= %(depth_limit)s" if depth_limit else "",
+                query_clause=query_clause if query is not None else "",
                 limit_clause=limit_clause,
-                subquery=subquery,
-                recursive_table=recursive_table,
+            )
+            params.update(
+                query="%{0}%".format(query.lower()) if query is not None else None,
                 languageid=languageid,
-                short_languageid=languageid.split("-")[0],
-                default_languageid=settings.LANGUAGE_CODE,
+                short_languageid=languageid.split("-")[0] + "%",
+                default_languageid=settings.LANGUAGE_CODE + "%",
             )
 
         else:
             sql = """
-                WITH RECURSIVE
+                WITH
                     children AS (
-                        SELECT r.conceptidfrom, r.conceptidto, r.relationtype, 1 AS depth
-                            FROM relations r
-                            WHERE r.conceptidfrom = '{conceptid}'
-                            AND ({relationtypes})
-                        UNION
-                            SELECT r.conceptidfrom, r.conceptidto, r.relationtype, depth+1
-                            FROM relations r
-                            JOIN children c ON(c.conceptidto = r.conceptidfrom)
-                            WHERE ({relationtypes})
+                        SELECT DISTINCT c.parentid AS conceptidfrom, c.descendantid AS conceptidto
+                            FROM concept_closure c
+                            WHERE c.ancestorid = %(conceptid)s
+                            AND c.hierarchy = %(hierarchy)s
                             {depth_limit}
                     ),
                     results AS (
@@ -692,8 +628,8 @@ class Concept(object):
                             JOIN children c ON(c.conceptidto = valueto.conceptid)
                             JOIN values valuefrom ON(c.conceptidfrom = valuefrom.conceptid)
                             JOIN d_value_types dtypesfrom ON(dtypesfrom.valuetype = valuefrom.valuetype)
-                        WHERE valueto.valuetype in ('{child_valuetypes}')
-                        AND valuefrom.valuetype in ('{child_valuetypes}')
+                        WHERE valueto.valuetype = ANY(%(child_valuetypes)s)
+                        AND valuefrom.valuetype = ANY(%(child_valuetypes)s)
                     )
                     SELECT distinct {columns}
                     FROM results {limit_clause}
@@ -711,19 +647,41 @@ class Concept(object):
                 """
 
             sql = sql.format(
-                conceptid=conceptid,
-                relationtypes=relationtypes,
-                child_valuetypes=child_valuetypes,
-                columns=columns,
-                depth_limit=depth_limit,
-                limit_clause=limit_clause,
+                columns=columns, depth_limit="AND c.depth <= %(depth_limit)s" if depth_limit else "", limit_clause=limit_clause,
             )
+            if not child_valuetypes:
+                child_valuetypes = models.DValueType.objects.filter(category="label").values_list("valuetype", flat=True)
+            params["child_valuetypes"] = list(child_valuetypes)
 
         cursor = connection.cursor()
-        cursor.execute(sql)
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
         return rows
 
+    def get_child_conceptids(self, conceptid, relationtypes=("narrower", "hasTopConcept"), depth_limit=None):
+        """
+        Returns the ids of all the concepts below a concept, read from the concept closure (see models.ConceptClosure)
+
+        Arguments:
+        conceptid -- the id of the concept
+
+        Keyword Arguments:
+        relationtypes -- the relation types followed down from the concept eg: ["member"] for the members of a collection
+        depth_limit -- only return concepts at most this many levels below the concept
+
+        """
+
+        try:
+            uuid.UUID(str(conceptid))
+        except ValueError:
+            return []
+
+        refresh_concept_closure()
+        closure = models.ConceptClosure.objects.filter(ancestorid=conceptid, hierarchy=_get_concept_hierarchy(relationtypes))
+        if depth_limit:
+            closure = closure.filter(depth__lte=depth_limit)
+        return [str(descendantid) for descendantid in closure.order_by().values_list("descendantid", flat=True).distinct()]
+
     def traverse(self, func, direction="down", scope=None, **kwargs):
         """
         Traverses a concept graph from self to leaf (direction='down') or root (direction='up') calling
@@ -927,84 +885,76 @@ class Concept(object):
                 self.load_on_demand = False
                 self.children = []
 
-        def _findNarrowerConcept(conceptid, depth_limit=None, level=0):
-            labels = models.Value.objects.filter(concept=conceptid)
-            ret = concept()
-            temp = Concept()
-            for label in labels:
-                temp.addvalue(label)
+        def _findNarrowerConcepts(conceptids, depth_limit=None, level=0):
+            # each level of the tree is loaded with one query for the values and one for the relations of all its concepts
+            temps = {conceptid: Concept() for conceptid in conceptids}
+            sortorders = {}
+            for label in models.Value.objects.filter(concept_id__in=conceptids):
+                temps[str(label.concept_id)].addvalue(label)
                 if label.valuetype_id == "sortorder":
                     try:
-                        ret.sortorder = float(label.value)
+                        sortorders[str(label.concept_id)] = float(label.value)
                     except:
-                        ret.sortorder = None
-
-            label = temp.get_preflabel(lang=lang)
-            ret.label = label.value
-            ret.id = label.conceptid
-            ret.labelid = label.id
+                        sortorders[str(label.concept_id)] = None
 
             if mode == "semantic":
                 conceptrealations = models.Relation.objects.filter(
-                    Q(conceptfrom=conceptid), Q(relationtype__category="Semantic Relations") | Q(relationtype__category="Properties")
+                    Q(conceptfrom_id__in=conceptids),
+                    Q(relationtype__category="Semantic Relations") | Q(relationtype__category="Properties"),
                 )
             if mode == "collections":
                 conceptrealations = models.Relation.objects.filter(
-                    Q(conceptfrom=conceptid), Q(relationtype="member") | Q(relationtype="hasCollection")
+                    Q(conceptfrom_id__in=conceptids), Q(relationtype="member") | Q(relationtype="hasCollection")
                 )
-            if depth_limit is not None and len(conceptrealations) > 0 and level >= depth_limit:
-                ret.load_on_demand = True
-            else:
-                if depth_limit is not None:
-                    level = level + 1
-                for relation in conceptrealations:
-                    ret.children.append(_findNarrowerConcept(relation.conceptto_id, depth_limit=depth_limit, level=level))
-
-                ret.children = sorted(
-                    ret.children,
-                    key=lambda concept: self.natural_keys(concept.sortorder if concept.sortorder else concept.label),
-                    reverse=False,
+            children = {conceptid: [] for conceptid in conceptids}
+            for conceptfromid, concepttoid in conceptrealations.values_list("conceptfrom_id", "conceptto_id"):
+                children[str(conceptfromid)].append(str(concepttoid))
+
+            expand = [
+                conceptid for conceptid in conceptids if depth_limit is None or len(children[conceptid]) == 0 or level < depth_limit
+            ]
+            child_concepts = iter(
+                _findNarrowerConcepts(
+                    [childid for conceptid in expand for childid in children[conceptid]],
+                    depth_limit=depth_limit,
+                    level=level + 1 if depth_limit is not None else level,
                 )
-            return ret
-
-        def _findBroaderConcept(conceptid, child_concept, depth_limit=None, level=0):
-            conceptrealations = models.Relation.objects.filter(
-                Q(conceptto=conceptid), ~Q(relationtype="related"), ~Q(relationtype__category="Mapping Properties")
+                if len(expand) > 0
+                else []
             )
-            if len(conceptrealations) > 0 and conceptid != top_concept:
-                labels = models.Value.objects.filter(concept=conceptrealations[0].conceptfrom_id)
-                ret = concept()
-                temp = Concept()
-                for label in labels:
-                    temp.addvalue(label)
-                label = temp.get_preflabel(lang=lang)
-                ret.label = label.value
-                ret.id = label.conceptid
-                ret.labelid = label.id
-
-                ret.children.append(child_concept)
-                return _findBroaderConcept(conceptrealations[0].conceptfrom_id, ret, depth_limit=depth_limit, level=level)
-            else:
-                return child_concept
+
+            ret = []
+            for conceptid in conceptids:
+                node = concept()
+                label = temps[conceptid].get_preflabel(lang=lang)
+                node.label = label.value
+                node.id = label.conceptid
+                node.labelid = label.id
+                node.sortorder = sortorders.get(conceptid)
+                if conceptid in expand:
+                    node.children = sorted(
+                        [next(child_concepts) for childid in children[conceptid]],
+                        key=lambda concept: self.natural_keys(concept.sortorder if concept.sortorder else concept.label),
+                        reverse=False,
+                    )
+                else:
+                    node.load_on_demand = True
+                ret.append(node)
+            return ret
 
         graph = []
         if self.id is None or self.id == "" or self.id == "None" or self.id == top_concept:
             if mode == "semantic":
                 concepts = models.Concept.objects.filter(nodetype="ConceptScheme")
-                for conceptmodel in concepts:
-                    graph.append(_findNarrowerConcept(conceptmodel.pk, depth_limit=1))
+                graph = _findNarrowerConcepts([str(conceptmodel.pk) for conceptmodel in concepts], depth_limit=1)
             if mode == "collections":
                 concepts = models.Concept.objects.filter(nodetype="Collection")
-                for conceptmodel in concepts:
-                    graph.append(_findNarrowerConcept(conceptmodel.pk, depth_limit=0))
+                graph = _findNarrowerConcepts([str(conceptmodel.pk) for conceptmodel in concepts], depth_limit=0)
 
                 graph = sorted(graph, key=lambda concept: concept.label)
-                # graph = _findNarrowerConcept(concepts[0].pk, depth_limit=1).children
 
         else:
-            graph = _findNarrowerConcept(self.id, depth_limit=1).children
-            # concepts = _findNarrowerConcept(self.id, depth_limit=1)
-            # graph = [_findBroaderConcept(self.id, concepts, depth_limit=1)]
+            graph = _findNarrowerConcepts([str(self.id)], depth_limit=1)[0].children
 
         return graph
 
@@ -1339,6 +1289,8 @@ class ConceptValue(object):
 
             value.save()
             self.category = value.valuetype.category
+            if self.type == "prefLabel":
+                clear_preflabel_cache()
 
     def delete(self):
         if self.id != "":
@@ -1346,6 +1298,8 @@ class ConceptValue(object):
             if newvalue.valuetype.valuetype == "image":
                 newvalue = models.FileValue.objects.get(pk=self.id)
             newvalue.delete()
+            if newvalue.valuetype_id == "prefLabel":
+                clear_preflabel_cache()
             self = ConceptValue()
             return self
 
@@ -1392,6 +1346,71 @@ class ConceptValue(object):
 
 
 def get_preflabel_from_conceptid(conceptid, lang):
+    return get_preflabels([conceptid], lang)[str(conceptid)]
+
+
+def get_preflabels(conceptids, lang):
+    """
+    Returns a dictionary of concept id to the preferred label of each concept in the given language
+    (or the default language if there isn't a label in the given language), labels are looked up in bulk and cached
+
+    Arguments:
+    conceptids -- a list of concept ids
+    lang -- the language of the labels to return
+
+    """
+
+    conceptids = [str(conceptid) for conceptid in conceptids]
+    labels = _get_cached_values("preflabels", conceptids, _load_preflabels)
+    return {conceptid: _select_preflabel(labels.get(conceptid, []), lang) for conceptid in conceptids}
+
+
+def get_preflabels_from_valueids(valueids, lang):
+    """
+    Returns a dictionary of value id to the preferred label (in the given language) of the concept each value belongs to,
+    the label of a value that doesn't exist is None
+
+    Arguments:
+    valueids -- a list of value ids
+    lang -- the language of the labels to return
+
+    """
+
+    valueids = [str(valueid) for valueid in valueids]
+    conceptids = _get_cached_values("conceptid", valueids, _load_conceptids)
+    preflabels = get_preflabels(set(conceptids.values()), lang)
+    return {valueid: preflabels[conceptids[valueid]] if valueid in conceptids else None for valueid in valueids}
+
+
+def refresh_concept_closure():
+    """
+    Rebuilds the concept closure paths of the concepts queued in ConceptClosureQueue (see models.ConceptClosure),
+    called before the concept closure is read, returns False if there was nothing to rebuild
+
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT refresh_concept_closure(%s)", [settings.LANGUAGE_CODE])
+        return cursor.fetchone()[0]
+
+
+def _get_concept_hierarchy(relationtypes):
+    for hierarchy, hierarchy_relationtypes in models.CONCEPT_HIERARCHIES.items():
+        if set(relationtypes) <= set(hierarchy_relationtypes):
+            return hierarchy
+    raise ValueError(_("Concept relations of type {0} aren't part of a concept hierarchy").format(", ".join(relationtypes)))
+
+
+def clear_preflabel_cache():
+    """
+    Removes all cached concept labels (in every process), called whenever a concept or one of its preferred labels changes
+
+    """
+
+    incr_cache_version_now_and_on_commit("concept_preflabels")
+
+
+def _select_preflabel(preflabels, lang):
     ret = None
     default = {
         "category": "",
@@ -1401,25 +1420,95 @@ def get_preflabel_from_conceptid(conceptid, lang):
         "type": "",
         "id": "",
     }
-    query = Query(se)
-    bool_query = Bool()
-    bool_query.must(Match(field="type", query="prefLabel", type="phrase"))
-    bool_query.filter(Terms(field="conceptid", terms=[conceptid]))
-    query.add_query(bool_query)
-    preflabels = query.search(index=CONCEPTS_INDEX)["hits"]["hits"]
     for preflabel in preflabels:
-        default = preflabel["_source"]
-        if preflabel["_source"]["language"] is not None and lang is not None:
+        default = preflabel
+        if preflabel["language"] is not None and lang is not None:
             # get the label in the preferred language, otherwise get the label in the default language
-            if preflabel["_source"]["language"] == lang:
-                return preflabel["_source"]
-            if preflabel["_source"]["language"].split("-")[0] == lang.split("-")[0]:
-                ret = preflabel["_source"]
-            if preflabel["_source"]["language"] == settings.LANGUAGE_CODE and ret is None:
-                ret = preflabel["_source"]
+            if preflabel["language"] == lang:
+                return preflabel
+            if preflabel["language"].split("-")[0] == lang.split("-")[0]:
+                ret = preflabel
+            if preflabel["language"] == settings.LANGUAGE_CODE and ret is None:
+                ret = preflabel
     return default if ret is None else ret
 
 
+def _load_preflabels(conceptids):
+    ret = {conceptid: [] for conceptid in conceptids}
+    values = models.Value.objects.filter(concept_id__in=conceptids, valuetype_id="prefLabel").values_list(
+        "valueid", "concept_id", "value", "language_id"
+    )
+    for valueid, conceptid, value, language in values:
+        ret[str(conceptid)].append(
+            {
+                "category": "label",
+                "conceptid": str(conceptid),
+                "language": language,
+                "value": value,
+                "type": "prefLabel",
+                "id": str(valueid),
+            }
+        )
+    return ret
+
+
+def _load_conceptids(valueids):
+    valueids = [valueid for valueid in valueids if _is_uuid(valueid)]
+    values = models.Value.objects.filter(pk__in=valueids).values_list("pk", "concept_id")
+    return {str(valueid): str(conceptid) for valueid, conceptid in values}
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+        return True
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def _get_cached_values(prefix, ids, load):
+    """
+    Returns a dictionary of id to cached value, first from an LRU cache local to this process,
+    then from the shared cache and finally using the load function for any ids still missing,
+    the cache version is checked on every call so labels cleared by another process are never returned
+    and values expire from the local cache after settings.CONCEPT_PREFLABEL_CACHE_TIMEOUT like they do from the shared cache
+
+    """
+
+    version = get_cache_version("concept_preflabels")
+    keys = {id: f"concept_{prefix}_{version}_{id}" for id in ids}
+    ret = {}
+    now = time.monotonic()
+    with _preflabel_cache_lock:
+        for id, key in keys.items():
+            if key in _preflabel_cache:
+                expires, value = _preflabel_cache[key]
+                if expires > now:
+                    _preflabel_cache.move_to_end(key)
+                    ret[id] = value
+                else:
+                    del _preflabel_cache[key]
+
+    missing = {key: id for id, key in keys.items() if id not in ret}
+    if len(missing) > 0:
+        found = {missing[key]: value for key, value in cache.get_many(list(missing.keys())).items()}
+        loaded = load([id for id in missing.values() if id not in found])
+        # labels read inside a transaction may yet be rolled back, so they aren't cached
+        if not connection.in_atomic_block:
+            cache.set_many({keys[id]: value for id, value in loaded.items()}, settings.CONCEPT_PREFLABEL_CACHE_TIMEOUT)
+            found.update(loaded)
+            with _preflabel_cache_lock:
+                expires = now + settings.CONCEPT_PREFLABEL_CACHE_TIMEOUT
+                for id, value in found.items():
+                    _preflabel_cache[keys[id]] = (expires, value)
+                while len(_preflabel_cache) > settings.CONCEPT_PREFLABEL_CACHE_SIZE:
+                    _preflabel_cache.popitem(last=False)
+        else:
+            found.update(loaded)
+        ret.update(found)
+    return ret
+
+
 def get_valueids_from_concept_label(label, conceptid=None, lang=None):
 
     def exact_val_match(val, conceptid=None):
@@ -1447,6 +1536,4 @@ def get_valueids_from_concept_label(label, conceptid=None, lang=None):
 
 
 def get_preflabel_from_valueid(valueid, lang):
-    concept_label = se.search(index=CONCEPTS_INDEX, id=valueid)
-    if concept_label["found"]:
-        return get_preflabel_from_conceptid(concept_label["_source"]["conceptid"], lang)
+    return get_preflabels_from_valueids([valueid], lang)[str(valueid)]
@@ -24,13 +24,14 @@ from copy import copy, deepcopy
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.db.utils import IntegrityError
 from arches.app.models import models
 from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
 from arches.app.datatypes.datatypes import DataTypeFactory
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from django.utils.translation import ugettext as _
 from pyld.jsonld import compact, JsonLdError
 
@@ -365,7 +366,7 @@ class Graph(models.GraphModel):
             for nodegroup in self.get_nodegroups():
                 nodegroup.save()
 
-            se = SearchEngineFactory().create()
+            se = SearchEngineInstance
             datatype_factory = DataTypeFactory()
 
             if nodeid is not None:
@@ -1199,12 +1200,34 @@ class Graph(models.GraphModel):
             if card.nodegroup.parentnodegroup is None:
                 return card
 
+    def get_nodegroups_with_tiles(self):
+        """
+        returns the ids (as strings) of the node groups of this graph that tiles have been saved to, found with a single query
+
+        """
+
+        nodegroupids = {node.nodegroup_id for node in self.nodes.values() if node.nodegroup_id is not None}
+        nodegroups = (
+            models.NodeGroup.objects.filter(pk__in=nodegroupids)
+            .annotate(has_tiles=Exists(models.TileModel.objects.filter(nodegroup_id=OuterRef("pk"))))
+            .filter(has_tiles=True)
+        )
+        return {str(nodegroupid) for nodegroupid in nodegroups.values_list("pk", flat=True)}
+
     def get_cards(self, check_if_editable=True):
         """
         get the card data (if any) associated with this graph
 
         """
 
+        nodegroups_with_tiles = None
+        if check_if_editable and self.isresource and settings.OVERRIDE_RESOURCE_MODEL_LOCK is not True:
+            nodegroups_with_tiles = self.get_nodegroups_with_tiles()
+
+        constraints = {}
+        for constraint in models.ConstraintModel.objects.filter(card_id__in=[card.pk for card in self.cards.values()]):
+            constraints.setdefault(constraint.card_id, []).append(constraint)
+
         cards = []
         for card in self.cards.values():
             is_editable = True
@@ -1217,7 +1240,7 @@ class Graph(models.GraphModel):
                     except KeyError as e:
                         print("Error: card.description not accessible, nodegroup_id not in self.nodes: ", e)
                 if check_if_editable:
-                    is_editable = card.is_editable()
+                    is_editable = card.is_editable(nodegroups_with_tiles)
             else:
                 if card.nodegroup.parentnodegroup_id is None:
                     card.name = self.name
@@ -1229,8 +1252,7 @@ class Graph(models.GraphModel):
                         card.description = self.nodes[card.nodegroup_id].description
             card_dict = JSONSerializer().serializeToPython(card)
             card_dict["is_editable"] = is_editable
-            card_constraints = card.constraintmodel_set.all()
-            card_dict["constraints"] = JSONSerializer().serializeToPython(card_constraints)
+            card_dict["constraints"] = JSONSerializer().serializeToPython(constraints.get(card.pk, []))
             cards.append(card_dict)
 
         return cards
@@ -1266,7 +1288,8 @@ class Graph(models.GraphModel):
             ret.pop("relatable_resource_model_ids", None)
 
         check_if_editable = "is_editable" not in exclude
-        ret["is_editable"] = self.is_editable() if check_if_editable else ret.pop("is_editable", None)
+        is_editable = self.is_editable() if check_if_editable else ret.pop("is_editable", None)
+        ret["is_editable"] = is_editable
         ret["cards"] = self.get_cards(check_if_editable=check_if_editable) if "cards" not in exclude else ret.pop("cards", None)
 
         if "widgets" not in exclude:
@@ -1275,7 +1298,7 @@ class Graph(models.GraphModel):
         ret["domain_connections"] = (
             self.get_valid_domain_ontology_classes() if "domain_connections" not in exclude else ret.pop("domain_connections", None)
         )
-        ret["is_editable"] = self.is_editable() if "is_editable" not in exclude else ret.pop("is_editable", None)
+        ret["is_editable"] = is_editable
         ret["functions"] = (
             models.FunctionXGraph.objects.filter(graph_id=self.graphid) if "functions" not in exclude else ret.pop("functions", None)
         )
@@ -1356,7 +1379,7 @@ class Graph(models.GraphModel):
                         1006,
                     )
 
-    def _validate_node_name(self, node):
+    def _validate_node_name(self, node, nodegroups_with_tiles=None):
         """
         Verifies a node's name is unique to its nodegroup
         Prevents a user from changing the name of a node that already has tiles.
@@ -1371,7 +1394,7 @@ class Graph(models.GraphModel):
             if len(names_in_nodegroup) > len(unique_names_in_nodegroup):
                 message = _('Duplicate node name: "{0}". All node names in a card must be unique.'.format(node.name))
                 raise GraphValidationError(message)
-            elif node.is_editable() is False:
+            elif node.is_editable(nodegroups_with_tiles) is False:
                 if node.name != models.Node.objects.values_list("name", flat=True).get(pk=node.nodeid):
                     message = "The name of this node cannot be changed because business data has already been saved to a card that this node is part of."
                     raise GraphValidationError(_(message))
@@ -1433,8 +1456,9 @@ class Graph(models.GraphModel):
             return fieldname
 
         fieldnames = {}
+        nodegroups_with_tiles = self.get_nodegroups_with_tiles() if settings.OVERRIDE_RESOURCE_MODEL_LOCK is not True else None
         for node_id, node in self.nodes.items():
-            self._validate_node_name(node)
+            self._validate_node_name(node, nodegroups_with_tiles)
             if node.exportable is True:
                 if node.fieldname is not None:
                     validated_fieldname = validate_fieldname(node.fieldname, fieldnames)
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7128_resource_instance_filter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResourceIndexQueue",
+            fields=[
+                ("queueid", models.BigAutoField(primary_key=True, serialize=False)),
+                ("resourceinstanceid", models.UUIDField(db_index=True)),
+                ("createdtime", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={"db_table": "resource_index_queue", "managed": True},
+        ),
+    ]
@@ -0,0 +1,134 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7460_resource_index_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeoJSONGeometryCluster",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("zoom", models.IntegerField()),
+                ("total", models.IntegerField()),
+                ("geom", django.contrib.gis.db.models.fields.GeometryField(srid=3857)),
+                ("extent", models.TextField(blank=True, null=True)),
+                ("bbox", django.contrib.gis.db.models.fields.GeometryField(null=True, srid=3857)),
+                (
+                    "node",
+                    models.ForeignKey(db_column="nodeid", on_delete=django.db.models.deletion.CASCADE, to="models.Node"),
+                ),
+                (
+                    "resourceinstance",
+                    models.ForeignKey(
+                        db_column="resourceinstanceid",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="models.ResourceInstance",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "geojson_geometry_clusters",
+                "managed": True,
+                "index_together": {("node", "zoom")},
+            },
+        ),
+        migrations.CreateModel(
+            name="GeoJSONGeometryClusterInvalidation",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("zoom", models.IntegerField()),
+                ("geom", django.contrib.gis.db.models.fields.GeometryField(srid=3857)),
+                (
+                    "node",
+                    models.ForeignKey(db_column="nodeid", on_delete=django.db.models.deletion.CASCADE, to="models.Node"),
+                ),
+            ],
+            options={
+                "db_table": "geojson_geometry_cluster_invalidations",
+                "managed": True,
+                "index_together": {("node", "zoom")},
+            },
+        ),
+        migrations.RunSQL(
+            """
+            CREATE OR REPLACE FUNCTION refresh_geojson_geometry_clusters(max_distance DOUBLE PRECISION) RETURNS BOOLEAN AS $$
+                    DECLARE
+                        cluster_node RECORD;
+                        cluster_zoom INTEGER;
+                        distance DOUBLE PRECISION;
+                    BEGIN
+                        TRUNCATE TABLE geojson_geometry_clusters, geojson_geometry_cluster_invalidations;
+
+                        FOR cluster_node IN
+                            SELECT nodeid, config FROM nodes WHERE datatype = 'geojson-feature-collection'::text
+                        LOOP
+                            FOR cluster_zoom IN 0..COALESCE((cluster_node.config->>'clusterMaxZoom')::INTEGER, -1) LOOP
+                                -- the same distance (in meters) as MVT.get uses for the zoom level
+                                distance := LEAST(
+                                    40075016.6856 / ((1 << cluster_zoom) * 256) * (cluster_node.config->>'clusterDistance')::DOUBLE PRECISION,
+                                    max_distance
+                                );
+
+                                INSERT INTO geojson_geometry_clusters(
+                                    nodeid,
+                                    zoom,
+                                    resourceinstanceid,
+                                    total,
+                                    geom,
+                                    extent,
+                                    bbox
+                                )
+                                WITH clusters AS (
+                                    SELECT resourceinstanceid,
+                                        geom,
+                                        ST_ClusterDBSCAN(
+                                            geom,
+                                            eps := distance,
+                                            minpoints := (cluster_node.config->>'clusterMinPoints')::INTEGER
+                                        ) over () AS cid
+                                    FROM geojson_geometries
+                                    WHERE nodeid = cluster_node.nodeid
+                                )
+                                SELECT cluster_node.nodeid,
+                                    cluster_zoom,
+                                    resourceinstanceid,
+                                    1,
+                                    geom,
+                                    '',
+                                    ST_Envelope(geom)
+                                FROM clusters
+                                WHERE cid IS NULL
+                                UNION ALL
+                                SELECT cluster_node.nodeid,
+                                    cluster_zoom,
+                                    NULL,
+                                    count(*),
+                                    ST_Centroid(
+                                        ST_Collect(geom)
+                                    ),
+                                    ST_AsGeoJSON(
+                                        ST_Extent(geom)
+                                    ),
+                                    ST_SetSRID(ST_Extent(geom)::geometry, 3857)
+                                FROM clusters
+                                WHERE cid IS NOT NULL
+                                GROUP BY cid;
+                            END LOOP;
+                        END LOOP;
+
+                        RETURN TRUE;
+                    END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            DROP FUNCTION refresh_geojson_geometry_clusters;
+            """,
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7461_geojson_geometry_clusters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MVTTileCache",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("zoom", models.IntegerField()),
+                ("x", models.IntegerField()),
+                ("y", models.IntegerField()),
+                ("fingerprint", models.CharField(max_length=32)),
+                ("tile", models.BinaryField()),
+                ("createdtime", models.DateTimeField()),
+                (
+                    "node",
+                    models.ForeignKey(db_column="nodeid", on_delete=django.db.models.deletion.CASCADE, to="models.Node"),
+                ),
+            ],
+            options={
+                "db_table": "mvt_tile_cache",
+                "managed": True,
+                "unique_together": {("node", "zoom", "x", "y", "fingerprint")},
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7462_mvt_tile_cache"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            -- one partial index per node group and set of constrained nodes
+            CREATE OR REPLACE FUNCTION get_tile_constraint_indexes() RETURNS TABLE (indexname TEXT, nodegroupid UUID, nodeids TEXT[]) AS $$
+                SELECT DISTINCT 'tiles_constraint_' || md5(constraints.nodegroupid::text || array_to_string(constraints.nodeids, ',')),
+                    constraints.nodegroupid,
+                    constraints.nodeids
+                FROM (
+                    SELECT c.nodegroupid, array_agg(cxn.nodeid::text ORDER BY cxn.nodeid::text) AS nodeids
+                    FROM card_constraints cc
+                    JOIN cards c ON c.cardid = cc.cardid
+                    JOIN constraints_x_nodes cxn ON cxn.constraintid = cc.constraintid
+                    GROUP BY cc.constraintid, c.nodegroupid
+                ) constraints;
+            $$ LANGUAGE sql;
+
+            CREATE OR REPLACE FUNCTION get_tile_constraint_index_statements(build_concurrently BOOLEAN) RETURNS SETOF TEXT AS $$
+                    DECLARE
+                        constrained RECORD;
+                        index_names TEXT[];
+                        stale_index RECORD;
+                        build_option TEXT := CASE WHEN build_concurrently THEN 'CONCURRENTLY ' ELSE '' END;
+                    BEGIN
+                        SELECT array_agg(tci.indexname) INTO index_names FROM get_tile_constraint_indexes() tci;
+
+                        -- indexes left invalid by a failed concurrent build are dropped and built again
+                        FOR stale_index IN
+                            SELECT i.relname AS indexname FROM pg_index x
+                            JOIN pg_class i ON i.oid = x.indexrelid
+                            JOIN pg_class t ON t.oid = x.indrelid
+                            WHERE t.relname = 'tiles' AND i.relname LIKE 'tiles\\_constraint\\_%'
+                            AND (NOT x.indisvalid OR NOT i.relname = ANY(coalesce(index_names, '{}')))
+                        LOOP
+                            RETURN NEXT format('DROP INDEX %sIF EXISTS %I', build_option, stale_index.indexname);
+                        END LOOP;
+
+                        -- values are indexed by their md5 hash because btree entries can't hold large values
+                        FOR constrained IN
+                            SELECT * FROM get_tile_constraint_indexes() tci
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+                                WHERE i.relname = tci.indexname AND x.indisvalid
+                            )
+                        LOOP
+                            RETURN NEXT format(
+                                'CREATE INDEX %sIF NOT EXISTS %I ON tiles (%s) WHERE nodegroupid = %L::uuid',
+                                build_option,
+                                constrained.indexname,
+                                (
+                                    SELECT string_agg(format('md5((tiledata -> %L)::text)', nodeid), ', ')
+                                    FROM unnest(constrained.nodeids) AS nodeid
+                                ),
+                                constrained.nodegroupid
+                            );
+                        END LOOP;
+                    END;
+            $$ LANGUAGE plpgsql;
+
+            DO $$
+                DECLARE
+                    index_statement TEXT;
+                BEGIN
+                    FOR index_statement IN SELECT * FROM get_tile_constraint_index_statements(false) LOOP
+                        EXECUTE index_statement;
+                    END LOOP;
+                END
+            $$;
+            """,
+            """
+            DO $$
+                DECLARE
+                    constraint_index RECORD;
+                BEGIN
+                    FOR constraint_index IN
+                        SELECT indexname FROM pg_indexes WHERE tablename = 'tiles' AND indexname LIKE 'tiles\\_constraint\\_%'
+                    LOOP
+                        EXECUTE format('DROP INDEX IF EXISTS %I', constraint_index.indexname);
+                    END LOOP;
+                END
+            $$;
+
+            DROP FUNCTION get_tile_constraint_index_statements;
+            DROP FUNCTION get_tile_constraint_indexes;
+            """,
+        ),
+    ]
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7463_tile_constraint_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConceptClosure",
+            fields=[
+                ("closureid", models.BigAutoField(primary_key=True, serialize=False)),
+                ("ancestorid", models.UUIDField()),
+                ("parentid", models.UUIDField()),
+                ("descendantid", models.UUIDField(db_index=True)),
+                ("hierarchy", models.TextField()),
+                ("depth", models.IntegerField()),
+                ("path", models.TextField()),
+            ],
+            options={
+                "db_table": "concept_closure",
+                "managed": True,
+                "indexes": [models.Index(fields=["ancestorid", "hierarchy", "path"], name="concept_closure_ancestor")],
+            },
+        ),
+        migrations.CreateModel(
+            name="ConceptClosureQueue",
+            fields=[
+                ("queueid", models.BigAutoField(primary_key=True, serialize=False)),
+                ("conceptid", models.UUIDField()),
+                ("reorder", models.BooleanField(default=False)),
+            ],
+            options={"db_table": "concept_closure_queue", "managed": True},
+        ),
+        migrations.RunSQL(
+            """
+            CREATE OR REPLACE FUNCTION refresh_concept_closure(default_languageid TEXT) RETURNS BOOLEAN AS $$
+                    DECLARE
+                        affected UUID[];
+                    BEGIN
+                        IF NOT EXISTS (SELECT 1 FROM concept_closure_queue) THEN
+                            RETURN FALSE;
+                        END IF;
+
+                        -- one transaction rebuilds the closure at a time, the others read it as it is
+                        IF NOT pg_try_advisory_xact_lock(hashtext('concept_closure')) THEN
+                            RETURN FALSE;
+                        END IF;
+
+                        -- the queued concepts (or the parents of reordered concepts) and everything below them
+                        WITH RECURSIVE queued AS (
+                            DELETE FROM concept_closure_queue RETURNING conceptid, reorder
+                        ),
+                        roots AS (
+                            SELECT conceptid FROM queued WHERE NOT reorder
+                            UNION
+                            SELECT r.conceptidfrom FROM relations r
+                            JOIN queued q ON q.conceptid = r.conceptidto
+                            WHERE q.reorder AND r.relationtype IN ('narrower', 'hasTopConcept', 'member')
+                        ),
+                        below AS (
+                            SELECT conceptid FROM roots
+                            UNION
+                            SELECT r.conceptidto FROM relations r
+                            JOIN below b ON b.conceptid = r.conceptidfrom
+                            WHERE r.relationtype IN ('narrower', 'hasTopConcept', 'member')
+                        )
+                        SELECT array_agg(conceptid) INTO affected FROM below;
+
+                        IF affected IS NULL THEN
+                            RETURN TRUE;
+                        END IF;
+
+                        DELETE FROM concept_closure WHERE descendantid = ANY(affected);
+
+                        WITH RECURSIVE above AS (
+                            SELECT unnest(affected) AS conceptid
+                            UNION
+                            SELECT r.conceptidfrom FROM relations r
+                            JOIN above a ON a.conceptid = r.conceptidto
+                            WHERE r.relationtype IN ('narrower', 'hasTopConcept', 'member')
+                        ),
+                        edges AS (
+                            SELECT
+                                r.conceptidfrom,
+                                r.conceptidto,
+                                CASE WHEN r.relationtype = 'member' THEN 'member' ELSE 'narrower' END AS hierarchy,
+                                to_char(
+                                    row_number() OVER (
+                                        PARTITION BY r.conceptidfrom, CASE WHEN r.relationtype = 'member' THEN 'member' ELSE 'narrower' END
+                                        ORDER BY
+                                            (
+                                                SELECT CASE WHEN v.value ~ '^-?[0-9]{1,9}$' THEN v.value::int END
+                                                FROM values v WHERE v.conceptid = r.conceptidto AND v.valuetype = 'sortorder' LIMIT 1
+                                            ) NULLS LAST,
+                                            (
+                                                SELECT v.value FROM values v WHERE v.conceptid = r.conceptidto AND v.valuetype = 'prefLabel'
+                                                ORDER BY (
+                                                    CASE WHEN v.languageid = default_languageid THEN 10
+                                                    WHEN v.languageid LIKE split_part(default_languageid, '-', 1) || '%' THEN 5
+                                                    ELSE 0 END
+                                                ) DESC
+                                                LIMIT 1
+                                            ),
+                                            r.conceptidto
+                                    ),
+                                    'fm000000'
+                                ) AS position
+                            FROM relations r
+                            WHERE r.conceptidfrom IN (SELECT conceptid FROM above)
+                            AND r.relationtype IN ('narrower', 'hasTopConcept', 'member')
+                        ),
+                        paths AS (
+                            SELECT
+                                e.conceptidfrom AS ancestorid,
+                                e.conceptidfrom AS parentid,
+                                e.conceptidto AS descendantid,
+                                e.hierarchy,
+                                1 AS depth,
+                                e.position AS path,
+                                ARRAY[e.conceptidfrom, e.conceptidto] AS visited
+                            FROM edges e
+                            WHERE e.conceptidto = ANY(affected)
+                            UNION ALL
+                            SELECT
+                                e.conceptidfrom,
+                                p.parentid,
+                                p.descendantid,
+                                p.hierarchy,
+                                p.depth + 1,
+                                e.position || '-' || p.path,
+                                e.conceptidfrom || p.visited
+                            FROM edges e
+                            JOIN paths p ON p.ancestorid = e.conceptidto AND p.hierarchy = e.hierarchy
+                            WHERE NOT e.conceptidfrom = ANY(p.visited)
+                        )
+                        INSERT INTO concept_closure (ancestorid, parentid, descendantid, hierarchy, depth, path)
+                        SELECT ancestorid, parentid, descendantid, hierarchy, depth, path FROM paths;
+
+                        RETURN TRUE;
+                    END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            DROP FUNCTION refresh_concept_closure;
+            """,
+        ),
+        migrations.RunSQL(
+            [
+                (
+                    """
+                    INSERT INTO concept_closure_queue (conceptid, reorder)
+                    SELECT DISTINCT conceptidfrom, false FROM relations WHERE relationtype IN ('narrower', 'hasTopConcept', 'member');
+                    """,
+                    None,
+                ),
+                ("SELECT refresh_concept_closure(%s);", [settings.LANGUAGE_CODE]),
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("models", "7464_concept_closure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheVersion",
+            fields=[("name", models.TextField(primary_key=True, serialize=False)), ("version", models.BigIntegerField(default=0))],
+            options={"db_table": "cache_versions", "managed": True},
+        ),
+        migrations.RunSQL("CREATE SEQUENCE cache_versions_seq;", "DROP SEQUENCE cache_versions_seq;"),
+    ]
@@ -41,7 +41,7 @@ from arches.app.utils.geo_utils import GeoUtils
 from arches.app.utils.couch import Couch
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from arches.app.utils.permission_backend import user_is_resource_reviewer
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Terms, Query
 from arches.app.search.mappings import RESOURCES_INDEX
 import arches.app.views.search as search
@@ -493,7 +493,7 @@ class MobileSurvey(models.MobileSurveyModel):
             ids = list(resources_in_couch - set(all_instances.keys()))
 
             if len(ids) > 0:
-                se = SearchEngineFactory().create()
+                se = SearchEngineInstance
                 query = Query(se, start=0, limit=settings.SEARCH_RESULT_LIMIT)
                 ids_query = Terms(field="_id", terms=ids)
                 query.add_query(ids_query)
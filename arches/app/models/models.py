@@ -23,15 +23,16 @@ from django.core.files.storage import FileSystemStorage
 from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import get_template, render_to_string
 from django.core.validators import RegexValidator
+from django.db import transaction
 from django.db.models import Q, Max
-from django.db.models.signals import post_delete, pre_save, post_save
+from django.db.models.signals import post_delete, pre_save, post_save, m2m_changed
 from django.dispatch import receiver
 from django.utils.translation import ugettext as _
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import validate_slug
-from guardian.models import GroupObjectPermission
+from guardian.models import GroupObjectPermission, UserObjectPermission
 from guardian.shortcuts import assign_perm
 
 # can't use "arches.app.models.system_settings.SystemSettings" because of circular refernce issue
@@ -58,11 +59,22 @@ class CardModel(models.Model):
     )
     config = JSONField(blank=True, null=True, db_column="config")
 
-    def is_editable(self):
+    def is_editable(self, nodegroups_with_tiles=None):
+        """
+        A card is editable until tiles have been saved to its node group
+
+        Keyword Arguments:
+        nodegroups_with_tiles -- the ids (as strings) of the node groups that have tiles, see Graph.get_nodegroups_with_tiles,
+            if not given the database is checked for tiles of this card's node group
+
+        """
+
         if settings.OVERRIDE_RESOURCE_MODEL_LOCK is True:
             return True
+        elif nodegroups_with_tiles is not None:
+            return str(self.nodegroup_id) not in nodegroups_with_tiles
         else:
-            return not TileModel.objects.filter(nodegroup=self.nodegroup).exists()
+            return not TileModel.objects.filter(nodegroup_id=self.nodegroup_id).exists()
 
     class Meta:
         managed = True
@@ -90,6 +102,15 @@ class ConstraintXNode(models.Model):
         db_table = "constraints_x_nodes"
 
 
+@receiver(post_save, sender=ConstraintXNode)
+@receiver(post_delete, sender=ConstraintXNode)
+def refresh_indexes_on_constraint_change(sender, instance, **kwargs):
+    from arches.app.models.tile import refresh_tile_constraint_indexes
+
+    # indexes are built (concurrently, outside of the request's transaction) once the constraint is committed
+    transaction.on_commit(refresh_tile_constraint_indexes)
+
+
 class CardComponent(models.Model):
     componentid = models.UUIDField(primary_key=True, default=uuid.uuid1)
     name = models.TextField(blank=True, null=True)
@@ -502,22 +523,36 @@ class Node(models.Model):
     def is_collector(self):
         return str(self.nodeid) == str(self.nodegroup_id) and self.nodegroup_id is not None
 
-    def is_editable(self):
+    def is_editable(self, nodegroups_with_tiles=None):
+        """
+        A node is editable until tiles have been saved to its node group
+
+        Keyword Arguments:
+        nodegroups_with_tiles -- the ids (as strings) of the node groups that have tiles, see Graph.get_nodegroups_with_tiles,
+            if not given the database is checked for tiles of this node's node group
+
+        """
+
         if settings.OVERRIDE_RESOURCE_MODEL_LOCK is True:
             return True
+        elif nodegroups_with_tiles is not None:
+            return str(self.nodegroup_id) not in nodegroups_with_tiles
         else:
-            return not TileModel.objects.filter(nodegroup=self.nodegroup).exists()
+            return not TileModel.objects.filter(nodegroup_id=self.nodegroup_id).exists()
 
     def get_relatable_resources(self):
+        constraints = Resource2ResourceConstraint.objects.filter(
+            Q(resourceclassto_id=self.nodeid) | Q(resourceclassfrom_id=self.nodeid)
+        ).select_related("resourceclassfrom", "resourceclassto")
         relatable_resource_ids = [
             r2r.resourceclassfrom
-            for r2r in Resource2ResourceConstraint.objects.filter(resourceclassto_id=self.nodeid)
-            if r2r.resourceclassfrom is not None
+            for r2r in constraints
+            if str(r2r.resourceclassto_id) == str(self.nodeid) and r2r.resourceclassfrom is not None
         ]
         relatable_resource_ids = relatable_resource_ids + [
             r2r.resourceclassto
-            for r2r in Resource2ResourceConstraint.objects.filter(resourceclassfrom_id=self.nodeid)
-            if r2r.resourceclassto is not None
+            for r2r in constraints
+            if str(r2r.resourceclassfrom_id) == str(self.nodeid) and r2r.resourceclassto is not None
         ]
         return relatable_resource_ids
 
@@ -1084,21 +1119,21 @@ class UserProfile(models.Model):
 
     @property
     def viewable_nodegroups(self):
-        from arches.app.utils.permission_backend import get_nodegroups_by_perm
+        from arches.app.utils.permission_backend import get_nodegroup_ids_by_perm
 
-        return set(str(nodegroup.pk) for nodegroup in get_nodegroups_by_perm(self.user, ["models.read_nodegroup"], any_perm=True))
+        return get_nodegroup_ids_by_perm(self.user, ["models.read_nodegroup"], any_perm=True)
 
     @property
     def editable_nodegroups(self):
-        from arches.app.utils.permission_backend import get_nodegroups_by_perm
+        from arches.app.utils.permission_backend import get_nodegroup_ids_by_perm
 
-        return set(str(nodegroup.pk) for nodegroup in get_nodegroups_by_perm(self.user, ["models.write_nodegroup"], any_perm=True))
+        return get_nodegroup_ids_by_perm(self.user, ["models.write_nodegroup"], any_perm=True)
 
     @property
     def deletable_nodegroups(self):
-        from arches.app.utils.permission_backend import get_nodegroups_by_perm
+        from arches.app.utils.permission_backend import get_nodegroup_ids_by_perm
 
-        return set(str(nodegroup.pk) for nodegroup in get_nodegroups_by_perm(self.user, ["models.delete_nodegroup"], any_perm=True))
+        return get_nodegroup_ids_by_perm(self.user, ["models.delete_nodegroup"], any_perm=True)
 
     class Meta:
         managed = True
@@ -1120,6 +1155,46 @@ def create_permissions_for_new_users(sender, instance, created, **kwargs):
             Resource(resource.resourceinstanceid).index()
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_user_nodegroup_permissions(sender, instance, **kwargs):
+    from arches.app.utils.permission_backend import clear_nodegroup_permissions_cache
+
+    clear_nodegroup_permissions_cache(user=instance)
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def clear_cached_object_permissions(sender, instance, **kwargs):
+    from arches.app.utils.permission_backend import clear_nodegroup_permissions_cache, clear_restricted_instances_cache
+
+    if instance.content_type_id == ContentType.objects.get_for_model(NodeGroup).pk:
+        clear_nodegroup_permissions_cache()
+    elif instance.content_type_id == ContentType.objects.get_for_model(ResourceInstance).pk:
+        clear_restricted_instances_cache()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def clear_permissions_on_membership_change(sender, **kwargs):
+    from arches.app.utils.permission_backend import clear_nodegroup_permissions_cache
+
+    if kwargs["action"] in ("post_add", "post_remove", "post_clear"):
+        clear_nodegroup_permissions_cache()
+
+
+@receiver(post_save, sender=NodeGroup)
+@receiver(post_delete, sender=NodeGroup)
+def clear_permissions_on_nodegroup_change(sender, instance, **kwargs):
+    from arches.app.utils.permission_backend import clear_nodegroup_permissions_cache
+
+    if kwargs.get("created", True):
+        clear_nodegroup_permissions_cache()
+
+
 class UserXTask(models.Model):
     id = models.UUIDField(primary_key=True, serialize=False, default=uuid.uuid1)
     taskid = models.UUIDField(serialize=False, blank=True, null=True)
@@ -1397,3 +1472,165 @@ class GeoJSONGeometry(models.Model):
     class Meta:
         managed = True
         db_table = "geojson_geometries"
+
+
+class GeoJSONGeometryCluster(models.Model):
+    """
+    Clusters of the geometries in geojson_geometries precomputed for each node and cluster zoom level,
+    used when settings.MVT_PRECOMPUTED_CLUSTERS is True
+    rows with a resourceinstance are single (unclustered) geometries, bbox is the bounding box of the geometries in a cluster
+
+    """
+
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, db_column="nodeid")
+    zoom = models.IntegerField()
+    resourceinstance = models.ForeignKey(ResourceInstance, on_delete=models.CASCADE, db_column="resourceinstanceid", null=True)
+    total = models.IntegerField()
+    geom = models.GeometryField(srid=3857)
+    extent = models.TextField(blank=True, null=True)
+    bbox = models.GeometryField(srid=3857, null=True)
+
+    class Meta:
+        managed = True
+        db_table = "geojson_geometry_clusters"
+        index_together = [["node", "zoom"]]
+
+
+class GeoJSONGeometryClusterInvalidation(models.Model):
+    """
+    Areas of a node and cluster zoom level whose precomputed clusters are out of date because geometries there were edited,
+    tiles overlapping them are clustered on request until the clusters are refreshed
+
+    """
+
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, db_column="nodeid")
+    zoom = models.IntegerField()
+    geom = models.GeometryField(srid=3857)
+
+    class Meta:
+        managed = True
+        db_table = "geojson_geometry_cluster_invalidations"
+        index_together = [["node", "zoom"]]
+
+
+class MVTTileCache(models.Model):
+    """
+    Vector tiles served by the MVT api, shared by all processes and kept until they expire
+    (see settings.TILE_CACHE_TIMEOUT) or the geometries they cover are edited
+
+    """
+
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, db_column="nodeid")
+    zoom = models.IntegerField()
+    x = models.IntegerField()
+    y = models.IntegerField()
+    fingerprint = models.CharField(max_length=32)
+    tile = models.BinaryField()
+    createdtime = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = "mvt_tile_cache"
+        unique_together = ("node", "zoom", "x", "y", "fingerprint")
+
+
+class ResourceIndexQueue(models.Model):
+    """
+    Outbox of resources waiting to be (re)indexed when settings.DEFER_RESOURCE_INDEXING is True,
+    rows are written in the same transaction as the edit and removed once the resource is indexed
+
+    """
+
+    queueid = models.BigAutoField(primary_key=True)
+    resourceinstanceid = models.UUIDField(db_index=True)
+    createdtime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = "resource_index_queue"
+
+
+class CacheVersion(models.Model):
+    """
+    The versions of groups of cached values (see arches.app.utils.cache_version), used when the cache backend isn't shared
+    by every process so that clearing the cached values in one process clears them in all of them
+
+    """
+
+    name = models.TextField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = "cache_versions"
+
+
+# the relation types followed by each concept hierarchy in the concept closure
+CONCEPT_HIERARCHIES = {"narrower": ("narrower", "hasTopConcept"), "member": ("member",)}
+
+
+class ConceptClosure(models.Model):
+    """
+    Every path from a concept down to its narrower concepts (or collection members), so a concept hierarchy can be read
+    in order with a single indexed query, rebuilt by the refresh_concept_closure database function from ConceptClosureQueue
+
+    """
+
+    closureid = models.BigAutoField(primary_key=True)
+    ancestorid = models.UUIDField()
+    parentid = models.UUIDField()
+    descendantid = models.UUIDField(db_index=True)
+    hierarchy = models.TextField()  # a key of CONCEPT_HIERARCHIES
+    depth = models.IntegerField()
+    path = models.TextField()  # the position of each concept along the path, orders the hierarchy depth first
+
+    class Meta:
+        managed = True
+        db_table = "concept_closure"
+        indexes = [models.Index(fields=["ancestorid", "hierarchy", "path"], name="concept_closure_ancestor")]
+
+
+class ConceptClosureQueue(models.Model):
+    """
+    Concepts whose descendants need their concept closure paths rebuilt, written in the same transaction as the edit
+    reorder -- True if the concept's position among its siblings changed (eg: its label or sort order was edited),
+        in which case the descendants of its parents are rebuilt
+
+    """
+
+    queueid = models.BigAutoField(primary_key=True)
+    conceptid = models.UUIDField()
+    reorder = models.BooleanField(default=False)
+
+    class Meta:
+        managed = True
+        db_table = "concept_closure_queue"
+
+
+@receiver(post_save, sender=Relation)
+@receiver(post_delete, sender=Relation)
+def queue_concept_closure_on_relation_change(sender, instance, **kwargs):
+    if any(instance.relationtype_id in relationtypes for relationtypes in CONCEPT_HIERARCHIES.values()):
+        ConceptClosureQueue.objects.bulk_create(
+            [ConceptClosureQueue(conceptid=instance.conceptfrom_id), ConceptClosureQueue(conceptid=instance.conceptto_id)]
+        )
+
+
+@receiver(post_save, sender=Value)
+@receiver(post_delete, sender=Value)
+def queue_concept_closure_on_value_change(sender, instance, **kwargs):
+    # concepts are ordered by sort order and preferred label
+    if instance.valuetype_id in ("prefLabel", "sortorder"):
+        ConceptClosureQueue.objects.create(conceptid=instance.concept_id, reorder=True)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def clear_graph_schema_on_change(sender, instance, **kwargs):
+    # proxy models (eg: Graph, Card) are sent as the sender, so the instance is checked rather than the sender
+    if isinstance(
+        instance, (GraphModel, Node, Edge, NodeGroup, CardModel, CardXNodeXWidget, ConstraintModel, ConstraintXNode, FunctionXGraph)
+    ):
+        from arches.app.utils.graph_schema import clear_graph_schema_cache
+
+        clear_graph_schema_cache()
@@ -30,12 +30,13 @@ from django.utils.translation import ugettext as _
 from arches.app.models import models
 from arches.app.models.models import EditLog
 from arches.app.models.models import TileModel
-from arches.app.models.concept import get_preflabel_from_valueid
+from arches.app.models.concept import get_preflabels_from_valueids
 from arches.app.models.system_settings import settings
 from arches.app.search.search_engine_factory import SearchEngineInstance as se
 from arches.app.search.mappings import TERMS_INDEX, RESOURCE_RELATIONS_INDEX, RESOURCES_INDEX
-from arches.app.search.elasticsearch_dsl_builder import Query, Bool, Terms, Nested
-from arches.app.utils import import_class_from_string
+from arches.app.search.elasticsearch_dsl_builder import Query, Bool, Terms, Nested, Aggregation
+from arches.app.search import index_queue
+from arches.app.utils import import_class_from_string, mvt
 from arches.app.utils.label_based_graph import LabelBasedGraph
 from arches.app.utils.label_based_graph_v2 import LabelBasedGraph as LabelBasedGraphV2
 from guardian.shortcuts import assign_perm, remove_perm
@@ -49,12 +50,44 @@ from arches.app.utils.permission_backend import (
     user_is_resource_reviewer,
     get_users_for_object,
     get_restricted_users,
+    get_restricted_users_by_resource,
     get_restricted_instances,
+    has_perms,
 )
 from arches.app.datatypes.datatypes import DataTypeFactory
 
 logger = logging.getLogger(__name__)
 
+# the nested fields of a resource document whose entries are built from individual tiles
+TILE_DOCUMENT_FIELDS = ("strings", "dates", "domains", "geometries", "points", "numbers", "date_ranges", "ids")
+
+# replaces the entries and the copy of a single tile in a resource document, see Resource.index_tile
+# documents indexed before entries carried a tileid can't be updated this way and are left untouched (noop)
+INDEX_TILE_SCRIPT = """
+    for (field in params.entries.keySet()) {
+        if (ctx._source[field] == null) {
+            ctx._source[field] = [];
+        }
+        for (entry in ctx._source[field]) {
+            if (entry.tileid == null) {
+                ctx.op = 'noop';
+                return;
+            }
+        }
+    }
+    for (field in params.entries.keySet()) {
+        ctx._source[field].removeIf(entry -> entry.tileid == params.tileid);
+        ctx._source[field].addAll(params.entries[field]);
+    }
+    ctx._source.tiles.removeIf(tile -> tile.tileid == params.tileid);
+    if (params.tile != null) {
+        ctx._source.tiles.add(params.tile);
+    }
+    for (field in params.fields.keySet()) {
+        ctx._source[field] = params.fields[field];
+    }
+"""
+
 
 class Resource(models.ResourceInstance):
     class Meta:
@@ -164,7 +197,24 @@ class Resource(models.ResourceInstance):
 
         self.tiles = list(models.TileModel.objects.filter(resourceinstance=self))
         if user:
-            self.tiles = [tile for tile in self.tiles if tile.nodegroup_id is not None and user.has_perm(perm, tile.nodegroup)]
+            tiles = [tile for tile in self.tiles if tile.nodegroup_id is not None]
+            self.tiles = [tile for tile, permitted in zip(tiles, has_perms(user, perm, [tile.nodegroup_id for tile in tiles])) if permitted]
+
+    @staticmethod
+    def load_tiles__bulk(resources):
+        """
+        Loads the tiles arrays of many resources with a single query, see load_tiles
+
+        Arguments:
+        resources -- a list of Resource objects
+
+        """
+
+        tiles = {str(resource.pk): [] for resource in resources}
+        for tile in models.TileModel.objects.filter(resourceinstance_id__in=list(tiles.keys())):
+            tiles[str(tile.resourceinstance_id)].append(tile)
+        for resource in resources:
+            resource.tiles = tiles[str(resource.pk)]
 
     # # flatten out the nested tiles into a single array
     def get_flattened_tiles(self):
@@ -174,17 +224,19 @@ class Resource(models.ResourceInstance):
         return tiles
 
     @staticmethod
-    def bulk_save(resources, transaction_id=None):
+    def bulk_save(resources, transaction_id=None, index=True):
         """
         Saves and indexes a list of resources
 
         Arguments:
         resources -- a list of resource models
 
+        Keyword Arguments:
+        transaction_id -- the id of the transaction the edits are logged under
+        index -- True(default) to index the resources, otherwise don't index them
+
         """
 
-        datatype_factory = DataTypeFactory()
-        node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
         tiles = []
         documents = []
         term_list = []
@@ -204,18 +256,21 @@ class Resource(models.ResourceInstance):
         for resource in resources:
             resource.save_edit(edit_type="create", transaction_id=transaction_id)
 
-        resources[0].tiles[0].save_edit(
-            note=f"Bulk created: {len(tiles)} for {len(resources)} resources.", edit_type="bulk_create", transaction_id=transaction_id
-        )
+        if len(tiles) > 0:
+            tiles[0].save_edit(
+                note=f"Bulk created: {len(tiles)} for {len(resources)} resources.", edit_type="bulk_create", transaction_id=transaction_id
+            )
 
         print("Time to save resource edits: %s" % datetime.timedelta(seconds=time() - start))
 
-        for resource in resources:
-            start = time()
-            document, terms = resource.get_documents_to_index(
-                fetchTiles=False, datatype_factory=datatype_factory, node_datatypes=node_datatypes
-            )
+        if index is False:
+            return
 
+        datatype_factory = DataTypeFactory()
+        node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
+        for document, terms in Resource.get_documents_to_index__bulk(
+            resources, fetchTiles=False, datatype_factory=datatype_factory, node_datatypes=node_datatypes
+        ):
             documents.append(se.create_bulk_item(index=RESOURCES_INDEX, id=document["resourceinstanceid"], data=document))
 
             for term in terms:
@@ -231,6 +286,9 @@ class Resource(models.ResourceInstance):
         """
 
         if str(self.graph_id) != str(settings.SYSTEM_SETTINGS_RESOURCE_MODEL_ID):
+            if settings.DEFER_RESOURCE_INDEXING is True:
+                return index_queue.enqueue(self.pk)
+
             datatype_factory = DataTypeFactory()
             node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
             document, terms = self.get_documents_to_index(datatype_factory=datatype_factory, node_datatypes=node_datatypes)
@@ -257,21 +315,143 @@ class Resource(models.ResourceInstance):
 
         """
 
+        tiles = list(models.TileModel.objects.filter(resourceinstance=self)) if fetchTiles else self.tiles
+        descriptors = {"displayname": self.displayname, "displaydescription": self.displaydescription, "map_popup": self.map_popup}
+
+        return self._build_documents_to_index(
+            tiles,
+            root_ontology_class=self.get_root_ontology(),
+            descriptors=descriptors,
+            restrictions=get_restricted_users(self),
+            datatype_factory=datatype_factory,
+            node_datatypes=node_datatypes,
+        )
+
+    @staticmethod
+    def get_documents_to_index__bulk(resources, fetchTiles=True, datatype_factory=None, node_datatypes=None):
+        """
+        Gets all the documents nessesary to index a list of resources using a constant number of queries
+        regardless of the number of resources, tiles fetched in one query, descriptor configurations
+        and root ontology classes looked up once per graph and object permissions fetched in bulk
+        returns a list of (document, terms) tuples in the same order as the resources
+
+        Arguments:
+        resources -- a list of Resource
+
+        Keyword Arguments:
+        fetchTiles -- instead of fetching the tiles from the database get them off the models themselves
+        datatype_factory -- refernce to the DataTypeFactory instance
+        node_datatypes -- a dictionary of datatypes keyed to node ids
+
+        """
+
+        if len(resources) == 0:
+            return []
+
+        if datatype_factory is None:
+            datatype_factory = DataTypeFactory()
+        if node_datatypes is None:
+            node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
+
+        resourceinstanceids = [str(resource.resourceinstanceid) for resource in resources]
+        graphids = {resource.graph_id for resource in resources}
+
+        if fetchTiles:
+            tiles_by_resource = {resourceinstanceid: [] for resourceinstanceid in resourceinstanceids}
+            for tile in models.TileModel.objects.filter(resourceinstance_id__in=resourceinstanceids):
+                tiles_by_resource[str(tile.resourceinstance_id)].append(tile)
+        else:
+            tiles_by_resource = {str(resource.resourceinstanceid): resource.tiles for resource in resources}
+
+        root_ontology_classes = {}
+        for graphid, ontologyclass in models.Node.objects.filter(graph_id__in=graphids, istopnode=True).values_list(
+            "graph_id", "ontologyclass"
+        ):
+            root_ontology_classes.setdefault(graphid, ontologyclass)
+
+        descriptor_configs = {}
+        for function_x_graph in models.FunctionXGraph.objects.filter(graph_id__in=graphids, function__functiontype="primarydescriptors"):
+            descriptor_configs.setdefault(function_x_graph.graph_id, []).append(function_x_graph.config)
+
+        descriptor_nodegroupids = set()
+        for configs in descriptor_configs.values():
+            for config in configs:
+                for descriptor in ("name", "description", "map_popup"):
+                    nodegroup_id = config.get(descriptor, {}).get("nodegroup_id")
+                    if nodegroup_id:
+                        descriptor_nodegroupids.add(str(nodegroup_id))
+        descriptor_nodes = {}
+        for node in models.Node.objects.filter(nodegroup_id__in=descriptor_nodegroupids):
+            descriptor_nodes.setdefault(str(node.nodegroup_id), []).append(node)
+
+        restrictions = get_restricted_users_by_resource(resourceinstanceids)
+
+        module = importlib.import_module("arches.app.functions.primary_descriptors")
+        primary_descriptors_function = getattr(module, "PrimaryDescriptorsFunction")()
+
+        def get_descriptor(resource, tiles, descriptor):
+            configs = descriptor_configs.get(resource.graph_id, [])
+            if len(configs) == 1:
+                # the config is altered while building the descriptor, so work on a copy of the cached one
+                config = dict(configs[0][descriptor])
+                return primary_descriptors_function.get_primary_descriptor_from_nodes(
+                    resource,
+                    config,
+                    tiles=tiles,
+                    nodes=descriptor_nodes.get(str(config.get("nodegroup_id")), []),
+                    datatype_factory=datatype_factory,
+                )
+            else:
+                return "undefined"
+
+        ret = []
+        for resource in resources:
+            resourceinstanceid = str(resource.resourceinstanceid)
+            tiles = tiles_by_resource[resourceinstanceid]
+            descriptors = {
+                "displayname": get_descriptor(resource, tiles, "name"),
+                "displaydescription": get_descriptor(resource, tiles, "description"),
+                "map_popup": get_descriptor(resource, tiles, "map_popup"),
+            }
+            ret.append(
+                resource._build_documents_to_index(
+                    tiles,
+                    root_ontology_class=root_ontology_classes.get(resource.graph_id),
+                    descriptors=descriptors,
+                    restrictions=restrictions[resourceinstanceid],
+                    datatype_factory=datatype_factory,
+                    node_datatypes=node_datatypes,
+                )
+            )
+        return ret
+
+    def _build_documents_to_index(self, tiles, root_ontology_class, descriptors, restrictions, datatype_factory, node_datatypes):
+        """
+        Builds the document and terms of a resource from data that has already been looked up
+        returns a tuple of a document and list of terms
+
+        Arguments:
+        tiles -- the tiles of the resource
+        root_ontology_class -- the ontology class of the resource's root node
+        descriptors -- a dictionary of the "displayname", "displaydescription" and "map_popup" of the resource
+        restrictions -- the users restricted from the resource as returned by get_restricted_users
+        datatype_factory -- refernce to the DataTypeFactory instance
+        node_datatypes -- a dictionary of datatypes keyed to node ids
+
+        """
+
         document = {}
         document["displaydescription"] = None
         document["resourceinstanceid"] = str(self.resourceinstanceid)
         document["graph_id"] = str(self.graph_id)
         document["map_popup"] = None
         document["displayname"] = None
-        document["root_ontology_class"] = self.get_root_ontology()
+        document["root_ontology_class"] = root_ontology_class
         document["legacyid"] = self.legacyid
-        document["displayname"] = self.displayname
-        document["displaydescription"] = self.displaydescription
-        document["map_popup"] = self.map_popup
-
-        tiles = list(models.TileModel.objects.filter(resourceinstance=self)) if fetchTiles else self.tiles
+        document["displayname"] = descriptors["displayname"]
+        document["displaydescription"] = descriptors["displaydescription"]
+        document["map_popup"] = descriptors["map_popup"]
 
-        restrictions = get_restricted_users(self)
         document["tiles"] = tiles
         document["permissions"] = {"users_without_read_perm": restrictions["cannot_read"]}
         document["permissions"]["users_without_edit_perm"] = restrictions["cannot_write"]
@@ -285,62 +465,150 @@ class Resource(models.ResourceInstance):
         document["numbers"] = []
         document["date_ranges"] = []
         document["ids"] = []
-        document["provisional_resource"] = "true" if sum([len(t.data) for t in tiles]) == 0 else "false"
+        document["provisional_resource"] = Resource._get_provisional_resource_status(tiles)
 
         terms = []
 
         for tile in document["tiles"]:
-            for nodeid, nodevalue in tile.data.items():
-                datatype = node_datatypes[nodeid]
-                if nodevalue != "" and nodevalue != [] and nodevalue != {} and nodevalue is not None:
-                    datatype_instance = datatype_factory.get_instance(datatype)
-                    datatype_instance.append_to_document(document, nodevalue, nodeid, tile)
-                    node_terms = datatype_instance.get_search_terms(nodevalue, nodeid)
-                    for index, term in enumerate(node_terms):
-                        terms.append(
-                            {
-                                "_id": str(nodeid) + str(tile.tileid) + str(index),
-                                "_source": {
-                                    "value": term,
-                                    "nodeid": nodeid,
-                                    "nodegroupid": tile.nodegroup_id,
-                                    "tileid": tile.tileid,
-                                    "resourceinstanceid": tile.resourceinstance_id,
-                                    "provisional": False,
-                                },
-                            }
-                        )
-
-            if tile.provisionaledits is not None:
-                provisionaledits = tile.provisionaledits
-                if len(provisionaledits) > 0:
-                    if document["provisional_resource"] == "false":
-                        document["provisional_resource"] = "partial"
-                    for user, edit in provisionaledits.items():
-                        if edit["status"] == "review":
-                            for nodeid, nodevalue in edit["value"].items():
-                                datatype = node_datatypes[nodeid]
-                                if nodevalue != "" and nodevalue != [] and nodevalue != {} and nodevalue is not None:
-                                    datatype_instance = datatype_factory.get_instance(datatype)
-                                    datatype_instance.append_to_document(document, nodevalue, nodeid, tile, True)
-                                    node_terms = datatype_instance.get_search_terms(nodevalue, nodeid)
-                                    for index, term in enumerate(node_terms):
-                                        terms.append(
-                                            {
-                                                "_id": str(nodeid) + str(tile.tileid) + str(index),
-                                                "_source": {
-                                                    "value": term,
-                                                    "nodeid": nodeid,
-                                                    "nodegroupid": tile.nodegroup_id,
-                                                    "tileid": tile.tileid,
-                                                    "resourceinstanceid": tile.resourceinstance_id,
-                                                    "provisional": True,
-                                                },
-                                            }
-                                        )
+            Resource._append_tile_to_document(document, terms, tile, datatype_factory, node_datatypes)
 
         return document, terms
 
+    @staticmethod
+    def _get_provisional_resource_status(tiles):
+        """
+        Returns "true" if none of the tiles have any authoritative data, "partial" if some of the tiles
+        have provisional edits, otherwise "false"
+
+        """
+
+        status = "true" if sum([len(t.data) for t in tiles]) == 0 else "false"
+        if status == "false":
+            for tile in tiles:
+                if tile.provisionaledits is not None and len(tile.provisionaledits) > 0:
+                    status = "partial"
+                    break
+        return status
+
+    @staticmethod
+    def _append_tile_to_document(document, terms, tile, datatype_factory, node_datatypes):
+        """
+        Appends the values of a single tile (including provisional edits under review) to the nested
+        fields of a resource document and to a list of terms
+        each nested entry is stamped with the id of the tile it came from so that it can be replaced when
+        only that tile changes, see index_tile
+
+        """
+
+        def append_node_value(nodeid, nodevalue, provisional):
+            datatype = node_datatypes[nodeid]
+            if nodevalue != "" and nodevalue != [] and nodevalue != {} and nodevalue is not None:
+                datatype_instance = datatype_factory.get_instance(datatype)
+                entry_counts = {field: len(document[field]) for field in TILE_DOCUMENT_FIELDS}
+                if provisional:
+                    datatype_instance.append_to_document(document, nodevalue, nodeid, tile, True)
+                else:
+                    datatype_instance.append_to_document(document, nodevalue, nodeid, tile)
+                for field, count in entry_counts.items():
+                    for entry in document[field][count:]:
+                        entry.setdefault("tileid", str(tile.tileid))
+                node_terms = datatype_instance.get_search_terms(nodevalue, nodeid)
+                for index, term in enumerate(node_terms):
+                    terms.append(
+                        {
+                            "_id": str(nodeid) + str(tile.tileid) + str(index),
+                            "_source": {
+                                "value": term,
+                                "nodeid": nodeid,
+                                "nodegroupid": tile.nodegroup_id,
+                                "tileid": tile.tileid,
+                                "resourceinstanceid": tile.resourceinstance_id,
+                                "provisional": provisional,
+                            },
+                        }
+                    )
+
+        for nodeid, nodevalue in tile.data.items():
+            append_node_value(nodeid, nodevalue, False)
+
+        if tile.provisionaledits is not None:
+            for user, edit in tile.provisionaledits.items():
+                if edit["status"] == "review":
+                    for nodeid, nodevalue in edit["value"].items():
+                        append_node_value(nodeid, nodevalue, True)
+
+    def index_tile(self, tile, deleted=False):
+        """
+        Updates only the entries of the resource's index document and the terms that belong to a single tile,
+        refreshing the resource descriptors, instead of rebuilding the whole resource document
+        Falls back to a full reindex of the resource if the document is missing or was indexed before
+        entries were stamped with their tile ids
+
+        Arguments:
+        tile -- the tile that was saved or deleted
+
+        Keyword Arguments:
+        deleted -- True if the tile has been deleted and its entries should only be removed
+
+        """
+
+        if str(self.graph_id) == str(settings.SYSTEM_SETTINGS_RESOURCE_MODEL_ID):
+            return
+
+        if settings.DEFER_RESOURCE_INDEXING is True:
+            return index_queue.enqueue(self.pk)
+
+        if settings.INCREMENTAL_TILE_INDEXING is False:
+            return self.index()
+
+        datatype_factory = DataTypeFactory()
+        node_datatypes = {
+            str(nodeid): datatype
+            for nodeid, datatype in models.Node.objects.filter(graph_id=self.graph_id).values_list("nodeid", "datatype")
+        }
+        tileid = str(tile.tileid)
+        fragment = {field: [] for field in TILE_DOCUMENT_FIELDS}
+        fragment["tiles"] = [] if deleted else [tile]
+        terms = []
+        if not deleted:
+            Resource._append_tile_to_document(fragment, terms, tile, datatype_factory, node_datatypes)
+
+        tiles = list(models.TileModel.objects.filter(resourceinstance=self))
+        params = {
+            "tileid": tileid,
+            "tile": None if deleted else JSONSerializer().serializeToPython(JSONSerializer().handle_model(tile)),
+            "entries": JSONSerializer().serializeToPython({field: fragment[field] for field in TILE_DOCUMENT_FIELDS}),
+            "fields": {
+                "displayname": self.displayname,
+                "displaydescription": self.displaydescription,
+                "map_popup": self.map_popup,
+                "provisional_resource": Resource._get_provisional_resource_status(tiles),
+            },
+        }
+
+        try:
+            result = se.update_data(
+                index=RESOURCES_INDEX, id=str(self.pk), body={"script": {"source": INDEX_TILE_SCRIPT, "params": params}}
+            )
+        except Exception as e:
+            logger.warning(_("Unable to update the index for tile {0}, reindexing the resource instead: {1}").format(tileid, e))
+            result = None
+
+        if result != "updated":
+            return self.index()
+
+        query = Query(se)
+        bool_query = Bool()
+        bool_query.filter(Terms(field="tileid", terms=[tileid]))
+        query.add_query(bool_query)
+        query.delete(index=TERMS_INDEX)
+        se.bulk_index([se.create_bulk_item(index=TERMS_INDEX, id=term["_id"], data=term["_source"]) for term in terms])
+
+        for index in settings.ELASTICSEARCH_CUSTOM_INDEXES:
+            es_index = import_class_from_string(index["module"])(index["name"])
+            doc, doc_id = es_index.get_documents_to_index(self, tiles)
+            es_index.index_document(document=doc, id=doc_id)
+
     def delete(self, user={}, index=True, transaction_id=None):
         """
         Deletes a single resource and any related indexed data
@@ -369,6 +637,9 @@ class Resource(models.ResourceInstance):
             permit_deletion = True
 
         if permit_deletion is True:
+            # the resource's geometries are removed along with its tiles, so the map tiles covering them are found first
+            geometry_extents = mvt.get_resource_geometry_extents(self.resourceinstanceid)
+
             for related_resource in models.ResourceXResource.objects.filter(
                 Q(resourceinstanceidfrom=self.resourceinstanceid) | Q(resourceinstanceidto=self.resourceinstanceid)
             ):
@@ -383,6 +654,10 @@ class Resource(models.ResourceInstance):
                 pass
             super(Resource, self).delete()
 
+            for node in models.Node.objects.filter(nodeid__in=list(geometry_extents.keys())):
+                mvt.invalidate_tiles(node, geometry_extents[str(node.pk)])
+                mvt.invalidate_clusters(node, geometry_extents[str(node.pk)])
+
         return permit_deletion
 
     def delete_index(self, resourceinstanceid=None):
@@ -511,6 +786,43 @@ class Resource(models.ResourceInstance):
 
             return query.search(index=RESOURCE_RELATIONS_INDEX)
 
+        def get_relation_counts(resourceinstanceids):
+            # counts the relations of every resource in a single search, a relation is counted once
+            # for the resource it's from and once for the resource it's to (unless it relates a resource to itself)
+            query = Query(se, start=0, limit=0)
+            bool_filter = Bool()
+            bool_filter.should(Terms(field="resourceinstanceidfrom", terms=resourceinstanceids))
+            bool_filter.should(Terms(field="resourceinstanceidto", terms=resourceinstanceids))
+            query.add_query(bool_filter)
+            query.add_aggregation(
+                Aggregation(
+                    name="resourceinstanceidfrom",
+                    type="terms",
+                    field="resourceinstanceidfrom",
+                    size=len(resourceinstanceids),
+                    include=resourceinstanceids,
+                )
+            )
+            query.add_aggregation(
+                Aggregation(
+                    name="resourceinstanceidto",
+                    type="terms",
+                    # self relations were already counted for the resource they're from
+                    script={
+                        "source": "def t = doc['resourceinstanceidto'].value; return doc['resourceinstanceidfrom'].value == t ? null : t",
+                        "lang": "painless",
+                    },
+                    size=len(resourceinstanceids),
+                    include=resourceinstanceids,
+                )
+            )
+            results = query.search(index=RESOURCE_RELATIONS_INDEX)
+            counts = {resourceinstanceid: 0 for resourceinstanceid in resourceinstanceids}
+            for field in ["resourceinstanceidfrom", "resourceinstanceidto"]:
+                for bucket in results["aggregations"][field]["buckets"]:
+                    counts[bucket["key"]] += bucket["doc_count"]
+            return counts
+
         resource_relations = get_relations(
             resourceinstanceid=self.resourceinstanceid, start=start, limit=limit, resourceinstance_graphid=resourceinstance_graphid,
         )
@@ -520,10 +832,13 @@ class Resource(models.ResourceInstance):
         ret["total"] = resource_relations["hits"]["total"]
         instanceids = set()
 
-        restricted_instances = get_restricted_instances(user, se) if user is not None else []
+        restricted_instances = get_restricted_instances(user, se) if user is not None else set()
+        preflabels = get_preflabels_from_valueids(
+            {relation["_source"]["relationshiptype"] for relation in resource_relations["hits"]["hits"]}, lang
+        )
         for relation in resource_relations["hits"]["hits"]:
             try:
-                preflabel = get_preflabel_from_valueid(relation["_source"]["relationshiptype"], lang)
+                preflabel = preflabels[str(relation["_source"]["relationshiptype"])]
                 relation["_source"]["relationshiptype_label"] = preflabel["value"] or ""
             except:
                 relation["_source"]["relationshiptype_label"] = relation["_source"]["relationshiptype"] or ""
@@ -543,14 +858,10 @@ class Resource(models.ResourceInstance):
         if len(instanceids) > 0:
             related_resources = se.search(index=RESOURCES_INDEX, id=list(instanceids))
             if related_resources:
+                relation_counts = get_relation_counts(list(instanceids))
                 for resource in related_resources["docs"]:
-                    relations = get_relations(
-                        resourceinstanceid=resource["_id"],
-                        start=0,
-                        limit=0,
-                    )
                     if resource["found"]:
-                        resource["_source"]["total_relations"] = relations["hits"]["total"]
+                        resource["_source"]["total_relations"] = {"value": relation_counts[resource["_id"]], "relation": "eq"}
                         ret["related_resources"].append(resource["_source"])
 
         return ret
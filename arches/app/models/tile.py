@@ -25,8 +25,8 @@ import logging
 from django.db import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import Max, Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.utils.translation import ugettext as _
@@ -35,10 +35,13 @@ from arches.app.models.resource import Resource
 from arches.app.models.resource import EditLog
 from arches.app.models.system_settings import settings
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
-from arches.app.utils.permission_backend import user_is_resource_reviewer
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.utils.graph_schema import get_graph_schema_for_nodegroup
+from arches.app.utils.permission_backend import user_is_resource_reviewer, has_perms
+from arches.app.search import index_queue
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Query, Bool, Terms
 from arches.app.search.mappings import TERMS_INDEX
+from arches.app.datatypes.base import BaseDataType
 from arches.app.datatypes.datatypes import DataTypeFactory
 
 logger = logging.getLogger(__name__)
@@ -119,6 +122,43 @@ class Tile(models.TileModel):
         transaction_id=None,
         new_resource_created=False,
     ):
+        for edit in self.get_edit_log_entries(
+            user=user,
+            note=note,
+            edit_type=edit_type,
+            old_value=old_value,
+            new_value=new_value,
+            newprovisionalvalue=newprovisionalvalue,
+            oldprovisionalvalue=oldprovisionalvalue,
+            provisional_edit_log_details=provisional_edit_log_details,
+            transaction_id=transaction_id,
+            new_resource_created=new_resource_created,
+        ):
+            edit.save()
+
+    def get_edit_log_entries(
+        self,
+        user={},
+        note="",
+        edit_type="",
+        old_value=None,
+        new_value=None,
+        newprovisionalvalue=None,
+        oldprovisionalvalue=None,
+        provisional_edit_log_details=None,
+        transaction_id=None,
+        new_resource_created=False,
+        resourcedisplayname=None,
+    ):
+        """
+        Returns the (unsaved) edit log entries recording an edit of this tile, see save_edit
+
+        Keyword Arguments:
+        resourcedisplayname -- the display name of the tile's resource, looked up if not given
+
+        """
+
+        edits = []
         if new_resource_created:
             timestamp = datetime.datetime.now()
             resource_edit = EditLog()
@@ -133,7 +173,7 @@ class Tile(models.TileModel):
             resource_edit.user_username = getattr(user, "username", "")
             if transaction_id is not None:
                 resource_edit.transactionid = transaction_id
-            resource_edit.save()
+            edits.append(resource_edit)
 
         timestamp = datetime.datetime.now()
         edit = EditLog()
@@ -151,7 +191,7 @@ class Tile(models.TileModel):
         edit.user_firstname = getattr(user, "first_name", "")
         edit.user_lastname = getattr(user, "last_name", "")
         edit.user_username = getattr(user, "username", "")
-        edit.resourcedisplayname = Resource.objects.get(resourceinstanceid=self.resourceinstance.resourceinstanceid).displayname
+        edit.resourcedisplayname = self.get_resource_displayname() if resourcedisplayname is None else resourcedisplayname
         edit.oldvalue = old_value
         edit.newvalue = new_value
         edit.timestamp = timestamp
@@ -160,12 +200,34 @@ class Tile(models.TileModel):
         edit.oldprovisionalvalue = oldprovisionalvalue
         if transaction_id is not None:
             edit.transactionid = transaction_id
-        edit.save()
+        edits.append(edit)
+        return edits
+
+    def get_graph_schema(self):
+        return get_graph_schema_for_nodegroup(self.nodegroup_id)
+
+    def get_resource_displayname(self):
+        """
+        Returns the display name of this tile's resource using the graph's cached descriptor configuration
+
+        """
+
+        schema = self.get_graph_schema()
+        if len(schema.descriptor_functions) != 1:
+            return "undefined"
+        config = dict(schema.descriptor_functions[0].config["name"])
+        module = importlib.import_module("arches.app.functions.primary_descriptors")
+        return getattr(module, "PrimaryDescriptorsFunction")().get_primary_descriptor_from_nodes(
+            self.resourceinstance,
+            config,
+            nodes=schema.nodes_by_nodegroup.get(str(config.get("nodegroup_id")), []),
+            datatype_factory=self.datatype_factory,
+        )
 
     def tile_collects_data(self):
         result = True
         if self.tiles is not None and len(self.tiles) > 0:
-            nodes = models.Node.objects.filter(nodegroup=self.nodegroup)
+            nodes = self.get_graph_schema().nodes_by_nodegroup.get(str(self.nodegroup_id), [])
             if len(nodes) == 1 and nodes[0].datatype == "semantic":
                 result = False
         return result
@@ -234,7 +296,8 @@ class Tile(models.TileModel):
     def check_tile_cardinality_violation(self):
         if settings.BYPASS_CARDINALITY_TILE_VALIDATION:
             return
-        if self.nodegroup.cardinality == "1":
+        schema = self.get_graph_schema()
+        if schema.nodegroups[str(self.nodegroup_id)].cardinality == "1":
             kwargs = {"nodegroup": self.nodegroup, "resourceinstance_id": self.resourceinstance_id}
             try:
                 uuid.UUID(str(self.parenttile_id))
@@ -246,7 +309,7 @@ class Tile(models.TileModel):
 
             # this should only ever return at most one tile
             if len(existing_tiles) > 0 and uuid.UUID(str(self.tileid)) not in existing_tiles:
-                card = models.CardModel.objects.get(nodegroup=self.nodegroup)
+                card = schema.cards[str(self.nodegroup_id)]
                 message = _("Unable to save a tile to a card with cardinality 1 where a tile has previously been saved.")
                 details = _(
                     "Details: card: {0}, graph: {1}, resource: {2}, tile: {3}, nodegroup: {4}".format(
@@ -259,62 +322,116 @@ class Tile(models.TileModel):
     def check_for_constraint_violation(self):
         if settings.BYPASS_UNIQUE_CONSTRAINT_TILE_VALIDATION:
             return
-        card = models.CardModel.objects.get(nodegroup=self.nodegroup)
-        constraints = models.ConstraintModel.objects.filter(card=card)
-        if constraints.count() > 0:
-            for constraint in constraints:
-                if constraint.uniquetoallinstances is True:
-                    tiles = models.TileModel.objects.filter(nodegroup=self.nodegroup)
+        for constraint, nodes in self.get_graph_schema().constraints.get(str(self.nodegroup_id), []):
+            if len(nodes) == 0:
+                continue
+            datatypes = [self.datatype_factory.get_instance(node.datatype) for node in nodes]
+            # values are compared in the database unless a datatype has its own way of matching values
+            if all(datatype.values_match.__func__ is BaseDataType.values_match for datatype in datatypes):
+                tile = self.get_duplicate_tile(constraint, nodes)
+            else:
+                tile = self.get_duplicate_tile_by_comparing_values(constraint, nodes, datatypes)
+            if tile is not None:
+                duplicate_values = [datatype.get_display_value(tile, node) for node, datatype in zip(nodes, datatypes)]
+                message = _(
+                    "This card violates a unique constraint. \
+                    The following value is already saved: "
+                )
+                raise TileValidationError(message + (", ").join(duplicate_values))
+
+    def get_duplicate_tile(self, constraint, nodes):
+        """
+        Returns a tile (other than this one) with the same values as this tile for the nodes of a constraint, or None
+        the values of saved tiles are compared using the index maintained by refresh_tile_constraint_indexes,
+        values of provisional tiles are compared with the values of each of their provisional edits
+
+        Arguments:
+        constraint -- the ConstraintModel to check
+        nodes -- the nodes of the constraint
+
+        """
+
+        filters = ["nodegroupid = %s::uuid", "tileid <> %s::uuid"]
+        params = [str(self.nodegroup_id), str(self.tileid)]
+        if constraint.uniquetoallinstances is not True:
+            filters.append("resourceinstanceid = %s::uuid")
+            params.append(str(self.resourceinstance_id))
+        values = [(str(node.nodeid), json.dumps(self.data[str(node.nodeid)])) for node in nodes]
+
+        value_params = [param for value in values for param in value]
+        # the index holds hashes of the values, tiles with matching hashes are rechecked against the values themselves
+        tile_filters = ["provisionaledits IS NULL"] + ["md5((tiledata -> %s)::text) = md5(%s::jsonb::text)"] * len(values)
+        tile_filters += ["tiledata -> %s = %s::jsonb"] * len(values)
+        tile_params = value_params * 2
+        provisional_filters = ["provisionaledits IS NOT NULL"] + [
+            "EXISTS (SELECT 1 FROM jsonb_each(provisionaledits) edit WHERE edit.value -> 'value' -> %s = %s::jsonb)"
+        ] * len(values)
+
+        sql = """
+            (SELECT tileid FROM tiles WHERE {0} AND {1} LIMIT 1)
+            UNION ALL
+            (SELECT tileid FROM tiles WHERE {0} AND {2} LIMIT 1)
+            LIMIT 1
+        """.format(
+            " AND ".join(filters), " AND ".join(tile_filters), " AND ".join(provisional_filters)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + tile_params + params + value_params)
+            row = cursor.fetchone()
+        return models.TileModel.objects.get(pk=row[0]) if row is not None else None
+
+    def get_duplicate_tile_by_comparing_values(self, constraint, nodes, datatypes):
+        """
+        Returns a tile (other than this one) with the same values as this tile for the nodes of a constraint, or None
+        used for constraints on nodes with datatypes that match values in their own way
+
+        """
+
+        if constraint.uniquetoallinstances is True:
+            tiles = models.TileModel.objects.filter(nodegroup=self.nodegroup)
+        else:
+            tiles = models.TileModel.objects.filter(
+                Q(resourceinstance_id=self.resourceinstance.resourceinstanceid) & Q(nodegroup=self.nodegroup)
+            )
+        for tile in tiles.exclude(pk=self.tileid).iterator():
+            match = False
+            for node, datatype in zip(nodes, datatypes):
+                nodeid = str(node.nodeid)
+                tile_data = ""
+                if tile.provisionaledits is None:
+                    # If this is not a provisional tile, the data should
+                    # exist, so we check it normally
+                    tile_data = tile.data[nodeid]
                 else:
-                    tiles = models.TileModel.objects.filter(
-                        Q(resourceinstance_id=self.resourceinstance.resourceinstanceid) & Q(nodegroup=self.nodegroup)
-                    )
-                nodes = [node for node in constraint.nodes.all()]
-                for tile in tiles:
-                    if str(self.tileid) != str(tile.tileid):
-                        match = False
-                        duplicate_values = []
-                        for node in nodes:
-                            datatype = self.datatype_factory.get_instance(node.datatype)
-                            nodeid = str(node.nodeid)
-                            tile_data = ""
-                            if tile.provisionaledits is None:
-                                # If this is not a provisional tile, the data should
-                                # exist, so we check it normally
-                                tile_data = tile.data[nodeid]
-                            else:
-                                # If it is a provisional tile, we need to check the
-                                # provisional edits for clashing values
-                                for edit_id in tile.provisionaledits.keys():
-                                    edit_data = tile.provisionaledits[str(edit_id)]
-                                    if nodeid in edit_data["value"]:
-                                        tile_data = edit_data["value"][nodeid]
-                                        break
-                            if datatype.values_match(tile_data, self.data[nodeid]):
-                                match = True
-                                duplicate_values.append(datatype.get_display_value(tile, node))
-                            else:
-                                match = False
-                                break
-                        if match is True:
-                            message = _(
-                                "This card violates a unique constraint. \
-                                The following value is already saved: "
-                            )
-                            raise TileValidationError(message + (", ").join(duplicate_values))
+                    # If it is a provisional tile, we need to check the
+                    # provisional edits for clashing values
+                    for edit_id in tile.provisionaledits.keys():
+                        edit_data = tile.provisionaledits[str(edit_id)]
+                        if nodeid in edit_data["value"]:
+                            tile_data = edit_data["value"][nodeid]
+                            break
+                if datatype.values_match(tile_data, self.data[nodeid]):
+                    match = True
+                else:
+                    match = False
+                    break
+            if match is True:
+                return tile
+        return None
 
     def check_for_missing_nodes(self):
         if settings.BYPASS_REQUIRED_VALUE_TILE_VALIDATION:
             return
         missing_nodes = []
+        schema = self.get_graph_schema()
         for nodeid, value in self.data.items():
             try:
-                node = models.Node.objects.get(nodeid=nodeid)
+                node = schema.get_node(nodeid)
                 datatype = self.datatype_factory.get_instance(node.datatype)
                 datatype.clean(self, nodeid)
                 if self.data[nodeid] is None and node.isrequired is True:
-                    if len(node.cardxnodexwidget_set.all()) > 0:
-                        missing_nodes.append(node.cardxnodexwidget_set.all()[0].label)
+                    if str(node.nodeid) in schema.node_labels:
+                        missing_nodes.append(schema.node_labels[str(node.nodeid)])
                     else:
                         missing_nodes.append(node.name)
             except Exception:
@@ -339,9 +456,10 @@ class Tile(models.TileModel):
         """
 
         tile_errors = []
+        schema = self.get_graph_schema()
 
         for nodeid, value in self.data.items():
-            node = models.Node.objects.get(nodeid=nodeid)
+            node = schema.get_node(nodeid)
             datatype = self.datatype_factory.get_instance(node.datatype)
             error = datatype.validate(value, node=node, strict=strict)
             tile_errors += error
@@ -374,8 +492,9 @@ class Tile(models.TileModel):
             if hasattr(request.user, "userprofile") is not True:
                 models.UserProfile.objects.create(user=request.user)
         tile_data = self.get_tile_data(userid)
+        schema = self.get_graph_schema()
         for nodeid, value in list(tile_data.items()):
-            node = models.Node.objects.get(nodeid=nodeid)
+            node = schema.get_node(nodeid)
             datatype = self.datatype_factory.get_instance(node.datatype)
             if request is not None:
                 datatype.handle_request(self, request, node)
@@ -401,8 +520,9 @@ class Tile(models.TileModel):
             user = None
 
         with transaction.atomic():
+            schema = self.get_graph_schema()
             for nodeid, value in self.data.items():
-                node = models.Node.objects.get(nodeid=nodeid)
+                node = schema.get_node(nodeid)
                 datatype = self.datatype_factory.get_instance(node.datatype)
                 datatype.pre_tile_save(self, nodeid)
             self.__preSave(request)
@@ -483,6 +603,163 @@ class Tile(models.TileModel):
                 tile.parenttile = self
                 tile.save(*args, request=request, index=index, **kwargs)
 
+    @staticmethod
+    def bulk_save(tiles, request=None, user=None, transaction_id=None, index=True):
+        """
+        Saves many tiles (and their child tiles) in a single transaction
+        Each tile goes through the same checks, functions and provisional edit handling as in Tile.save,
+        but the tiles and their edit log entries are written with a few bulk queries and each resource
+        is indexed once rather than once per tile
+
+        Arguments:
+        tiles -- a list of Tile objects
+
+        Keyword Arguments:
+        request -- the request the tiles were posted with
+        user -- the user saving the tiles, defaults to the request's user
+        transaction_id -- the id of the transaction the edits are logged under
+        index -- True(default) to index the resources of the saved tiles
+
+        """
+
+        try:
+            if user is None and request is not None:
+                user = request.user
+            user_is_reviewer = user_is_resource_reviewer(user)
+        except AttributeError:  # no user - probably importing data
+            user = None
+            user_is_reviewer = False
+
+        # parents are saved before their child tiles
+        all_tiles = []
+
+        def add_tile(tile):
+            all_tiles.append(tile)
+            for child in tile.tiles:
+                child.resourceinstance = tile.resourceinstance
+                child.parenttile = tile
+                add_tile(child)
+
+        for tile in tiles:
+            add_tile(tile)
+
+        with transaction.atomic():
+            existing_models = {
+                str(model.pk): model for model in models.TileModel.objects.filter(pk__in=[tile.tileid for tile in all_tiles])
+            }
+            new_tiles = []
+            updated_tiles = []
+            edits = []
+            single_tiles = set()
+            for tile in all_tiles:
+                schema = tile.get_graph_schema()
+                for nodeid, value in tile.data.items():
+                    node = schema.get_node(nodeid)
+                    datatype = tile.datatype_factory.get_instance(node.datatype)
+                    datatype.pre_tile_save(tile, nodeid)
+                tile.__preSave(request)
+                tile.check_for_missing_nodes()
+                tile.check_for_constraint_violation()
+                tile.check_tile_cardinality_violation()
+                if schema.nodegroups[str(tile.nodegroup_id)].cardinality == "1" and not settings.BYPASS_CARDINALITY_TILE_VALIDATION:
+                    # the tiles of this batch aren't in the database yet so check them against each other too
+                    key = (str(tile.resourceinstance_id), str(tile.nodegroup_id), str(tile.parenttile_id))
+                    if key in single_tiles:
+                        message = _("Unable to save more than one tile to a card with cardinality 1.")
+                        details = _("Details: resource: {0}, nodegroup: {1}").format(tile.resourceinstance_id, tile.nodegroup_id)
+                        raise TileCardinalityError(message + " " + details)
+                    single_tiles.add(key)
+
+                existing_model = existing_models.get(str(tile.tileid))
+                if existing_model is None:
+                    tile.populate_missing_nodes()
+
+                newprovisionalvalue = None
+                oldprovisionalvalue = None
+                provisional_edit_log_details = None
+                if user is not None and user_is_reviewer is False:
+                    if existing_model is None:
+                        tile.apply_provisional_edit(user, data=tile.data, action="create")
+                        newprovisionalvalue = tile.data
+                        tile.data = {}
+                    else:
+                        tile.apply_provisional_edit(user, tile.data, action="update", existing_model=existing_model)
+                        newprovisionalvalue = tile.data
+                        tile.data = existing_model.data
+                        oldprovisional = tile.get_provisional_edit(existing_model, user)
+                        if oldprovisional is not None:
+                            oldprovisionalvalue = oldprovisional["value"]
+                    provisional_edit_log_details = {
+                        "user": user,
+                        "provisional_editor": user,
+                        "action": "create tile" if existing_model is None else "add edit",
+                    }
+
+                if user is not None:
+                    tile.validate([])
+
+                if existing_model is None:
+                    new_tiles.append(tile)
+                else:
+                    updated_tiles.append(tile)
+                edits.append((tile, existing_model, newprovisionalvalue, oldprovisionalvalue, provisional_edit_log_details))
+
+            # tiles without a sort order are put last, as in TileModel.save, with one query for all of them
+            unsorted_tiles = [
+                tile
+                for tile in new_tiles + updated_tiles
+                if tile.sortorder is None or (tile.provisionaledits is not None and tile.data == {})
+            ]
+            if len(unsorted_tiles) > 0:
+                sortorder_max = {
+                    (str(nodegroupid), str(resourceinstanceid)): sortorder
+                    for nodegroupid, resourceinstanceid, sortorder in models.TileModel.objects.filter(
+                        resourceinstance_id__in={tile.resourceinstance_id for tile in unsorted_tiles}
+                    )
+                    .order_by()
+                    .values_list("nodegroup_id", "resourceinstance_id")
+                    .annotate(Max("sortorder"))
+                }
+                for tile in unsorted_tiles:
+                    key = (str(tile.nodegroup_id), str(tile.resourceinstance_id))
+                    tile.sortorder = sortorder_max[key] + 1 if sortorder_max.get(key) is not None else 0
+                    sortorder_max[key] = tile.sortorder
+
+            Tile.objects.bulk_create(new_tiles)
+            Tile.objects.bulk_update(
+                updated_tiles, ["resourceinstance", "parenttile", "data", "nodegroup", "sortorder", "provisionaledits"]
+            )
+
+            # edit log records are written after the tiles so the resources' display names are up to date
+            displaynames = {}
+            edit_log_entries = []
+            for tile, existing_model, newprovisionalvalue, oldprovisionalvalue, provisional_edit_log_details in edits:
+                tile.datatype_post_save_actions(request)
+                tile.__postSave(request)
+                resourceid = str(tile.resourceinstance_id)
+                if resourceid not in displaynames:
+                    displaynames[resourceid] = tile.get_resource_displayname()
+                edit_log_entries += tile.get_edit_log_entries(
+                    user={} if user is None else user,
+                    edit_type="tile create" if existing_model is None else "tile edit",
+                    old_value={} if existing_model is None else existing_model.data,
+                    new_value=tile.data,
+                    newprovisionalvalue=newprovisionalvalue,
+                    oldprovisionalvalue=oldprovisionalvalue,
+                    provisional_edit_log_details=provisional_edit_log_details,
+                    transaction_id=transaction_id,
+                    resourcedisplayname=displaynames[resourceid],
+                )
+            EditLog.objects.bulk_create(edit_log_entries)
+
+            if index and len(displaynames) > 0:
+                if settings.DEFER_RESOURCE_INDEXING is True:
+                    index_queue.enqueue(list(displaynames.keys()))
+                else:
+                    index_queue.index_resources(list(displaynames.keys()))
+
+        return tiles
+
     def populate_missing_nodes(self):
         first_node = next(iter(self.data.items()), None)
         if first_node is not None:
@@ -491,7 +768,7 @@ class Tile(models.TileModel):
             self.data = result.data
 
     def delete(self, *args, **kwargs):
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         request = kwargs.pop("request", None)
         index = kwargs.pop("index", True)
         transaction_id = kwargs.pop("index", None)
@@ -528,7 +805,7 @@ class Tile(models.TileModel):
                     datatype = self.datatype_factory.get_instance(node.datatype)
                     datatype.post_tile_delete(self, nodeid, index=index)
                 if index:
-                    self.index()
+                    self.index(deleted=True)
             except IntegrityError as e:
                 logger.error(e)
 
@@ -536,13 +813,17 @@ class Tile(models.TileModel):
             self.apply_provisional_edit(user, data={}, action="delete")
             super(Tile, self).save(*args, **kwargs)
 
-    def index(self):
+    def index(self, deleted=False):
         """
         Indexes all the nessesary documents related to resources to support the map, search, and reports
+        only the parts of the resource's documents that belong to this tile are updated, see Resource.index_tile
+
+        Keyword Arguments:
+        deleted -- True if this tile has been deleted and should only be removed from the resource's documents
 
         """
 
-        Resource.objects.get(pk=self.resourceinstance_id).index()
+        Resource.objects.get(pk=self.resourceinstance_id).index_tile(self, deleted=deleted)
 
     # # flatten out the nested tiles into a single array
     def get_flattened_tiles(self):
@@ -677,20 +958,14 @@ class Tile(models.TileModel):
 
     def _getFunctionClassInstances(self):
         ret = []
-        resource = models.ResourceInstance.objects.get(pk=self.resourceinstance_id)
-        functionXgraphs = models.FunctionXGraph.objects.filter(
-            Q(graph_id=resource.graph_id),
-            Q(config__contains={"triggering_nodegroups": [str(self.nodegroup_id)]}) | Q(config__triggering_nodegroups__exact=[]),
-            ~Q(function__classname="PrimaryDescriptorsFunction"),
-        )
-        for functionXgraph in functionXgraphs:
+        for functionXgraph in self.get_graph_schema().get_functions(self.nodegroup_id):
             func = functionXgraph.function.get_class_module()(functionXgraph.config, self.nodegroup_id)
             ret.append(func)
         return ret
 
     def filter_by_perm(self, user, perm):
         if user:
-            if self.nodegroup_id is not None and user.has_perm(perm, self.nodegroup):
+            if self.nodegroup_id is not None and has_perms(user, perm, [self.nodegroup_id])[0]:
                 self.tiles = [tile for tile in self.tiles if tile.filter_by_perm(user, perm)]
             else:
                 return None
@@ -722,3 +997,19 @@ class TileCardinalityError(TileValidationError):
     def __init__(self, message, code=None):
         super(TileCardinalityError, self).__init__(message, code)
         self.title = _("Tile Cardinaltiy Error")
+
+
+def refresh_tile_constraint_indexes():
+    """
+    Creates an index on the values of the nodes of each card constraint (and drops indexes that are no longer needed)
+    so that tiles with duplicate values can be found without reading every tile of the node group,
+    outside of a transaction indexes are built concurrently so that tiles can still be saved while they're built
+
+    """
+
+    concurrently = not connection.in_atomic_block
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM get_tile_constraint_index_statements(%s);", [concurrently])
+        statements = [row[0] for row in cursor.fetchall()]
+        for statement in statements:
+            cursor.execute(statement)
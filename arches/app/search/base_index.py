@@ -5,7 +5,7 @@ from arches.app.models import models
 from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
 from arches.app.utils import import_class_from_string
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Query, Term, Ids
 
 
@@ -14,7 +14,7 @@ class BaseIndex(object):
         if index_name is None or index_name == "":
             raise SearchIndexError("Index name is not defined")
 
-        self.se = SearchEngineFactory().create()
+        self.se = SearchEngineInstance
         self.index_metadata = None
         self.index_name = index_name
 
@@ -2,7 +2,7 @@ from arches.app.models import models
 from arches.app.models.system_settings import settings
 from arches.app.search.elasticsearch_dsl_builder import Bool, Terms, NestedAgg, FiltersAgg, GeoHashGridAgg, GeoBoundsAgg
 from arches.app.search.components.base import BaseSearchFilter
-from arches.app.utils.permission_backend import user_is_resource_reviewer
+from arches.app.utils.permission_backend import user_is_resource_reviewer, has_perms
 
 details = {
     "searchcomponentid": "",
@@ -61,11 +61,10 @@ class SearchResultsFilter(BaseSearchFilter):
 
 
 def get_nodegroups_by_datatype_and_perm(request, datatype, permission):
-    nodes = []
-    for node in models.Node.objects.filter(datatype=datatype):
-        if request.user.has_perm(permission, node.nodegroup):
-            nodes.append(str(node.nodegroup_id))
-    return nodes
+    nodegroupids = list(models.Node.objects.filter(datatype=datatype).values_list("nodegroup_id", flat=True))
+    return [
+        str(nodegroupid) for nodegroupid, permitted in zip(nodegroupids, has_perms(request.user, permission, nodegroupids)) if permitted
+    ]
 
 
 def select_geoms_for_results(features, geojson_nodes, user_is_reviewer):
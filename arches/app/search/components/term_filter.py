@@ -65,6 +65,5 @@ class TermFilter(BaseSearchFilter):
 
 def _get_child_concepts(conceptid):
     ret = {conceptid}
-    for row in Concept().get_child_concepts(conceptid, ["prefLabel"]):
-        ret.add(row[0])
+    ret.update(Concept().get_child_conceptids(conceptid))
     return list(ret)
@@ -0,0 +1,215 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import threading
+from time import time
+from datetime import datetime
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils.translation import ugettext as _
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+from arches.app.search.search_engine_factory import SearchEngineInstance as se
+from arches.app.search.elasticsearch_dsl_builder import Query, Bool, Terms
+from arches.app.search.mappings import TERMS_INDEX, RESOURCES_INDEX
+from arches.app.utils import import_class_from_string
+
+logger = logging.getLogger(__name__)
+
+# how long (in seconds) to trust the result of the (expensive) check for a running celery worker
+CELERY_CHECK_TIMEOUT = 60
+
+_celery_available = None
+_celery_checked = 0
+_local_drainer = None
+_local_drainer_lock = threading.Lock()
+
+
+def enqueue(resourceinstanceids):
+    """
+    Adds resources to the index queue, the rows are written in the current transaction (if any)
+    and the queue is processed once that transaction commits
+
+    Arguments:
+    resourceinstanceids -- a resource instance id or list of ids
+
+    """
+
+    if not isinstance(resourceinstanceids, (list, tuple, set)):
+        resourceinstanceids = [resourceinstanceids]
+    models.ResourceIndexQueue.objects.bulk_create(
+        [models.ResourceIndexQueue(resourceinstanceid=resourceinstanceid) for resourceinstanceid in resourceinstanceids]
+    )
+    transaction.on_commit(schedule_processing)
+
+
+def schedule_processing():
+    """
+    Hands processing of the index queue to a celery worker if one is available,
+    otherwise to a thread running in this process
+
+    """
+
+    if _check_if_celery_available():
+        import arches.app.tasks as tasks
+
+        tasks.process_index_queue.apply_async()
+    else:
+        _get_local_drainer().wake()
+
+
+def process_queue(batch_size=settings.BULK_IMPORT_BATCH_SIZE):
+    """
+    Indexes the resources waiting in the index queue, one batch at a time until the queue is empty
+    queued rows for the same resource are coalesced so each resource is indexed once per batch
+    returns the number of resources that were indexed
+
+    Keyword Arguments:
+    batch_size -- the number of queued rows to process as a group
+
+    """
+
+    indexed = 0
+    while True:
+        with transaction.atomic():
+            # skip rows locked by other workers so several processes can drain the queue at once
+            rows = list(
+                models.ResourceIndexQueue.objects.select_for_update(skip_locked=True)
+                .order_by("queueid")
+                .values_list("queueid", "resourceinstanceid", "createdtime")[:batch_size]
+            )
+            if len(rows) == 0:
+                break
+            resourceinstanceids = list({str(resourceinstanceid) for queueid, resourceinstanceid, createdtime in rows})
+            start = time()
+            index_resources(resourceinstanceids)
+            models.ResourceIndexQueue.objects.filter(queueid__in=[queueid for queueid, resourceinstanceid, createdtime in rows]).delete()
+            indexed += len(resourceinstanceids)
+
+        oldest = min(createdtime for queueid, resourceinstanceid, createdtime in rows)
+        logger.info(
+            _("Indexed {0} resources from {1} queued edits in {2:.2f} seconds, indexing lag was {3:.2f} seconds").format(
+                len(resourceinstanceids), len(rows), time() - start, (datetime.now() - oldest).total_seconds()
+            )
+        )
+    return indexed
+
+
+def index_resources(resourceinstanceids):
+    """
+    Rebuilds the index documents and terms of the given resources in bulk,
+    resources that no longer exist are skipped
+
+    Arguments:
+    resourceinstanceids -- a list of resource instance ids
+
+    """
+
+    from arches.app.models.resource import Resource
+
+    resources = list(
+        Resource.objects.filter(resourceinstanceid__in=resourceinstanceids).exclude(graph_id=settings.SYSTEM_SETTINGS_RESOURCE_MODEL_ID)
+    )
+    if len(resources) == 0:
+        return
+
+    # remove terms of any tiles that have been deleted since the resources were last indexed
+    query = Query(se)
+    bool_query = Bool()
+    bool_query.filter(Terms(field="resourceinstanceid", terms=[str(resource.pk) for resource in resources]))
+    query.add_query(bool_query)
+    query.delete(index=TERMS_INDEX)
+
+    documents = []
+    terms = []
+    custom_indexes = [import_class_from_string(index["module"])(index["name"]) for index in settings.ELASTICSEARCH_CUSTOM_INDEXES]
+    for resource, (document, resource_terms) in zip(resources, Resource.get_documents_to_index__bulk(resources)):
+        documents.append(se.create_bulk_item(index=RESOURCES_INDEX, id=document["resourceinstanceid"], data=document))
+        for term in resource_terms:
+            terms.append(se.create_bulk_item(index=TERMS_INDEX, id=term["_id"], data=term["_source"]))
+        for es_index in custom_indexes:
+            doc, doc_id = es_index.get_documents_to_index(resource, document["tiles"])
+            es_index.index_document(document=doc, id=doc_id)
+
+    se.bulk_index(documents)
+    se.bulk_index(terms)
+
+
+def get_queue_stats():
+    """
+    Returns metrics about the index queue:
+    depth -- the number of queued edits waiting to be indexed
+    resources -- the number of distinct resources waiting to be indexed
+    lag -- the age in seconds of the oldest queued edit, 0 if the queue is empty
+
+    """
+
+    queue = models.ResourceIndexQueue.objects.all()
+    oldest = queue.aggregate(oldest=Min("createdtime"))["oldest"]
+    return {
+        "depth": queue.count(),
+        "resources": queue.values("resourceinstanceid").distinct().count(),
+        "lag": (datetime.now() - oldest).total_seconds() if oldest is not None else 0,
+    }
+
+
+def _check_if_celery_available():
+    global _celery_available, _celery_checked
+    if _celery_available is None or time() - _celery_checked > CELERY_CHECK_TIMEOUT:
+        from arches.app.utils import task_management
+
+        _celery_available = task_management.check_if_celery_available()
+        _celery_checked = time()
+    return _celery_available
+
+
+def _get_local_drainer():
+    global _local_drainer
+    with _local_drainer_lock:
+        if _local_drainer is None or not _local_drainer.is_alive():
+            _local_drainer = LocalQueueDrainer()
+            _local_drainer.start()
+    return _local_drainer
+
+
+class LocalQueueDrainer(threading.Thread):
+    """
+    Processes the index queue in a background thread of the current process,
+    used when no celery worker is available
+
+    """
+
+    def __init__(self):
+        super(LocalQueueDrainer, self).__init__(name="arches-index-queue", daemon=True)
+        self.pending = threading.Event()
+
+    def wake(self):
+        self.pending.set()
+
+    def run(self):
+        while True:
+            self.pending.wait()
+            self.pending.clear()
+            try:
+                process_queue()
+            except Exception as e:
+                logger.exception(_("Unable to process the index queue: {0}").format(e))
+            finally:
+                # this thread has its own database connection which shouldn't be held open while idle
+                connection.close()
@@ -17,7 +17,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from arches.app.models import models
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from django.db.utils import ProgrammingError
 
 
@@ -54,7 +54,7 @@ def prepare_terms_index(create=False):
     }
 
     if create:
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         se.create_index(index=TERMS_INDEX, body=index_settings)
 
     return index_settings
@@ -89,19 +89,19 @@ def prepare_concepts_index(create=False):
     }
 
     if create:
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         se.create_index(index=CONCEPTS_INDEX, body=index_settings)
 
     return index_settings
 
 
 def delete_terms_index():
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     se.delete_index(index=TERMS_INDEX)
 
 
 def delete_concepts_index():
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     se.delete_index(index=CONCEPTS_INDEX)
 
 
@@ -157,12 +157,18 @@ def prepare_search_index(create=False):
                                 "fields": {"raw": {"type": "keyword"}, "folded": {"type": "text", "analyzer": "folding"}},
                             },
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
                     "ids": {
                         "type": "nested",
-                        "properties": {"id": {"type": "keyword"}, "nodegroup_id": {"type": "keyword"}, "provisional": {"type": "boolean"}},
+                        "properties": {
+                            "id": {"type": "keyword"},
+                            "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
+                            "provisional": {"type": "boolean"},
+                        },
                     },
                     "domains": {
                         "type": "nested",
@@ -171,6 +177,7 @@ def prepare_search_index(create=False):
                             "conceptid": {"type": "keyword"},
                             "valueid": {"type": "keyword"},
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -191,6 +198,7 @@ def prepare_search_index(create=False):
                                 }
                             },
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -199,6 +207,7 @@ def prepare_search_index(create=False):
                         "properties": {
                             "point": {"type": "geo_point"},
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -208,6 +217,7 @@ def prepare_search_index(create=False):
                             "date": {"type": "long"},
                             "nodegroup_id": {"type": "keyword"},
                             "nodeid": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -216,6 +226,7 @@ def prepare_search_index(create=False):
                         "properties": {
                             "number": {"type": "double"},
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -224,6 +235,7 @@ def prepare_search_index(create=False):
                         "properties": {
                             "date_range": {"type": "long_range"},
                             "nodegroup_id": {"type": "keyword"},
+                            "tileid": {"type": "keyword"},
                             "provisional": {"type": "boolean"},
                         },
                     },
@@ -245,14 +257,14 @@ def prepare_search_index(create=False):
         print("Skipping datatype mappings because the datatypes table is not yet available")
 
     if create:
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         se.create_index(index=RESOURCES_INDEX, body=index_settings)
 
     return index_settings
 
 
 def delete_search_index():
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     se.delete_index(index=RESOURCES_INDEX)
 
 
@@ -286,12 +298,12 @@ def prepare_resource_relations_index(create=False):
     }
 
     if create:
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         se.create_index(index=RESOURCE_RELATIONS_INDEX, body=index_settings)
 
     return index_settings
 
 
 def delete_resource_relations_index():
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     se.delete_index(index=RESOURCE_RELATIONS_INDEX)
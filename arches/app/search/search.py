@@ -21,14 +21,55 @@ import urllib.parse
 import urllib.error
 import uuid
 import logging
+import threading
+from time import time
 from datetime import datetime
-from elasticsearch import Elasticsearch, helpers
-from elasticsearch.exceptions import RequestError
+from elasticsearch import Elasticsearch, Transport, helpers
+from elasticsearch.exceptions import NotFoundError, RequestError
 from elasticsearch.helpers import BulkIndexError
 from arches.app.models.system_settings import settings
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 
 
+class StatsTransport(Transport):
+    """
+    Transport that keeps a count of the requests made to each index along with their total latency and errors
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(StatsTransport, self).__init__(*args, **kwargs)
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def perform_request(self, method, url, *args, **kwargs):
+        start = time()
+        error = False
+        try:
+            return super(StatsTransport, self).perform_request(method, url, *args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(url.strip("/").split("/")[0] or "_root", time() - start, error)
+
+    def record(self, index, duration, error):
+        with self.stats_lock:
+            stats = self.stats.setdefault(index, {"requests": 0, "errors": 0, "time": 0.0})
+            stats["requests"] += 1
+            stats["time"] += duration
+            if error:
+                stats["errors"] += 1
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {index: dict(stats, avg_time=stats["time"] / stats["requests"]) for index, stats in self.stats.items()}
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {}
+
+
 class SearchEngine(object):
     def __init__(self, **kwargs):
         #
@@ -37,9 +78,25 @@ class SearchEngine(object):
         serializer.dumps = serializer.serialize
         serializer.loads = JSONDeserializer().deserialize
         self.prefix = kwargs.pop("prefix", "").lower()
+        kwargs.setdefault("transport_class", StatsTransport)
         self.es = Elasticsearch(serializer=serializer, **kwargs)
         self.logger = logging.getLogger(__name__)
 
+    def get_stats(self):
+        """
+        Returns the number of requests, errors and the total and average time (in seconds)
+        spent on requests to each index since the client was created or the stats were last reset
+
+        """
+
+        if isinstance(self.es.transport, StatsTransport):
+            return self.es.transport.get_stats()
+        return {}
+
+    def reset_stats(self):
+        if isinstance(self.es.transport, StatsTransport):
+            self.es.transport.reset_stats()
+
     def _add_prefix(self, *args, **kwargs):
         if args:
             index = args[0].strip()
@@ -146,6 +203,38 @@ class SearchEngine(object):
 
         return ret
 
+    def msearch(self, searches, **kwargs):
+        """
+        Performs several searches in a single request
+        Returns a list of the search results in the same order as the searches,
+        the result of a search that failed is None
+
+        Arguments:
+        searches -- a list of (index, body) tuples, where body is a query dsl
+
+        """
+
+        body = []
+        for index, search_body in searches:
+            body.append({"index": self._add_prefix(index)})
+            body.append(search_body)
+
+        ret = []
+        try:
+            for response in self.es.msearch(body=body, **kwargs)["responses"]:
+                if "error" in response:
+                    self.logger.warning("%s: WARNING: search failed \nException detail: %s\n" % (datetime.now(), response["error"]))
+                    ret.append(None)
+                else:
+                    ret.append(response)
+        except RequestError as detail:
+            self.logger.exception(
+                "%s: WARNING: multi search failed for queries: %s \nException detail: %s\n" % (datetime.now(), body, detail)
+            )
+            ret = [None] * len(searches)
+
+        return ret
+
     def create_mapping(self, index, fieldname="", fieldtype="string", fieldindex=None, body=None):
         """
         Creates an Elasticsearch body for a single field given an index name and type name
@@ -192,6 +281,22 @@ class SearchEngine(object):
                 )
                 raise detail
 
+    def update_data(self, index=None, id=None, body=None, **kwargs):
+        """
+        Partially updates a single document in Elasticsearch, eg: with a script
+        returns the result reported by Elasticsearch ("updated" or "noop"), or None if the document doesn't exist
+
+        """
+
+        index = self._add_prefix(index)
+        try:
+            return self.es.update(index=index, doc_type="_doc", id=id, body=body, **kwargs)["result"]
+        except NotFoundError:
+            return None
+        except Exception as detail:
+            self.logger.warning("%s: WARNING: failed to update document: %s \nException detail: %s\n" % (datetime.now(), id, detail))
+            raise detail
+
     def bulk_index(self, data, **kwargs):
         try:
             helpers.bulk(self.es, data, **kwargs)
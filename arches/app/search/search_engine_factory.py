@@ -16,6 +16,8 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import os
+import threading
 from arches.app.models.system_settings import settings
 from django.core.exceptions import ImproperlyConfigured
 
@@ -38,4 +40,30 @@ class SearchEngineFactory(object):
         return getattr(_temp, classname)(hosts=hosts, prefix=prefix, **connection_options)
 
 
-SearchEngineInstance = SearchEngineFactory().create()
+class SharedSearchEngine(object):
+    """
+    A process wide search engine that is only created on first use, so that every caller
+    shares one client and its pool of connections to Elasticsearch
+    A new client is created after a fork, connections can't safely be shared between processes
+
+    """
+
+    def __init__(self):
+        self._engine = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_engine(self):
+        pid = os.getpid()
+        if self._engine is None or self._pid != pid:
+            with self._lock:
+                if self._engine is None or self._pid != pid:
+                    self._engine = SearchEngineFactory().create()
+                    self._pid = pid
+        return self._engine
+
+    def __getattr__(self, name):
+        return getattr(self.get_engine(), name)
+
+
+SearchEngineInstance = SharedSearchEngine()
@@ -18,10 +18,11 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import os
 import csv
+import uuid
 import datetime
 import logging
 from io import StringIO
-from io import BytesIO
+from tempfile import NamedTemporaryFile
 from django.contrib.gis.geos import GeometryCollection, GEOSGeometry
 from django.core.files import File
 from django.utils.translation import ugettext as _
@@ -29,6 +30,10 @@ from django.urls import reverse
 from arches.app.models import models
 from arches.app.models.system_settings import settings
 from arches.app.datatypes.datatypes import DataTypeFactory
+from arches.app.search.components.base import SearchFilterFactory
+from arches.app.search.elasticsearch_dsl_builder import Query
+from arches.app.search.mappings import RESOURCES_INDEX
+from arches.app.search.search_engine_factory import SearchEngineInstance as se
 from arches.app.utils.flatten_dict import flatten_dict
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from arches.app.utils.data_management.resources.exporter import ResourceExporter
@@ -42,6 +47,9 @@ logger = logging.getLogger(__name__)
 
 
 class SearchResultsExporter(object):
+    # the number of search hits fetched at a time, only one page of hits is held in memory
+    page_size = 1000
+
     def __init__(self, search_request=None):
         if search_request is None:
             raise Exception("Need to pass in a search request")
@@ -57,6 +65,8 @@ class SearchResultsExporter(object):
         self.search_request = search_request
         self.datatype_factory = DataTypeFactory()
         self.node_lookup = {}
+        self.card_lookup = {}
+        self.displayname_lookup = {}
         self.output = {}
         self.set_precision = GeoUtils().set_precision
 
@@ -137,61 +147,94 @@ class SearchResultsExporter(object):
 
         return headers
 
+    def get_search_hits(self):
+        """
+        Yields the hits of the search request one at a time (up to settings.SEARCH_EXPORT_LIMIT),
+        hits are fetched a page at a time using search_after and filtered by the search components' post search hooks
+
+        """
+
+        dsl = SearchView.search_results(self.search_request, returnDsl=True)
+        if not isinstance(dsl, Query):
+            raise Exception(_("Unable to build the search for export"))
+
+        for field in ["graph_id", "resourceinstanceid", "points", "geometries", "tiles"]:
+            dsl.include(field)
+        dsl.dsl.pop("aggs", None)
+        # resourceinstanceid breaks ties so that every hit is returned exactly once
+        dsl.dsl["sort"] = dsl.dsl.get("sort", []) + [{"resourceinstanceid": {"order": "asc"}}]
+
+        search_filter_factory = SearchFilterFactory(self.search_request)
+        permitted_nodegroups = SearchView.get_permitted_nodegroups(self.search_request.user)
+        search_results_object = {}
+        count = 0
+        while count < settings.SEARCH_EXPORT_LIMIT:
+            results = dsl.search(index=RESOURCES_INDEX, start=0, limit=min(self.page_size, settings.SEARCH_EXPORT_LIMIT - count))
+            hits = results["hits"]["hits"]
+            if len(hits) == 0:
+                break
+            last_sort = hits[-1]["sort"]
+            for filter_type, querystring in list(self.search_request.GET.items()) + [("search-results", "")]:
+                search_filter = search_filter_factory.get_filter(filter_type)
+                if search_filter:
+                    search_filter.post_search_hook(search_results_object, results, permitted_nodegroups)
+            self.prefetch_display_values(results["hits"]["hits"])
+            for hit in results["hits"]["hits"]:
+                yield hit
+            count += len(hits)
+            dsl.dsl["search_after"] = last_sort
+
     def export(self, format, report_link):
         ret = []
-        search_res_json = SearchView.search_results(self.search_request)
-        if search_res_json.status_code == 500:
-            return ret
-        results = JSONDeserializer().deserialize(search_res_json.content)
-        instances = results["results"]["hits"]["hits"]
         output = {}
+        csv_files = {}
+        geojson_file = None
+        instance_count = 0
+        use_fieldname = self.format in ("shp",)
 
-        for resource_instance in instances:
-            use_fieldname = self.format in ("shp",)
+        for resource_instance in self.get_search_hits():
+            instance_count += 1
             resource_obj = self.flatten_tiles(
                 resource_instance["_source"]["tiles"], self.datatype_factory, compact=self.compact, use_fieldname=use_fieldname
             )
             has_geom = resource_obj.pop("has_geometry")
             skip_resource = self.format in ("shp",) and has_geom is False
             if skip_resource is False:
-                try:
-                    output[resource_instance["_source"]["graph_id"]]["output"].append(resource_obj)
-                except KeyError as e:
-                    output[resource_instance["_source"]["graph_id"]] = {"output": []}
-                    output[resource_instance["_source"]["graph_id"]]["output"].append(resource_obj)
-
-        for graph_id, resources in output.items():
-            graph = models.GraphModel.objects.get(pk=graph_id)
-
-            if (report_link == "true") and (format != "tilexl"):
-                for resource in resources["output"]:
-                    report_url = reverse("resource_report", kwargs={"resourceid": resource["resourceid"]})
+                graph_id = resource_instance["_source"]["graph_id"]
+                if (report_link == "true") and (format != "tilexl"):
+                    report_url = reverse("resource_report", kwargs={"resourceid": resource_obj["resourceid"]})
                     export_namespace = settings.ARCHES_NAMESPACE_FOR_DATA_EXPORT.rstrip("/")
-                    resource["Link"] = f"{export_namespace}{report_url}"
-
-            if format == "geojson":
-
-                if settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER is True:
-                    headers = self.return_ordered_header(graph_id, "csv")
+                    resource_obj["Link"] = f"{export_namespace}{report_url}"
+
+                if format == "tilecsv":
+                    # rows are written out as they arrive rather than collected per graph
+                    if graph_id not in csv_files:
+                        csv_files[graph_id] = self.create_csv_file(models.GraphModel.objects.get(pk=graph_id), report_link)
+                    csv_files[graph_id]["writer"].writerow({k: str(v) for k, v in list(resource_obj.items())})
+                elif format == "geojson":
+                    # features are written out as they arrive, only the resources of the first graph found are exported
+                    if geojson_file is None:
+                        geojson_file = self.create_geojson_file(models.GraphModel.objects.get(pk=graph_id), report_link)
+                    if geojson_file["graph_id"] == graph_id:
+                        self.write_geojson_features(geojson_file, resource_obj)
                 else:
-                    headers = list(graph.node_set.filter(exportable=True).values_list("name", flat=True))
-
-                if (report_link == "true") and ("Link" not in headers):
-                    headers.append("Link")
-                ret = self.to_geojson(resources["output"], headers=headers, name=graph.name)
-                return ret, ""
+                    try:
+                        output[graph_id]["output"].append(resource_obj)
+                    except KeyError as e:
+                        output[graph_id] = {"output": []}
+                        output[graph_id]["output"].append(resource_obj)
 
-            if format == "tilecsv":
+        for csv_file in csv_files.values():
+            csv_file["outputfile"].flush()
+            ret.append({"name": csv_file["name"], "outputfile": csv_file["outputfile"]})
 
-                if settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER is True:
-                    headers = self.return_ordered_header(graph_id, "csv")
-                else:
-                    headers = list(graph.node_set.filter(exportable=True).values_list("name", flat=True))
+        if geojson_file is not None:
+            geojson_file["outputfile"].write("\n]}\n")
+            geojson_file["outputfile"].flush()
+            return [{"name": geojson_file["name"], "outputfile": geojson_file["outputfile"]}], ""
 
-                headers.append("resourceid")
-                if (report_link == "true") and ("Link" not in headers):
-                    headers.append("Link")
-                ret.append(self.to_csv(resources["output"], headers=headers, name=graph.name))
+        for graph_id, resources in output.items():
+            graph = models.GraphModel.objects.get(pk=graph_id)
 
             if format == "shp":
 
@@ -230,23 +273,70 @@ class SearchResultsExporter(object):
         full_path = self.search_request.get_full_path()
         search_request_path = self.search_request.path if full_path is None else full_path
         search_export_info = models.SearchExportHistory(
-            user=self.search_request.user, numberofinstances=len(instances), url=search_request_path
+            user=self.search_request.user, numberofinstances=instance_count, url=search_request_path
         )
         search_export_info.save()
 
         return ret, search_export_info
 
+    def create_csv_file(self, graph, report_link):
+        """
+        Creates a temporary csv file with a header row for the exportable nodes of a graph
+
+        """
+
+        if settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER is True:
+            headers = self.return_ordered_header(graph.pk, "csv")
+        else:
+            headers = list(graph.node_set.filter(exportable=True).values_list("name", flat=True))
+
+        headers.append("resourceid")
+        if (report_link == "true") and ("Link" not in headers):
+            headers.append("Link")
+        dest = NamedTemporaryFile(mode="w+", newline="", encoding="utf-8", suffix=".csv")
+        csvwriter = csv.DictWriter(dest, delimiter=",", fieldnames=headers)
+        csvwriter.writeheader()
+        return {"name": f"{graph.name}.csv", "outputfile": dest, "writer": csvwriter}
+
+    def create_geojson_file(self, graph, report_link):
+        """
+        Creates a temporary file holding the start of a geojson feature collection for the resources of a graph,
+        features are added with write_geojson_features and the collection is closed once every hit is written
+
+        """
+
+        if settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER is True:
+            headers = self.return_ordered_header(graph.pk, "csv")
+        else:
+            headers = list(graph.node_set.filter(exportable=True).values_list("name", flat=True))
+
+        if (report_link == "true") and ("Link" not in headers):
+            headers.append("Link")
+        dest = NamedTemporaryFile(mode="w+", encoding="utf-8", suffix=".geojson")
+        dest.write('{"type": "FeatureCollection", "features": [')
+        return {"name": f"{graph.name}.geojson", "outputfile": dest, "graph_id": str(graph.pk), "headers": headers, "count": 0}
+
+    def write_geojson_features(self, geojson_file, instance):
+        # properties keep the order of the headers when exporting in card order
+        sort_keys = settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER is not True
+        for feature in self.get_geojson_features(instance, geojson_file["headers"]):
+            geojson_file["outputfile"].write("\n" if geojson_file["count"] == 0 else ",\n")
+            geojson_file["outputfile"].write(JSONSerializer().serialize(feature, sort_keys=sort_keys))
+            geojson_file["count"] += 1
+
     def write_export_zipfile(self, files_for_export, export_info):
         """
         Writes a list of file like objects out to a zip file
         """
-        zip_stream = zip_utils.create_zip_file(files_for_export, "outputfile")
         today = datetime.datetime.now().isoformat()
         name = f"{settings.APP_NAME}_{today}.zip"
         search_history_obj = models.SearchExportHistory.objects.get(pk=export_info.searchexportid)
-        f = BytesIO(zip_stream)
-        download = File(f)
-        search_history_obj.downloadfile.save(name, download)
+        # the zip file is written to disk rather than built in memory
+        with NamedTemporaryFile(suffix=".zip") as f:
+            zip_utils.write_zip_file(files_for_export, "outputfile", f)
+            f.seek(0)
+            download = File(f)
+            search_history_obj.downloadfile.save(name, download)
         return search_history_obj.searchexportid
 
     def get_node(self, nodeid):
@@ -257,6 +347,81 @@ class SearchResultsExporter(object):
             self.node_lookup[nodeid] = models.Node.objects.get(pk=nodeid)
             return self.node_lookup[nodeid]
 
+    def prefetch_display_values(self, hits):
+        """
+        Resolves the concept values, related resource names and cards used by the tiles of a page of search hits
+        in bulk so that flatten_tiles can render the page from in memory lookups rather than querying per value
+
+        Arguments:
+        hits -- a list of search hits with their tiles included
+
+        """
+
+        valueids = set()
+        resourceids = set()
+        nodegroupids = set()
+        for hit in hits:
+            for tile in hit["_source"].get("tiles", []):
+                nodegroupids.add(str(tile["nodegroup_id"]))
+                for nodeid, value in tile["data"].items():
+                    node = self.get_node(nodeid)
+                    if not node.exportable or not value:
+                        continue
+                    if node.datatype == "concept":
+                        valueids.add(value)
+                    elif node.datatype == "concept-list":
+                        valueids.update(value)
+                    elif node.datatype in ("resource-instance", "resource-instance-list"):
+                        for related in value if isinstance(value, list) else [value]:
+                            try:
+                                resourceids.add(related["resourceId"])
+                            except (TypeError, KeyError):
+                                pass
+
+        if len(valueids) > 0:
+            value_lookups = [self.datatype_factory.get_instance(datatype).value_lookup for datatype in ("concept", "concept-list")]
+            valueids = {uuid.UUID(valueid) for valueid in valueids if valueid.strip() != ""}
+            valueids -= set(value_lookups[0].keys())
+            for value in models.Value.objects.filter(pk__in=valueids):
+                for value_lookup in value_lookups:
+                    value_lookup[value.pk] = value
+
+        # only the names of resources related to the current page are kept
+        self.displayname_lookup = {}
+        if len(resourceids) > 0:
+            docs = se.search(index=RESOURCES_INDEX, id=list(resourceids), _source_includes="displayname")
+            for doc in docs["docs"]:
+                if doc["found"]:
+                    self.displayname_lookup[doc["_id"]] = doc["_source"].get("displayname")
+
+        nodegroupids -= set(self.card_lookup.keys())
+        if not self.compact and len(nodegroupids) > 0:
+            for card in models.CardModel.objects.filter(nodegroup_id__in=nodegroupids):
+                self.card_lookup[str(card.nodegroup_id)] = card
+
+    def get_related_resource_display_value(self, tile, node, datatype):
+        nodevalue = datatype.get_id_list(tile["data"][str(node.nodeid)])
+        items = []
+        for related in nodevalue:
+            try:
+                resourceid = related["resourceId"]
+            except (TypeError, KeyError):
+                continue
+            if resourceid not in self.displayname_lookup:
+                # the related resource isn't in the index, let the datatype look it up
+                return datatype.get_display_value(tile, node)
+            if self.displayname_lookup[resourceid] is not None:
+                items.append(self.displayname_lookup[resourceid])
+        return ", ".join(items)
+
+    def get_card(self, nodegroupid):
+        nodegroupid = str(nodegroupid)
+        try:
+            return self.card_lookup[nodegroupid]
+        except KeyError as e:
+            self.card_lookup[nodegroupid] = models.CardModel.objects.get(nodegroup=nodegroupid)
+            return self.card_lookup[nodegroupid]
+
     def get_feature_collections(self, tile, node, feature_collections, fieldname, datatype):
         node_value = tile["data"][str(node.nodeid)]
         try:
@@ -300,11 +465,15 @@ class SearchResultsExporter(object):
 
         for tile in tiles:  # normalize tile.data to use labels instead of node ids
             compacted_data["resourceid"] = tile["resourceinstance_id"]
+            data = {}
             for nodeid, value in tile["data"].items():
                 node = self.get_node(nodeid)
                 if node.exportable:
                     datatype = datatype_factory.get_instance(node.datatype)
-                    node_value = datatype.get_display_value(tile, node)
+                    if node.datatype in ("resource-instance", "resource-instance-list"):
+                        node_value = self.get_related_resource_display_value(tile, node, datatype)
+                    else:
+                        node_value = datatype.get_display_value(tile, node)
                     label = node.fieldname if use_fieldname is True else node.name
 
                     if compact:
@@ -321,7 +490,7 @@ class SearchResultsExporter(object):
 
             if not compact:  # add on the cardinality and card_names to the tile for use later on
                 tile["data"] = data
-                card = models.CardModel.objects.get(nodegroup=tile["nodegroup_id"])
+                card = self.get_card(tile["nodegroup_id"])
                 tile["card_name"] = card.name
                 tile["cardinality"] = node.nodegroup.cardinality
                 tile[card.name] = tile["data"]
@@ -368,29 +537,26 @@ class SearchResultsExporter(object):
                 geometry_fields.append(k)
         return geometry_fields
 
-    def to_geojson(self, instances, headers, name):  # a part of the code exists in datatypes.py, l.567
-        if len(instances) > 0:
-            geometry_fields = self.get_geometry_fieldnames(instances[0])
-
+    def get_geojson_features(self, instance, headers):  # a part of the code exists in datatypes.py, l.567
         features = []
-        for geometry_field in geometry_fields:
-            for instance in instances:
-                properties = {}
-                for header in headers:
-                    if header != geometry_field:
-                        try:
-                            properties[header] = instance[header]
-                        except KeyError:
-                            properties[header] = None
-                for key, value in instance.items():
-                    if key == geometry_field:
-                        geometry = GEOSGeometry(value, srid=4326)
-                        for geom in geometry:
-                            feature = {}
-                            feature["geometry"] = JSONDeserializer().deserialize(GEOSGeometry(geom, srid=4326).json)
-                            feature["type"] = "Feature"
-                            feature["properties"] = properties
-                            features.append(feature)
-
+        for geometry_field in self.get_geometry_fieldnames(instance):
+            properties = {}
+            for header in headers:
+                if header != geometry_field:
+                    try:
+                        properties[header] = instance[header]
+                    except KeyError:
+                        properties[header] = None
+            geometry = GEOSGeometry(instance[geometry_field], srid=4326)
+            for geom in geometry:
+                feature = {}
+                feature["geometry"] = JSONDeserializer().deserialize(GEOSGeometry(geom, srid=4326).json)
+                feature["type"] = "Feature"
+                feature["properties"] = properties
+                features.append(feature)
+        return features
+
+    def to_geojson(self, instances, headers, name):
+        features = [feature for instance in instances for feature in self.get_geojson_features(instance, headers)]
         feature_collection = {"type": "FeatureCollection", "features": features}
         return feature_collection
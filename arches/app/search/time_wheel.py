@@ -19,7 +19,7 @@ from arches.app.search.elasticsearch_dsl_builder import (
     FiltersAgg,
     NestedAgg,
 )
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.mappings import RESOURCES_INDEX
 from arches.app.models.system_settings import settings
 from django.core.cache import cache
@@ -27,7 +27,7 @@ from django.core.cache import cache
 
 class TimeWheel(object):
     def time_wheel_config(self, user):
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         query = Query(se, limit=0)
         nested_agg = NestedAgg(path="dates", name="min_max_agg")
         nested_agg.add_aggregation(MinAgg(field="dates.date"))
@@ -103,14 +103,27 @@ def export_search_results(self, userid, request_values, format, report_link):
 
 @shared_task(bind=True)
 def refresh_geojson_geometries(self):
+    from arches.app.models.system_settings import settings
+    from arches.app.utils import mvt
+
     with connection.cursor() as cursor:
         sql = """
             SELECT * FROM refresh_geojson_geometries();
         """
         cursor.execute(sql)
+        if settings.MVT_PRECOMPUTED_CLUSTERS is True:
+            cursor.execute("SELECT * FROM refresh_geojson_geometry_clusters(%s);", [settings.CLUSTER_DISTANCE_MAX])
+    mvt.clear_tiles()
     response = {"taskid": self.request.id}
 
 
+@shared_task
+def process_index_queue():
+    from arches.app.search import index_queue
+
+    return index_queue.process_queue()
+
+
 @shared_task(bind=True)
 def import_business_data(
     self, data_source="", overwrite="", bulk_load=False, create_concepts=False, create_collections=False, prevent_indexing=False
@@ -0,0 +1,137 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+from django.core.cache import cache
+from django.db import connection, transaction
+from arches.app.models.system_settings import settings
+
+# cache backends that keep their entries in the memory of each process (or don't keep them at all)
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+_table_exists = False
+# versions incremented in this thread's transaction that are waiting to be incremented again on commit
+_pending = threading.local()
+
+
+def is_cache_shared():
+    """
+    Returns True if the default cache backend is shared by every process (eg: memcached or redis),
+    False if each process has its own (eg: the default LocMemCache)
+
+    """
+
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def get_cache_version(name):
+    """
+    Returns the current version of a group of cached values, included in their cache keys so they can all be cleared at once
+    the version is kept in the cache if the cache is shared by every process, otherwise in the cache_versions table
+    so a change made in one process is seen by the others
+
+    Arguments:
+    name -- the name of the group of cached values eg: "graph_schema"
+
+    """
+
+    pending = getattr(_pending, "versions", {}).get(name)
+    if pending is not None:
+        # values may be cached under the current version, so it has to be incremented again after the next change
+        pending["read"] = True
+    if is_cache_shared():
+        return cache.get_or_set(f"{name}_version", 0, None)
+    if not _check_table_exists():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT version FROM cache_versions WHERE name = %s", [name])
+        row = cursor.fetchone()
+    return row[0] if row is not None else 0
+
+
+def incr_cache_version(name):
+    """
+    Increments the version of a group of cached values, clearing them in every process
+
+    Arguments:
+    name -- the name of the group of cached values eg: "graph_schema"
+
+    """
+
+    if is_cache_shared():
+        try:
+            cache.incr(f"{name}_version")
+        except ValueError:
+            cache.set(f"{name}_version", 1, None)
+    elif _check_table_exists():
+        # versions come from a sequence so a version bumped in a transaction that's rolled back is never used again,
+        # values cached under it inside that transaction would be out of date
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO cache_versions (name, version) VALUES (%s, nextval('cache_versions_seq'))
+                ON CONFLICT (name) DO UPDATE SET version = EXCLUDED.version
+                """,
+                [name],
+            )
+
+
+def incr_cache_version_now_and_on_commit(name):
+    """
+    Increments the version of a group of cached values when the data they're made from changes,
+    now so values cached before the change aren't used for the rest of the transaction,
+    and again once the change is committed in case the values were cached by another process in the meantime
+    inside a transaction the version is incremented on commit once, and now only if it's been read since it was last incremented
+    (nothing can have been cached under a version that hasn't been read), so saving many rows costs a couple of updates
+
+    Arguments:
+    name -- the name of the group of cached values eg: "graph_schema"
+
+    """
+
+    if not connection.in_atomic_block:
+        incr_cache_version(name)
+        return
+
+    versions = _pending.__dict__.setdefault("versions", {})
+    pending = versions.setdefault(name, {"read": True, "on_commit": None})
+    # a callback is dropped with the transaction (or savepoint) it was registered in, so is the increment made with it
+    registered = any(func is pending["on_commit"] for sids, func in connection.run_on_commit)
+    if pending["read"] or not registered:
+        incr_cache_version(name)
+
+        def on_commit():
+            # only the first of the callbacks registered in the transaction increments the version
+            if versions.get(name) is pending:
+                del versions[name]
+                incr_cache_version(name)
+
+        pending["read"] = False
+        pending["on_commit"] = on_commit
+        transaction.on_commit(on_commit)
+
+
+def _check_table_exists():
+    # models may be saved by migrations that run before the one creating the cache_versions table
+    global _table_exists
+    if not _table_exists:
+        _table_exists = "cache_versions" in connection.introspection.table_names()
+    return _table_exists
@@ -0,0 +1,152 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.cache import cache
+from arches.app.models.system_settings import settings
+
+PUBLIC = "public"
+PRIVATE = "private"
+
+# one session (and so one pool of kept alive connections) per backend, per process
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+
+def get_backend(user):
+    """
+    Returns PRIVATE if the user belongs to the group allowed to search the private CIIM index, otherwise PUBLIC,
+    the answer is kept on the user object so the user's groups are only queried once per request
+
+    Arguments:
+    user -- the user making the request
+
+    """
+
+    backend = getattr(user, "_ciim_backend", None)
+    if backend is None:
+        backend = PRIVATE if user.groups.filter(name=settings.CIIM_PRIVATE_ES_GROUPS).exists() else PUBLIC
+        user._ciim_backend = backend
+    return backend
+
+
+def get_session(backend):
+    global _sessions_pid
+    with _sessions_lock:
+        # connections can't be shared with a forked process, so each process opens its own
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(backend)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.CIIM_CONNECTION_OPTIONS["maxsize"])
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            _sessions[backend] = session
+    return session
+
+
+def get_url(backend):
+    if backend == PRIVATE:
+        return settings.CIIM_ELASTICSEARCH_PRIVATE["url"] + "/_search"
+    return settings.CIIM_ELASTICSEARCH_PUBLIC["url"] + "/_search"
+
+
+def search(backend, query):
+    """
+    Searches a CIIM index and returns the decoded json response,
+    successful responses are cached for settings.CIIM_CACHE_TIMEOUT seconds
+
+    Arguments:
+    backend -- PUBLIC or PRIVATE, see get_backend
+    query -- the elasticsearch query as a dictionary
+
+    """
+
+    body = json.dumps(query, sort_keys=True)
+    key = "ciim_{0}_{1}".format(backend, hashlib.md5(body.encode("utf-8")).hexdigest())
+    response = cache.get(key)
+    if response is None:
+        ret = get_session(backend).get(get_url(backend), data=body, timeout=settings.CIIM_CONNECTION_OPTIONS["timeout"])
+        response = ret.json()
+        if ret.ok:
+            cache.set(key, response, settings.CIIM_CACHE_TIMEOUT)
+    return response
+
+
+def get_count_query(uuid):
+    """
+    Returns a query counting the records (other than sites) related to a site, by type
+
+    """
+
+    return {
+        "query": {
+            "bool": {
+                "must": [{"match": {"arches.sites.keyword": uuid}}],
+                "must_not": [{"term": {"type.base": "site"}}, {"term": {"admin.status": "invalid"}}],
+                "should": [],
+            }
+        },
+        "from": 0,
+        "size": 10,
+        "sort": [],
+        "aggs": {"type": {"terms": {"field": "type.base"}}},
+    }
+
+
+def get_search_query(uuid, page=1, primary_filter="*", sort_order="asc"):
+    """
+    Returns a query for a page of the records (other than sites) related to a site
+
+    Keyword Arguments:
+    page -- the page of results to return
+    primary_filter -- only return records with this primary filter, "*" for all records
+    sort_order -- "asc"(default) or "desc"
+
+    """
+
+    must = [{"match": {"arches.sites.keyword": uuid}}]
+    if primary_filter != "*":
+        must.append({"match": {"arches.primaryFilter": primary_filter}})
+    return {
+        "query": {
+            "bool": {"must": must, "must_not": [{"term": {"type.base": "site"}}, {"term": {"admin.status": "invalid"}}], "should": []}
+        },
+        "from": settings.SEARCH_ITEMS_PER_PAGE * (page - 1),
+        "size": settings.SEARCH_ITEMS_PER_PAGE,
+        "sort": [{"arches.primarySort.keyword": {"order": sort_order}}],
+        "aggs": {"type": {"terms": {"field": "type.base"}}, "primaryFilter": {"terms": {"field": "arches.primaryFilter.keyword"}}},
+    }
+
+
+def get_lookup_query(uuid):
+    """
+    Returns a query for the record with a uuid
+
+    """
+
+    return {"query": {"bool": {"must": [{"match": {"admin.uuid": uuid}}], "must_not": [], "should": []}}, "from": 0, "size": 1, "sort": []}
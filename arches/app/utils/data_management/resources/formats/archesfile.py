@@ -131,10 +131,43 @@ class ArchesFileReader(Reader):
         return tiles
 
     def import_business_data_without_mapping(self, business_data, reporter, overwrite="append", prevent_indexing=False):
-        errors = []
-        for resource in business_data["resources"]:
+        for index, resourceinstance in self.get_resources(business_data, reporter, overwrite=overwrite):
+            resourceinstance.save(index=(not prevent_indexing))
+            reporter.update_resources_saved()
+
+    def get_resources(self, business_data, reporter, overwrite="append"):
+        """
+        Builds the (unsaved) resources and tiles of business data that doesn't need a mapping,
+        the existing resources and tiles they update are looked up in bulk
+        yields tuples of the index of each resource in business_data["resources"] and the resource
+
+        Arguments:
+        business_data -- a dictionary with a list of "resources" in the arches json format
+        reporter -- the ResourceImportReporter counting the imported tiles
+
+        Keyword Arguments:
+        overwrite -- "append"(default) to update existing resources and tiles, "overwrite" to replace them
+
+        """
+
+        resources = [resource for resource in business_data["resources"] if resource["resourceinstance"] is not None]
+        graphids = {
+            str(graphid)
+            for graphid in GraphModel.objects.filter(
+                graphid__in={str(resource["resourceinstance"]["graph_id"]) for resource in resources}
+            ).values_list("graphid", flat=True)
+        }
+        existing_resources = {}
+        existing_tiles = {}
+        if overwrite != "overwrite":
+            existing_resources = Resource.objects.in_bulk(
+                [uuid.UUID(str(resource["resourceinstance"]["resourceinstanceid"])) for resource in resources]
+            )
+            existing_tiles = Tile.objects.in_bulk([uuid.UUID(str(tile["tileid"])) for resource in resources for tile in resource["tiles"]])
+
+        for index, resource in enumerate(business_data["resources"]):
             if resource["resourceinstance"] is not None:
-                if GraphModel.objects.filter(graphid=str(resource["resourceinstance"]["graph_id"])).count() > 0:
+                if str(resource["resourceinstance"]["graph_id"]) in graphids:
                     resourceinstanceid = uuid.UUID(str(resource["resourceinstance"]["resourceinstanceid"]))
                     defaults = {
                         "graph_id": uuid.UUID(str(resource["resourceinstance"]["graph_id"])),
@@ -142,15 +175,12 @@ class ArchesFileReader(Reader):
                     }
                     new_values = {"resourceinstanceid": resourceinstanceid, "createdtime": datetime.datetime.now()}
                     new_values.update(defaults)
-                    if overwrite == "overwrite":
+                    if overwrite == "overwrite" or resourceinstanceid not in existing_resources:
                         resourceinstance = Resource(**new_values)
                     else:
-                        try:
-                            resourceinstance = Resource.objects.get(resourceinstanceid=resourceinstanceid)
-                            for key, value in defaults.items():
-                                setattr(resourceinstance, key, value)
-                        except Resource.DoesNotExist:
-                            resourceinstance = Resource(**new_values)
+                        resourceinstance = existing_resources[resourceinstanceid]
+                        for key, value in defaults.items():
+                            setattr(resourceinstance, key, value)
 
                     if resource["tiles"] != []:
                         reporter.update_tiles(len(resource["tiles"]))
@@ -164,17 +194,15 @@ class ArchesFileReader(Reader):
                                 "nodegroup_id": str(src_tile["nodegroup_id"]) if src_tile["nodegroup_id"] else None,
                                 "data": src_tile["data"],
                             }
-                            new_values = {"tileid": uuid.UUID(str(src_tile["tileid"]))}
+                            tileid = uuid.UUID(str(src_tile["tileid"]))
+                            new_values = {"tileid": tileid}
                             new_values.update(defaults)
-                            if overwrite == "overwrite":
+                            if overwrite == "overwrite" or tileid not in existing_tiles:
                                 tile = Tile(**new_values)
                             else:
-                                try:
-                                    tile = Tile.objects.get(tileid=uuid.UUID(str(src_tile["tileid"])))
-                                    for key, value in defaults.items():
-                                        setattr(tile, key, value)
-                                except Tile.DoesNotExist:
-                                    tile = Tile(**new_values)
+                                tile = existing_tiles[tileid]
+                                for key, value in defaults.items():
+                                    setattr(tile, key, value)
                             if tile is not None:
                                 resourceinstance.tiles.append(tile)
                                 reporter.update_tiles_saved()
@@ -188,8 +216,7 @@ class ArchesFileReader(Reader):
                         for tile in [k for k in resource["tiles"] if k["parenttile_id"] is None]:
                             update_or_create_tile(tile)
 
-                    resourceinstance.save(index=(not prevent_indexing))
-                    reporter.update_resources_saved()
+                    yield index, resourceinstance
 
     def get_blank_tile(self, sourcetilegroup, blanktilecache, tiles, resourceinstanceid):
         if len(sourcetilegroup[0]["data"]) > 0:
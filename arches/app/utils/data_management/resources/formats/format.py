@@ -2,11 +2,13 @@ import os
 import uuid
 import shutil
 import datetime
+from itertools import islice
 from arches.app.models.concept import Concept
 from arches.app.models import models
 from arches.app.models.models import ResourceXResource
-from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
+from arches.app.search.search_engine_factory import SearchEngineInstance as se
+from arches.app.search.mappings import RESOURCE_RELATIONS_INDEX
 from arches.app.utils.betterJSONSerializer import JSONSerializer
 from arches.app.utils.permission_backend import get_nodegroups_by_perm
 from arches.app.datatypes.datatypes import DataTypeFactory
@@ -16,6 +18,9 @@ from django.contrib.gis.geos import MultiPoint
 from django.contrib.gis.geos import MultiPolygon
 from django.contrib.gis.geos import MultiLineString
 from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.forms.models import model_to_dict
 from django.utils.translation import ugettext as _
 
 
@@ -77,42 +82,79 @@ class Reader(object):
     def import_business_data(self):
         pass
 
-    def import_relations(self, relations=None):
-        def get_resourceid_from_legacyid(legacyid):
-            ret = Resource.objects.filter(legacyid=legacyid)
+    def import_relations(self, relations=None, batch_size=settings.BULK_IMPORT_BATCH_SIZE):
+        """
+        Imports resource to resource relations (eg: the rows of a .relations file) a batch at a time,
+        the resources of a batch are found with two queries and its relations are inserted and indexed in bulk
 
-            if len(ret) > 1 or len(ret) == 0:
-                return None
-            else:
-                return ret[0].resourceinstanceid
+        Keyword Arguments:
+        relations -- an iterable of relations as dictionaries, the resources related are identified by resource instance id or legacyid
+        batch_size -- the number of relations to import as a group
+
+        """
 
-        for relation_count, relation in enumerate(relations):
-            relation_count = relation_count + 2
-            if relation_count % 500 == 0:
-                print("{0} relations saved".format(str(relation_count)))
+        # the first row of a relations file is its header
+        rows = enumerate(relations, start=2)
+        relation_count = 0
+        with se.BulkIndexer(batch_size=batch_size, refresh=True) as relations_indexer:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if len(batch) == 0:
+                    break
+                for relation in self.save_relations(batch):
+                    relations_indexer.add(index=RESOURCE_RELATIONS_INDEX, id=relation.resourcexid, data=model_to_dict(relation))
+                    relation_count += 1
+                print("{0} relations saved".format(relation_count))
+
+        self.report_errors()
+
+    def save_relations(self, rows):
+        """
+        Saves a batch of relations without indexing them, relations that can't be saved are added to the errors
+        returns the ResourceXResource models saved
 
-            def validate_resourceinstanceid(resourceinstanceid, key):
-                # Test if resourceinstancefrom is a uuid it is for a resource or if it is not a uuid that get_resourceid_from_legacyid found a resourceid.
+        Arguments:
+        rows -- a list of (row number, relation) tuples
+
+        """
+
+        # resources related by a uuid have to exist, anything else is taken to be a legacyid
+        resourceinstanceids = {}
+        legacyids = set()
+        for row_number, relation in rows:
+            for key in ("resourceinstanceidfrom", "resourceinstanceidto"):
                 try:
-                    # Test if resourceinstanceid from relations file is a UUID.
-                    newresourceinstanceid = uuid.UUID(resourceinstanceid)
-                    try:
-                        # If resourceinstanceid is a UUID then test that it is assoicated with a resource instance
-                        Resource.objects.get(resourceinstanceid=resourceinstanceid)
-                    except:
-                        # If resourceinstanceid is not associated with a resource instance then set resourceinstanceid to None
-                        newresourceinstanceid = None
-                except:
-                    # If resourceinstanceid is not UUID then assume it's a legacyid and pass it into get_resourceid_from_legacyid function
-                    newresourceinstanceid = get_resourceid_from_legacyid(resourceinstanceid)
-
-                # If resourceinstancefrom is None then either:
-                # 1.) a legacyid was passed in and get_resourceid_from_legacyid could not find a resource or found multiple resources with the indicated legacyid or
-                # 2.) a uuid was passed in and it is not associated with a resource instance
-                if newresourceinstanceid is None:
-                    errors = []
-                    # self.errors.append({'datatype':'legacyid', 'value':relation[key], 'source':'', 'message':'either multiple resources or no resource have this legacyid\n'})
-                    errors.append(
+                    resourceinstanceids[relation[key]] = str(uuid.UUID(relation[key]))
+                except (TypeError, ValueError, AttributeError):
+                    legacyids.add(relation[key])
+
+        resources = {}
+        for resourceinstanceid, graphid in models.ResourceInstance.objects.filter(
+            resourceinstanceid__in=set(resourceinstanceids.values())
+        ).values_list("resourceinstanceid", "graph_id"):
+            resources[str(resourceinstanceid)] = (resourceinstanceid, graphid)
+        for key, resourceinstanceid in resourceinstanceids.items():
+            resources[key] = resources.get(resourceinstanceid)
+        for legacyid, resourceinstanceid, graphid in models.ResourceInstance.objects.filter(legacyid__in=legacyids).values_list(
+            "legacyid", "resourceinstanceid", "graph_id"
+        ):
+            # a legacyid shared by several resources can't identify either of them
+            resources[legacyid] = (resourceinstanceid, graphid) if legacyid not in resources else None
+
+        # foreign keys are only checked when the transaction commits, so the tiles and nodes related to are looked up here
+        tileids = _get_relation_uuids(rows, "tileid")
+        tileids = {str(tileid) for tileid in models.TileModel.objects.filter(tileid__in=tileids).values_list("tileid", flat=True)}
+        nodeids = _get_relation_uuids(rows, "nodeid")
+        nodeids = {str(nodeid) for nodeid in models.Node.objects.filter(nodeid__in=nodeids).values_list("nodeid", flat=True)}
+
+        now = datetime.datetime.now()
+        relations = []
+        for row_number, relation in rows:
+            resourcefrom = resources.get(relation["resourceinstanceidfrom"])
+            resourceto = resources.get(relation["resourceinstanceidto"])
+            for key, resource in (("resourceinstanceidfrom", resourcefrom), ("resourceinstanceidto", resourceto)):
+                if resource is None:
+                    self.errors.append(
                         {
                             "type": "ERROR",
                             "message": "Relation not created, either zero or multiple resources found with legacyid: {0}".format(
@@ -120,59 +162,47 @@ class Reader(object):
                             ),
                         }
                     )
-                    if len(errors) > 0:
-                        self.errors += errors
-
-                return newresourceinstanceid
-
-            resourceinstancefrom = validate_resourceinstanceid(relation["resourceinstanceidfrom"], "resourceinstanceidfrom")
-            resourceinstanceto = validate_resourceinstanceid(relation["resourceinstanceidto"], "resourceinstanceidto")
-            if resourceinstancefrom is not None and resourceinstanceto is not None:
-                if (
-                    "resourceinstancefrom_graphid" not in relation
-                    or relation["resourceinstancefrom_graphid"] == ""
-                    or relation["resourceinstancefrom_graphid"] == "None"
-                ):
-                    try:
-                        relation["resourceinstancefrom_graphid"] = models.ResourceInstance.objects.get(
-                            resourceinstanceid=resourceinstancefrom
-                        ).graph_id
-                    except ObjectDoesNotExist:
-                        relation["resourceinstancefrom_graphid"] = None
-                if (
-                    "resourceinstanceto_graphid" not in relation
-                    or relation["resourceinstanceto_graphid"] == ""
-                    or relation["resourceinstanceto_graphid"] == "None"
-                ):
-                    try:
-                        relation["resourceinstanceto_graphid"] = models.ResourceInstance.objects.get(
-                            resourceinstanceid=resourceinstanceto
-                        ).graph_id
-                    except ObjectDoesNotExist:
-                        relation["resourceinstanceto_graphid"] = None
-                if relation["datestarted"] == "" or relation["datestarted"] == "None":
-                    relation["datestarted"] = None
-                if relation["dateended"] == "" or relation["dateended"] == "None":
-                    relation["dateended"] = None
-                if "nodeid" not in relation or relation["nodeid"] == "" or relation["nodeid"] == "None":
-                    relation["nodeid"] = None
-                if "tileid" not in relation or relation["tileid"] == "" or relation["tileid"] == "None":
-                    relation["tileid"] = None
+            missing = [
+                "{0} {1}".format(key, _get_relation_value(relation, key))
+                for key, existing in (("tileid", tileids), ("nodeid", nodeids))
+                if _get_relation_value(relation, key) is not None and _get_relation_uuid(relation, key) not in existing
+            ]
+            if len(missing) > 0:
+                message = "Row {0}: relation not created, {1} doesn't exist".format(row_number, " and ".join(missing))
+                self.errors.append({"type": "ERROR", "message": message})
+            elif resourcefrom is not None and resourceto is not None:
                 relation = ResourceXResource(
-                    resourceinstanceidfrom=Resource(resourceinstancefrom),
-                    resourceinstanceidto=Resource(resourceinstanceto),
-                    resourceinstancefrom_graphid_id=relation["resourceinstancefrom_graphid"],
-                    resourceinstanceto_graphid_id=relation["resourceinstanceto_graphid"],
+                    resourceinstanceidfrom_id=resourcefrom[0],
+                    resourceinstanceidto_id=resourceto[0],
+                    resourceinstancefrom_graphid_id=resourcefrom[1],
+                    resourceinstanceto_graphid_id=resourceto[1],
                     relationshiptype=str(relation["relationshiptype"]),
-                    nodeid=relation["nodeid"],
-                    tileid=relation["tileid"],
-                    datestarted=relation["datestarted"],
-                    dateended=relation["dateended"],
+                    nodeid_id=_get_relation_value(relation, "nodeid"),
+                    tileid_id=_get_relation_value(relation, "tileid"),
+                    datestarted=_get_relation_value(relation, "datestarted"),
+                    dateended=_get_relation_value(relation, "dateended"),
                     notes=relation["notes"],
+                    created=now,
+                    modified=now,
                 )
-                relation.save()
+                relations.append((row_number, relation))
 
-        self.report_errors()
+        saved = []
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    ResourceXResource.objects.bulk_create([relation for row_number, relation in relations])
+                saved = [relation for row_number, relation in relations]
+            except Exception:
+                # find the relations that can't be saved by saving them one at a time
+                for row_number, relation in relations:
+                    try:
+                        with transaction.atomic():
+                            ResourceXResource.objects.bulk_create([relation])
+                        saved.append(relation)
+                    except Exception as e:
+                        self.errors.append({"type": "ERROR", "message": "Row {0}: relation not created: {1}".format(row_number, e)})
+        return saved
 
     def report_errors(self):
         if len(self.errors) == 0:
@@ -294,3 +324,53 @@ class Writer(object):
                 self.resourceinstances[tile.resourceinstance_id].append(tile)
 
         return self.resourceinstances
+
+
+def update_relation_graphids(batch_size=settings.BULK_IMPORT_BATCH_SIZE):
+    """
+    Adds the graph ids that were unavailable when relations were imported (eg: the related resource was loaded later)
+    with a single update, then reindexes the relations updated
+
+    Keyword Arguments:
+    batch_size -- the number of relations to index as a group
+
+    """
+
+    resourcexids = list(ResourceXResource.objects.filter(resourceinstanceto_graphid__isnull=True).values_list("resourcexid", flat=True))
+    if len(resourcexids) == 0:
+        return
+
+    # relations to resources that still don't exist keep their graph ids as they are
+    ResourceXResource.objects.filter(resourcexid__in=resourcexids).update(
+        resourceinstancefrom_graphid=Coalesce(
+            Subquery(models.ResourceInstance.objects.filter(pk=OuterRef("resourceinstanceidfrom")).values("graph_id")[:1]),
+            F("resourceinstancefrom_graphid"),
+        ),
+        resourceinstanceto_graphid=Coalesce(
+            Subquery(models.ResourceInstance.objects.filter(pk=OuterRef("resourceinstanceidto")).values("graph_id")[:1]),
+            F("resourceinstanceto_graphid"),
+        ),
+        modified=datetime.datetime.now(),
+    )
+    with se.BulkIndexer(batch_size=batch_size, refresh=True) as relations_indexer:
+        for relation in ResourceXResource.objects.filter(resourcexid__in=resourcexids).iterator():
+            relations_indexer.add(index=RESOURCE_RELATIONS_INDEX, id=relation.resourcexid, data=model_to_dict(relation))
+
+
+def _get_relation_value(relation, key):
+    # empty values are written as "" or "None" in relations files
+    value = relation.get(key)
+    return None if value in ("", "None") else value
+
+
+def _get_relation_uuid(relation, key):
+    try:
+        return str(uuid.UUID(str(_get_relation_value(relation, key))))
+    except ValueError:
+        return None
+
+
+def _get_relation_uuids(rows, key):
+    uuids = {_get_relation_uuid(relation, key) for row_number, relation in rows}
+    uuids.discard(None)
+    return uuids
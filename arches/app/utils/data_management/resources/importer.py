@@ -9,6 +9,7 @@ import logging
 from io import StringIO
 from time import time
 from copy import deepcopy
+from collections import deque
 from optparse import make_option
 from os.path import isfile, join
 from django.core import management
@@ -20,26 +21,124 @@ import django
 # during a resource load that uses multiprocessing.
 # see https://stackoverflow.com/a/49461944/3873885
 django.setup()
-from django.db import connection, connections
+from django.db import connection, connections, transaction
 from django.contrib.gis.gdal import DataSource
 from arches.app.datatypes.datatypes import DataTypeFactory
-from arches.app.models.models import DDataType, ResourceXResource, ResourceInstance
+from arches.app.models.models import DDataType, GraphModel, ResourceInstance
+from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
+from arches.app.search import index_queue
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from arches.setup import unzip_file
 from .formats.csvfile import CsvReader
 from .formats.archesfile import ArchesFileReader
+from .formats.format import ResourceImportReporter, update_relation_graphids
 import ctypes
 
 
-def import_one_resource(line, prevent_indexing=False):
-    """this single resource import function must be outside of the BusinessDataImporter
-    class in order for it to be called with multiprocessing"""
+# the number of lines of a jsonl file imported together in a single transaction
+JSONL_CHUNK_SIZE = 100
+
+
+def read_jsonl_chunks(path, chunk_size=JSONL_CHUNK_SIZE):
+    """
+    Reads a jsonl file one line at a time rather than all at once,
+    yielding lists of at most chunk_size (line number, line) tuples
+
+    """
+
+    chunk = []
+    with open(path, "r") as openf:
+        for line_number, line in enumerate(openf, start=1):
+            if line.strip() != "":
+                chunk.append((line_number, line))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def import_resource_chunk(lines, overwrite="append", bulk=False, transaction_id=None):
+    """
+    Imports a chunk of lines of a jsonl file (one resource per line) in a single transaction without indexing them,
+    this function must be outside of the BusinessDataImporter class in order for it to be called with multiprocessing
+    returns a dictionary of the ids of the resources saved, the errors and the number of tiles imported
+
+    Arguments:
+    lines -- a list of (line number, line) tuples
+
+    Keyword Arguments:
+    overwrite -- "append"(default) to update existing resources and tiles, "overwrite" to replace them
+    bulk -- True to insert resources that don't exist yet with Resource.bulk_save, which skips tile validation,
+        datatype and function hooks and edit logging of each tile, otherwise every resource is saved with Resource.save
+    transaction_id -- the id of the transaction the edits are logged under
+
+    """
 
-    connections.close_all()
     reader = ArchesFileReader()
-    archesresource = JSONDeserializer().deserialize(line)
-    reader.import_business_data({"resources": [archesresource]}, prevent_indexing=prevent_indexing)
+    reporter = ResourceImportReporter({})
+    errors = []
+    line_numbers = []
+    business_data = {"resources": []}
+    for line_number, line in lines:
+        try:
+            business_data["resources"].append(JSONDeserializer().deserialize(line))
+            line_numbers.append(line_number)
+        except ValueError as e:
+            errors.append((line_number, f"Line {line_number} is not valid json: {e}"))
+
+    resources = [(line_numbers[index], resource) for index, resource in reader.get_resources(business_data, reporter, overwrite=overwrite)]
+    for line_number in sorted(set(line_numbers) - {line_number for line_number, resource in resources}):
+        message = f"Line {line_number}: resource was not imported, it has no resourceinstance or its resource model doesn't exist"
+        errors.append((line_number, message))
+
+    saved = []
+    with transaction.atomic():
+        # check foreign keys as rows are written so a failed save can be rolled back to its savepoint
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        try:
+            # resources that don't exist yet are inserted in bulk, if that fails they're saved one at a time to find the problem
+            if bulk is True and overwrite != "overwrite":
+                active_graphids = {
+                    str(graphid)
+                    for graphid in GraphModel.objects.filter(
+                        graphid__in={resource.graph_id for line_number, resource in resources}, isactive=True
+                    ).values_list("graphid", flat=True)
+                }
+                new_resources = [
+                    resource for line_number, resource in resources if resource._state.adding and str(resource.graph_id) in active_graphids
+                ]
+                if len(new_resources) > 0:
+                    try:
+                        with transaction.atomic():
+                            Resource.bulk_save(new_resources, transaction_id=transaction_id, index=False)
+                        saved += new_resources
+                    except Exception:
+                        for resource in new_resources:
+                            resource._state.adding = True
+
+            bulk_saved = {id(resource) for resource in saved}
+            for line_number, resource in resources:
+                if id(resource) not in bulk_saved:
+                    try:
+                        with transaction.atomic():
+                            resource.save(index=False, transaction_id=transaction_id)
+                        saved.append(resource)
+                    except Exception as e:
+                        errors.append((line_number, f"Line {line_number}: resource {resource.pk} was not imported: {e}"))
+        finally:
+            # the setting lasts until the transaction ends, which is the caller's when importing inside a transaction
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+    return {
+        "resourceids": list(dict.fromkeys(str(resource.pk) for resource in saved)),
+        "errors": [{"type": "ERROR", "message": message} for line_number, message in sorted(errors, key=lambda error: error[0])],
+        "tiles": reporter.total_tiles,
+        "tiles_saved": reporter.tiles_saved,
+    }
 
 
 class BusinessDataImporter(object):
@@ -181,23 +280,14 @@ class BusinessDataImporter(object):
                     business_data, mapping=mapping, overwrite=overwrite, prevent_indexing=prevent_indexing, transaction_id=transaction_id
                 )
             elif file_format == "jsonl":
-                with open(self.file[0], "rU") as openf:
-                    lines = openf.readlines()
-                    if use_multiprocessing is True:
-                        pool = Pool(cpu_count())
-                        pool.map(import_one_resource, lines, prevent_indexing=prevent_indexing)
-                        connections.close_all()
-                        reader = ArchesFileReader()
-                    else:
-                        reader = ArchesFileReader()
-                        for line in lines:
-                            archesresource = JSONDeserializer().deserialize(line)
-                            reader.import_business_data(
-                                {"resources": [archesresource]},
-                                overwrite=overwrite,
-                                prevent_indexing=prevent_indexing,
-                                transaction_id=transaction_id,
-                            )
+                reader = self.import_jsonl(
+                    self.file[0],
+                    overwrite=overwrite,
+                    bulk=bulk,
+                    use_multiprocessing=use_multiprocessing,
+                    prevent_indexing=prevent_indexing,
+                    transaction_id=transaction_id,
+                )
             elif file_format == "csv" or file_format == "shp" or file_format == "zip":
                 if mapping is not None:
                     reader = CsvReader()
@@ -227,14 +317,7 @@ class BusinessDataImporter(object):
 
         finally:
             # cleans up the ResourceXResource table, adding any graph_id values that were unavailable during package/csv load
-            for res_x_res in ResourceXResource.objects.filter(resourceinstanceto_graphid__isnull=True):
-                # wrapping in a try allows for graceful handling of corrupted data
-                try:
-                    res_x_res.resourceinstanceto_graphid = res_x_res.resourceinstanceidto.graph
-                except:
-                    pass
-
-                res_x_res.save()
+            update_relation_graphids()
 
             datatype_factory = DataTypeFactory()
             datatypes = DDataType.objects.all()
@@ -247,6 +330,75 @@ class BusinessDataImporter(object):
                     logger.info("Celery not working: tasks unavailable during import.")
 
 
+    def import_jsonl(self, path, overwrite="append", bulk=False, use_multiprocessing=False, prevent_indexing=False, transaction_id=None):
+        """
+        Imports a jsonl file (one resource per line) a chunk of lines at a time, so the file is never read into memory all at once,
+        then indexes all of the imported resources in bulk
+        returns a reader holding the import errors, in the order of the lines they occured on
+
+        Arguments:
+        path -- the path to the jsonl file
+
+        Keyword Arguments:
+        overwrite -- "append"(default) to update existing resources and tiles, "overwrite" to replace them
+        bulk -- True to insert new resources in bulk (see import_resource_chunk), otherwise they're saved one at a time
+        use_multiprocessing -- True to import the chunks with a pool of processes, otherwise they're imported one after the other
+            (as they are inside a transaction, because the processes can't see its changes)
+        prevent_indexing -- True to skip indexing the imported resources
+        transaction_id -- the id of the transaction the edits are logged under
+
+        """
+
+        reader = ArchesFileReader()
+        reporter = ResourceImportReporter({})
+        resourceids = []
+
+        def read_chunks():
+            for chunk in read_jsonl_chunks(path):
+                reporter.resources += len(chunk)
+                yield chunk
+
+        def add_result(result):
+            reader.errors += result["errors"]
+            reporter.update_tiles(result["tiles"])
+            reporter.update_tiles_saved(result["tiles_saved"])
+            reporter.update_resources_saved(len(result["resourceids"]))
+            resourceids.extend(result["resourceids"])
+
+        if use_multiprocessing is True and connection.in_atomic_block:
+            print("Resources can't be imported by several processes inside a transaction, importing them in a single process")
+            use_multiprocessing = False
+
+        if use_multiprocessing is True:
+            processes = cpu_count()
+            # the worker processes open their own database connections rather than sharing this process's
+            connections.close_all()
+            pending = deque()
+            with Pool(processes) as pool:
+                for chunk in read_chunks():
+                    pending.append(pool.apply_async(import_resource_chunk, (chunk, overwrite, bulk, transaction_id)))
+                    # only a few chunks per process are held in memory, results are collected in the order they were read
+                    if len(pending) >= processes * 2:
+                        add_result(pending.popleft().get())
+                while len(pending) > 0:
+                    add_result(pending.popleft().get())
+        else:
+            for chunk in read_chunks():
+                add_result(import_resource_chunk(chunk, overwrite=overwrite, bulk=bulk, transaction_id=transaction_id))
+
+        reporter.report_results()
+
+        if prevent_indexing is False and len(resourceids) > 0:
+            start = time()
+            if settings.DEFER_RESOURCE_INDEXING is True:
+                index_queue.enqueue(resourceids)
+            else:
+                for i in range(0, len(resourceids), settings.BULK_IMPORT_BATCH_SIZE):
+                    index_queue.index_resources(resourceids[i : i + settings.BULK_IMPORT_BATCH_SIZE])
+            print("Time to index {0} resources = {1}".format(len(resourceids), datetime.timedelta(seconds=time() - start)))
+
+        return reader
+
     def shape_to_csv(self, shp_path):
         csv_records = []
         ds = DataSource(shp_path)
@@ -1,7 +1,7 @@
 from arches.app.models import models
 from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Query
 from arches.app.search.mappings import TERMS_INDEX, RESOURCE_RELATIONS_INDEX, RESOURCES_INDEX
 from django.db.models import Q
@@ -26,7 +26,7 @@ from django.core.exceptions import ObjectDoesNotExist
 
 def clear_resources():
     """Removes all resource instances from your db and elasticsearch resource index"""
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     match_all_query = Query(se)
     match_all_query.delete(index=TERMS_INDEX)
     match_all_query.delete(index=RESOURCES_INDEX)
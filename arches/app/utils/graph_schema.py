@@ -0,0 +1,218 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import threading
+from django.core.cache import cache
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+from arches.app.utils.betterJSONSerializer import JSONSerializer
+from arches.app.utils.cache_version import get_cache_version, incr_cache_version_now_and_on_commit
+
+# schemas of the graphs recently used in this process, keyed by cache version and graph id
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+class GraphSchema(object):
+    """
+    The nodes (and the edges between them), node groups, cards, constraints and functions of a graph, loaded with a fixed number of queries
+    and shared (read only) by every tile saved in this process until the graph changes
+
+    """
+
+    def __init__(self, graphid):
+        self.graphid = str(graphid)
+        self.nodes = {}
+        self.nodes_by_nodegroup = {}
+        for node in models.Node.objects.filter(graph_id=graphid):
+            self.nodes[str(node.nodeid)] = node
+            if node.nodegroup_id is not None:
+                self.nodes_by_nodegroup.setdefault(str(node.nodegroup_id), []).append(node)
+
+        # child nodes of each node, in the order they are displayed
+        self.child_nodes = {}
+        for domainnodeid, rangenodeid in models.Edge.objects.filter(graph_id=graphid).values_list("domainnode_id", "rangenode_id"):
+            self.child_nodes.setdefault(str(domainnodeid), []).append(self.nodes[str(rangenodeid)])
+        for child_nodes in self.child_nodes.values():
+            child_nodes.sort(key=lambda node: node.sortorder or 0)
+
+        self.nodegroups = {
+            str(nodegroup.pk): nodegroup for nodegroup in models.NodeGroup.objects.filter(pk__in=list(self.nodes_by_nodegroup.keys()))
+        }
+        self.cards = {str(card.nodegroup_id): card for card in models.CardModel.objects.filter(graph_id=graphid)}
+
+        self.node_labels = {}
+        for nodeid, label in models.CardXNodeXWidget.objects.filter(node__graph_id=graphid).values_list("node_id", "label"):
+            self.node_labels.setdefault(str(nodeid), label)
+
+        self.constraints = {}
+        for constraint in models.ConstraintModel.objects.filter(card__graph_id=graphid).select_related("card").prefetch_related("nodes"):
+            self.constraints.setdefault(str(constraint.card.nodegroup_id), []).append((constraint, list(constraint.nodes.all())))
+
+        self.functions = []
+        self.descriptor_functions = []
+        for functionxgraph in models.FunctionXGraph.objects.filter(graph_id=graphid).select_related("function"):
+            if functionxgraph.function.functiontype == "primarydescriptors":
+                self.descriptor_functions.append(functionxgraph)
+            if functionxgraph.function.classname != "PrimaryDescriptorsFunction":
+                self.functions.append(functionxgraph)
+
+    def get_node(self, nodeid):
+        try:
+            return self.nodes[str(nodeid)]
+        except KeyError:
+            # the node may have been added since the schema was loaded
+            try:
+                return models.Node.objects.get(pk=nodeid, graph_id=self.graphid)
+            except models.Node.DoesNotExist:
+                raise models.Node.DoesNotExist(f"Node {nodeid} is not a node of graph {self.graphid}")
+
+    def get_child_nodes(self, nodeid):
+        """
+        Returns the nodes exactly one level below a node, see Node.get_direct_child_nodes
+
+        """
+
+        return self.child_nodes.get(str(nodeid), [])
+
+    def get_functions(self, nodegroupid):
+        """
+        Returns the functions of the graph triggered by saving or deleting tiles of the node group
+
+        """
+
+        nodegroupid = str(nodegroupid)
+        return [
+            functionxgraph
+            for functionxgraph in self.functions
+            if functionxgraph.config is not None
+            and (
+                functionxgraph.config.get("triggering_nodegroups") == []
+                or nodegroupid in functionxgraph.config.get("triggering_nodegroups", [])
+            )
+        ]
+
+
+def get_graph_schema(graphid):
+    """
+    Returns the GraphSchema of a graph, cached in this process until the graph changes
+
+    Arguments:
+    graphid -- the id of the graph
+
+    """
+
+    return _get_cached(get_cache_version("graph_schema"), str(graphid), lambda: GraphSchema(graphid))
+
+
+def get_graph_schema_for_nodegroup(nodegroupid):
+    """
+    Returns the GraphSchema of the graph a node group belongs to
+
+    Arguments:
+    nodegroupid -- the id of the node group
+
+    """
+
+    version = get_cache_version("graph_schema")
+    nodegroup_graphs = _get_cached(
+        version,
+        "nodegroups",
+        lambda: {
+            str(nodegroupid): str(graphid)
+            for nodegroupid, graphid in models.Node.objects.exclude(nodegroup=None)
+            .order_by()
+            .values_list("nodegroup_id", "graph_id")
+            .distinct()
+        },
+    )
+    try:
+        graphid = nodegroup_graphs[str(nodegroupid)]
+    except KeyError:
+        raise models.NodeGroup.DoesNotExist(f"Node group {nodegroupid} is not a node group of any graph")
+    return _get_cached(version, graphid, lambda: GraphSchema(graphid))
+
+
+def get_graph(graphid):
+    """
+    Returns a Graph (nodes, edges, cards and widgets), cached until the graph changes in any process,
+    each call returns a new copy so it's safe to modify but changes aren't shared
+
+    Arguments:
+    graphid -- the id of the graph
+
+    """
+
+    from arches.app.models.graph import Graph
+
+    key = "graph_{0}_{1}".format(get_cache_version("graph_schema"), graphid)
+    graph = cache.get(key)
+    if graph is None:
+        graph = Graph.objects.get(pk=graphid)
+        cache.set(key, graph, settings.GRAPH_MODEL_CACHE_TIMEOUT)
+    return graph
+
+
+def get_serialized_graph(graphid, exclude=None):
+    """
+    Returns a graph serialized to python dicts and lists, see Graph.serialize
+    serializations without "is_editable" are cached until the graph changes in any process,
+    "is_editable" depends on the graph's business data so is found each time (from the cached Graph)
+
+    Arguments:
+    graphid -- the id of the graph
+
+    Keyword Arguments:
+    exclude -- a list of the keys to leave out of the serialized graph eg: ["cards", "functions", "is_editable"]
+
+    """
+
+    exclude = sorted(set(exclude if exclude is not None else []))
+    if "is_editable" not in exclude:
+        return JSONSerializer().serializeToPython(get_graph(graphid), sort_keys=False, exclude=exclude)
+
+    version = get_cache_version("graph_schema")
+    key = "serialized_graph_{0}_{1}_{2}".format(version, graphid, hashlib.md5(",".join(exclude).encode("utf-8")).hexdigest())
+    serialized_graph = cache.get(key)
+    if serialized_graph is None:
+        serialized_graph = JSONSerializer().serializeToPython(get_graph(graphid), sort_keys=False, exclude=exclude)
+        cache.set(key, serialized_graph, settings.GRAPH_MODEL_CACHE_TIMEOUT)
+    return serialized_graph
+
+
+def _get_cached(version, key, load):
+    with _schemas_lock:
+        value = _schemas.get((version, key))
+    if value is None:
+        value = load()
+        with _schemas_lock:
+            # schemas of earlier versions are no longer needed
+            for stale_key in [stale_key for stale_key in _schemas if stale_key[0] != version]:
+                del _schemas[stale_key]
+            _schemas[(version, key)] = value
+    return value
+
+
+def clear_graph_schema_cache():
+    """
+    Clears the cached schemas, graphs and serialized graphs of all graphs (in every process)
+
+    """
+
+    incr_cache_version_now_and_on_commit("graph_schema")
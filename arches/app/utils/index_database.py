@@ -1,11 +1,13 @@
 import pyprind
-from django.db import connection
+from multiprocessing import Pool, cpu_count
+from django.db import connection, connections
 from django.db.models import Q
 from arches.app.models import models
 from arches.app.models.models import Value
 from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
 from arches.app.search.search_engine_factory import SearchEngineInstance as se
+from arches.app.search.search_engine_factory import SearchEngineFactory
 from arches.app.search.elasticsearch_dsl_builder import Query, Term
 from arches.app.search.base_index import get_index
 from arches.app.search.mappings import TERMS_INDEX, CONCEPTS_INDEX, RESOURCE_RELATIONS_INDEX, RESOURCES_INDEX
@@ -13,8 +15,12 @@ from arches.app.datatypes.datatypes import DataTypeFactory
 from arches.app.utils import import_class_from_string
 from datetime import datetime
 
+# per process state of the workers used by _index_resources_in_parallel
+_worker_se = None
+_worker_node_datatypes = None
 
-def index_db(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False):
+
+def index_db(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False, use_multiprocessing=False, max_subprocesses=0):
     """
     Deletes any existing indicies from elasticsearch and then indexes all
     concepts and resources from the database
@@ -23,16 +29,26 @@ def index_db(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet
     clear_index -- set to True to remove all the resources and concepts from the index before the reindexing operation
     batch_size -- the number of records to index as a group, the larger the number to more memory required
     quiet -- Silences the status bar output during certain operations, use in celery operations for example
+    use_multiprocessing -- set to True to index resources in parallel using a pool of worker processes
+    max_subprocesses -- the number of worker processes to use when use_multiprocessing is True, 0 (default) uses one per cpu
 
     """
 
     index_concepts(clear_index=clear_index, batch_size=batch_size)
-    index_resources(clear_index=clear_index, batch_size=batch_size, quiet=quiet)
+    index_resources(
+        clear_index=clear_index,
+        batch_size=batch_size,
+        quiet=quiet,
+        use_multiprocessing=use_multiprocessing,
+        max_subprocesses=max_subprocesses,
+    )
     index_custom_indexes(clear_index=clear_index, batch_size=batch_size, quiet=quiet)
     index_resource_relations(clear_index=clear_index, batch_size=batch_size)
 
 
-def index_resources(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False):
+def index_resources(
+    clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False, use_multiprocessing=False, max_subprocesses=0
+):
     """
     Indexes all resources from the database
 
@@ -40,6 +56,8 @@ def index_resources(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE
     clear_index -- set to True to remove all the resources from the index before the reindexing operation
     batch_size -- the number of records to index as a group, the larger the number to more memory required
     quiet -- Silences the status bar output during certain operations, use in celery operations for example
+    use_multiprocessing -- set to True to index resources in parallel using a pool of worker processes
+    max_subprocesses -- the number of worker processes to use when use_multiprocessing is True, 0 (default) uses one per cpu
 
     """
 
@@ -52,10 +70,24 @@ def index_resources(clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE
         .exclude(graphid=settings.SYSTEM_SETTINGS_RESOURCE_MODEL_ID)
         .values_list("graphid", flat=True)
     )
-    index_resources_by_type(resource_types, clear_index=clear_index, batch_size=batch_size, quiet=quiet)
+    index_resources_by_type(
+        resource_types,
+        clear_index=clear_index,
+        batch_size=batch_size,
+        quiet=quiet,
+        use_multiprocessing=use_multiprocessing,
+        max_subprocesses=max_subprocesses,
+    )
 
 
-def index_resources_by_type(resource_types, clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False):
+def index_resources_by_type(
+    resource_types,
+    clear_index=True,
+    batch_size=settings.BULK_IMPORT_BATCH_SIZE,
+    quiet=False,
+    use_multiprocessing=False,
+    max_subprocesses=0,
+):
     """
     Indexes all resources of a given type(s)
 
@@ -66,6 +98,10 @@ def index_resources_by_type(resource_types, clear_index=True, batch_size=setting
     clear_index -- set to True to remove all the resources of the types passed in from the index before the reindexing operation
     batch_size -- the number of records to index as a group, the larger the number to more memory required
     quiet -- Silences the status bar output during certain operations, use in celery operations for example
+    use_multiprocessing -- set to True to split each resource type into ranges of resourceinstanceids and index
+        those ranges in parallel using a pool of worker processes, resources are indexed serially when called
+        inside a transaction because the workers can't see its changes (and the transaction's connection can't be closed)
+    max_subprocesses -- the number of worker processes to use when use_multiprocessing is True, 0 (default) uses one per cpu
 
     """
 
@@ -74,6 +110,9 @@ def index_resources_by_type(resource_types, clear_index=True, batch_size=setting
     node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
     if isinstance(resource_types, str):
         resource_types = [resource_types]
+    if use_multiprocessing and connection.in_atomic_block:
+        print("Resources can't be indexed in parallel inside a transaction, indexing them serially")
+        use_multiprocessing = False
 
     for resource_type in resource_types:
         start = datetime.now()
@@ -87,21 +126,30 @@ def index_resources_by_type(resource_types, clear_index=True, batch_size=setting
         if clear_index:
             q.delete(index=RESOURCES_INDEX, refresh=True)
 
-        with se.BulkIndexer(batch_size=batch_size, refresh=True) as doc_indexer:
-            with se.BulkIndexer(batch_size=batch_size, refresh=True) as term_indexer:
-                if quiet is False:
-                    bar = pyprind.ProgBar(len(resources), bar_char="█") if len(resources) > 1 else None
-                for resource in resources:
-                    if quiet is False and bar is not None:
-                        bar.update(item_id=resource)
-                    document, terms = resource.get_documents_to_index(
-                        fetchTiles=True, datatype_factory=datatype_factory, node_datatypes=node_datatypes
-                    )
-                    doc_indexer.add(index=RESOURCES_INDEX, id=document["resourceinstanceid"], data=document)
-                    for term in terms:
-                        term_indexer.add(index=TERMS_INDEX, id=term["_id"], data=term["_source"])
-
-        result_summary = {"database": len(resources), "indexed": se.count(index=RESOURCES_INDEX, body=q.dsl)}
+        if use_multiprocessing:
+            resource_count = resources.count()
+            _index_resources_in_parallel(
+                resource_type, resource_count, batch_size=batch_size, quiet=quiet, max_subprocesses=max_subprocesses
+            )
+        else:
+            resource_count = len(resources)
+            with se.BulkIndexer(batch_size=batch_size, refresh=True) as doc_indexer:
+                with se.BulkIndexer(batch_size=batch_size, refresh=True) as term_indexer:
+                    if quiet is False:
+                        bar = pyprind.ProgBar(len(resources), bar_char="█") if len(resources) > 1 else None
+                    for i in range(0, resource_count, batch_size):
+                        resource_batch = resources[i : i + batch_size]
+                        documents = Resource.get_documents_to_index__bulk(
+                            resource_batch, fetchTiles=True, datatype_factory=datatype_factory, node_datatypes=node_datatypes
+                        )
+                        for resource, (document, terms) in zip(resource_batch, documents):
+                            if quiet is False and bar is not None:
+                                bar.update(item_id=resource)
+                            doc_indexer.add(index=RESOURCES_INDEX, id=document["resourceinstanceid"], data=document)
+                            for term in terms:
+                                term_indexer.add(index=TERMS_INDEX, id=term["_id"], data=term["_source"])
+
+        result_summary = {"database": resource_count, "indexed": se.count(index=RESOURCES_INDEX, body=q.dsl)}
         status = "Passed" if result_summary["database"] == result_summary["indexed"] else "Failed"
         print(
             "Status: {0}, Resource Type: {1}, In Database: {2}, Indexed: {3}, Took: {4} seconds".format(
@@ -111,6 +159,108 @@ def index_resources_by_type(resource_types, clear_index=True, batch_size=setting
     return status
 
 
+def _get_resourceid_ranges(resource_type, range_size):
+    """
+    Splits the resources of a given type into contiguous ranges of resourceinstanceids
+    returns a list of (lower, upper) tuples where lower is exclusive and upper is inclusive,
+    None meaning the range is unbounded on that side
+
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT resourceinstanceid FROM (
+                SELECT resourceinstanceid, row_number() OVER (ORDER BY resourceinstanceid) AS rownumber
+                FROM resource_instances
+                WHERE graphid = %s
+            ) AS ordered_resources
+            WHERE rownumber %% %s = 0
+            ORDER BY resourceinstanceid
+            """,
+            [str(resource_type), range_size],
+        )
+        boundaries = [str(row[0]) for row in cursor.fetchall()]
+
+    lower_bounds = [None] + boundaries
+    upper_bounds = boundaries + [None]
+    return list(zip(lower_bounds, upper_bounds))
+
+
+def _init_index_worker():
+    """
+    Runs once in each worker process of a parallel reindex, giving the worker its own
+    database connection and Elasticsearch client
+
+    """
+
+    global _worker_se, _worker_node_datatypes
+    connections.close_all()
+    _worker_se = SearchEngineFactory().create()
+    _worker_node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
+
+
+def _index_resource_range(resource_range):
+    """
+    Indexes the resources of a single range of resourceinstanceids, this function must be outside
+    of index_resources_by_type in order for it to be called with multiprocessing
+
+    Arguments:
+    resource_range -- a tuple of (resource_type, lower, upper, batch_size) as returned by _get_resourceid_ranges
+
+    """
+
+    resource_type, lower, upper, batch_size = resource_range
+    datatype_factory = DataTypeFactory()
+    resources = Resource.objects.filter(graph_id=resource_type).order_by("resourceinstanceid")
+    if lower is not None:
+        resources = resources.filter(resourceinstanceid__gt=lower)
+    if upper is not None:
+        resources = resources.filter(resourceinstanceid__lte=upper)
+
+    resources = list(resources)
+    with _worker_se.BulkIndexer(batch_size=batch_size) as doc_indexer:
+        with _worker_se.BulkIndexer(batch_size=batch_size) as term_indexer:
+            for document, terms in Resource.get_documents_to_index__bulk(
+                resources, fetchTiles=True, datatype_factory=datatype_factory, node_datatypes=_worker_node_datatypes
+            ):
+                doc_indexer.add(index=RESOURCES_INDEX, id=document["resourceinstanceid"], data=document)
+                for term in terms:
+                    term_indexer.add(index=TERMS_INDEX, id=term["_id"], data=term["_source"])
+    return len(resources)
+
+
+def _index_resources_in_parallel(
+    resource_type, resource_count, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False, max_subprocesses=0
+):
+    """
+    Fans the indexing of all resources of a given type out to a pool of worker processes,
+    one range of resourceinstanceids at a time
+
+    Arguments:
+    resource_type -- the graph id of the resources to index
+    resource_count -- the number of resources of this type in the database, used for the progress bar
+
+    """
+
+    resource_type = str(resource_type)
+    ranges = [(resource_type, lower, upper, batch_size) for lower, upper in _get_resourceid_ranges(resource_type, batch_size)]
+    if len(ranges) == 0:
+        return
+    processes = max_subprocesses if max_subprocesses > 0 else cpu_count()
+    bar = pyprind.ProgBar(resource_count, bar_char="█") if quiet is False and resource_count > 1 else None
+
+    # connections must not be shared with the forked worker processes
+    connections.close_all()
+    with Pool(processes=min(processes, len(ranges)), initializer=_init_index_worker) as pool:
+        for count in pool.imap_unordered(_index_resource_range, ranges):
+            if bar is not None and count > 0:
+                bar.update(iterations=count)
+
+    se.refresh(index=RESOURCES_INDEX)
+    se.refresh(index=TERMS_INDEX)
+
+
 def index_custom_indexes(index_name=None, clear_index=True, batch_size=settings.BULK_IMPORT_BATCH_SIZE, quiet=False):
     """
     Indexes any custom indexes, optionally by name
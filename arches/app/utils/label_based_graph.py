@@ -1,5 +1,5 @@
 from arches.app.datatypes.datatypes import DataTypeFactory
-from arches.app.models import models
+from arches.app.utils.graph_schema import get_graph_schema, get_graph_schema_for_nodegroup
 
 RESOURCE_ID_KEY = "@resource_id"
 NODE_ID_KEY = "@node_id"
@@ -66,11 +66,14 @@ class LabelBasedNode(object):
 
 class LabelBasedGraph(object):
     @staticmethod
-    def generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(resource):
+    def generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(resource, graph_schema=None):
         """
         Builds a reference of all nodes in a in a given resource,
         paired with a list of tiles in which they exist
         """
+        if graph_schema is None:
+            graph_schema = get_graph_schema(resource.graph_id)
+
         node_ids_to_tiles_reference = {}
         nodegroupids = set()
 
@@ -86,8 +89,11 @@ class LabelBasedGraph(object):
                 tile_list.append(tile)
                 node_ids_to_tiles_reference[node_id] = tile_list
 
-        nodegroup_cardinality = models.NodeGroup.objects.filter(pk__in=nodegroupids).values("nodegroupid", "cardinality")
-        nodegroup_cardinality_reference = {str(nodegroup["nodegroupid"]): nodegroup["cardinality"] for nodegroup in nodegroup_cardinality}
+        nodegroup_cardinality_reference = {
+            nodegroupid: graph_schema.nodegroups[nodegroupid].cardinality
+            for nodegroupid in nodegroupids
+            if nodegroupid in graph_schema.nodegroups
+        }
 
         return node_ids_to_tiles_reference, nodegroup_cardinality_reference
 
@@ -102,6 +108,7 @@ class LabelBasedGraph(object):
         compact=False,
         hide_empty_nodes=False,
         as_json=True,
+        graph_schema=None,
     ):
         """
         Generates a label-based graph from a given tile
@@ -114,9 +121,13 @@ class LabelBasedGraph(object):
 
         nodegroup_id = tile.nodegroup_id
 
+        # the nodes and their children are read from the graph's cached schema rather than queried for every tile
+        if graph_schema is None:
+            graph_schema = get_graph_schema_for_nodegroup(nodegroup_id)
+
         node = node_cache.get(nodegroup_id)
         if not node:
-            node = models.Node.objects.get(pk=nodegroup_id)
+            node = graph_schema.get_node(nodegroup_id)
             node_cache[nodegroup_id] = node
 
         graph = cls._build_graph(
@@ -125,7 +136,7 @@ class LabelBasedGraph(object):
             parent_tree=None,
             node_ids_to_tiles_reference=node_ids_to_tiles_reference,
             nodegroup_cardinality_reference=nodegroup_cardinality_reference,
-            node_cache=node_cache,
+            graph_schema=graph_schema,
             datatype_factory=datatype_factory,
         )
 
@@ -147,10 +158,12 @@ class LabelBasedGraph(object):
         if not resource.tiles:
             resource.load_tiles(user, perm)
 
+        graph_schema = get_graph_schema(resource.graph_id)
+
         (
             node_ids_to_tiles_reference,
             nodegroup_cardinality_reference,
-        ) = cls.generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(resource=resource)
+        ) = cls.generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(resource=resource, graph_schema=graph_schema)
 
         root_label_based_node = LabelBasedNode(name=None, node_id=None, tile_id=None, value=None, cardinality=None)
 
@@ -164,6 +177,7 @@ class LabelBasedGraph(object):
                 compact=compact,
                 hide_empty_nodes=hide_empty_nodes,
                 as_json=False,
+                graph_schema=graph_schema,
             )
 
             if label_based_graph:
@@ -189,9 +203,15 @@ class LabelBasedGraph(object):
         Generates a list of label-based graph from given resources
         """
 
+        from arches.app.models.resource import Resource
+
         datatype_factory = DataTypeFactory()
         node_cache = {}
 
+        # load the tiles of all the resources with a single query
+        resources = list(resources)
+        Resource.load_tiles__bulk([resource for resource in resources if not resource.tiles])
+
         resource_label_based_graphs = []
 
         for resource in resources:
@@ -230,12 +250,20 @@ class LabelBasedGraph(object):
 
     @classmethod
     def _build_graph(
-        cls, input_node, input_tile, parent_tree, node_ids_to_tiles_reference, nodegroup_cardinality_reference, node_cache, datatype_factory
+        cls,
+        input_node,
+        input_tile,
+        parent_tree,
+        node_ids_to_tiles_reference,
+        nodegroup_cardinality_reference,
+        graph_schema,
+        datatype_factory,
     ):
         for associated_tile in node_ids_to_tiles_reference.get(str(input_node.pk), [input_tile]):
-            parent_tile = associated_tile.parenttile
+            # compare ids so the parent tile isn't fetched from the database
+            parent_tile_id = associated_tile.parenttile_id
 
-            if associated_tile == input_tile or parent_tile == input_tile:
+            if associated_tile == input_tile or (parent_tile_id is not None and str(parent_tile_id) == str(input_tile.pk)):
                 if (  # don't instantiate `LabelBasedNode`s of cardinality `n` unless they are semantic or have value
                     input_node.datatype == "semantic" or str(input_node.pk) in associated_tile.data
                 ):
@@ -248,22 +276,19 @@ class LabelBasedGraph(object):
                     )
 
                     if not parent_tree:  # if top node and
-                        if not parent_tile:  # if not top node in separate card
+                        if not parent_tile_id:  # if not top node in separate card
                             parent_tree = label_based_node
                     else:
                         parent_tree.child_nodes.append(label_based_node)
 
-                    for child_node in input_node.get_direct_child_nodes():
-                        if not node_cache.get(child_node.pk):
-                            node_cache[child_node.pk] = child_node
-
+                    for child_node in graph_schema.get_child_nodes(input_node.pk):
                         cls._build_graph(
                             input_node=child_node,
                             input_tile=associated_tile,
                             parent_tree=label_based_node,
                             node_ids_to_tiles_reference=node_ids_to_tiles_reference,
                             nodegroup_cardinality_reference=nodegroup_cardinality_reference,
-                            node_cache=node_cache,
+                            graph_schema=graph_schema,
                             datatype_factory=datatype_factory,
                         )
 
@@ -0,0 +1,441 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import logging
+import math
+import multiprocessing
+from datetime import datetime, timedelta
+from django.db import connection, connections
+from django.db.models import Q
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+
+logger = logging.getLogger(__name__)
+
+EARTHCIRCUM = 40075016.6856
+PIXELSPERTILE = 256
+
+_worker_node = None
+_worker_resource_ids = None
+
+
+def get_tile(node, zoom, x, y, resource_ids):
+    """
+    Returns the vector tile of a geojson-feature-collection node from the tile cache,
+    the tile is created and cached if it isn't already
+
+    Arguments:
+    node -- the node to create the tile for
+    zoom, x, y -- the tile coordinates
+    resource_ids -- the ids of resources to leave out of the tile
+
+    """
+
+    fingerprint = get_permission_fingerprint(resource_ids)
+    cached_tiles = models.MVTTileCache.objects.filter(node_id=node.pk, zoom=zoom, x=x, y=y, fingerprint=fingerprint)
+    if settings.TILE_CACHE_TIMEOUT is not None:
+        cached_tiles = cached_tiles.filter(createdtime__gte=datetime.now() - timedelta(seconds=settings.TILE_CACHE_TIMEOUT))
+    tile = cached_tiles.values_list("tile", flat=True).first()
+    if tile is None:
+        tile = create_tile(node, zoom, x, y, resource_ids)
+        cache_tile(node.pk, zoom, x, y, fingerprint, tile)
+    return bytes(tile)
+
+
+def get_permission_fingerprint(resource_ids):
+    """
+    Returns a key identifying a set of restricted resources, tiles are only shared by requests
+    that leave out the same resources
+
+    """
+
+    return hashlib.md5(",".join(sorted(str(resource_id) for resource_id in resource_ids)).encode("utf-8")).hexdigest()
+
+
+def cache_tile(nodeid, zoom, x, y, fingerprint, tile):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO mvt_tile_cache(nodeid, zoom, x, y, fingerprint, tile, createdtime)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (nodeid, zoom, x, y, fingerprint)
+            DO UPDATE SET tile = EXCLUDED.tile, createdtime = EXCLUDED.createdtime;""",
+            [nodeid, zoom, x, y, fingerprint, tile, datetime.now()],
+        )
+        # copies of the tile leaving out a different set of restricted resources are out of date
+        cursor.execute(
+            """DELETE FROM mvt_tile_cache
+            WHERE nodeid = %s AND zoom = %s AND x = %s AND y = %s AND fingerprint <> %s;""",
+            [nodeid, zoom, x, y, fingerprint],
+        )
+
+
+def create_tile(node, zoom, x, y, resource_ids):
+    """
+    Creates the vector tile of a geojson-feature-collection node, geometries are clustered
+    at zoom levels up to the node's clusterMaxZoom
+
+    Arguments:
+    node -- the node to create the tile for
+    zoom, x, y -- the tile coordinates
+    resource_ids -- the ids of resources to leave out of the tile
+
+    """
+
+    nodeid = str(node.pk)
+    config = node.config
+    # precomputed clusters can only be used when none of the resources are hidden from the user
+    restricted_resources = len(resource_ids) > 0
+    if len(resource_ids) == 0:
+        resource_ids = ["10000000-0000-0000-0000-000000000001"]  # This must have a uuid that will never be a resource id.
+    resource_ids = tuple(resource_ids)
+    # geometries beyond the tile edge are still drawn in the tile's buffer (256 of 4096 units)
+    edge_buffer = EARTHCIRCUM / (1 << zoom) / 16
+    with connection.cursor() as cursor:
+        if zoom <= int(config["clusterMaxZoom"]):
+            if settings.MVT_PRECOMPUTED_CLUSTERS is True and not restricted_resources:
+                # the clusters can't be used where geometries have been edited since they were computed
+                cursor.execute(
+                    """SELECT EXISTS (SELECT 1 FROM geojson_geometry_clusters WHERE nodeid = %s AND zoom = %s)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM geojson_geometry_cluster_invalidations
+                        WHERE nodeid = %s AND zoom = %s AND geom && ST_Expand(TileBBox(%s, %s, %s, 3857), %s)
+                    );""",
+                    [nodeid, zoom, nodeid, zoom, zoom, x, y, edge_buffer],
+                )
+                use_precomputed_clusters = cursor.fetchone()[0]
+            else:
+                use_precomputed_clusters = False
+            if use_precomputed_clusters:
+                cursor.execute(
+                    """SELECT ST_AsMVT(tile, %s, 4096, 'geom', 'id') FROM (
+                        SELECT resourceinstanceid::text,
+                            id,
+                            total,
+                            ST_AsMVTGeom(
+                                geom,
+                                TileBBox(%s, %s, %s, 3857)
+                            ) AS geom,
+                            extent
+                        FROM geojson_geometry_clusters
+                        WHERE nodeid = %s AND zoom = %s
+                        AND geom && ST_Expand(TileBBox(%s, %s, %s, 3857), %s)
+                    ) AS tile;""",
+                    [nodeid, zoom, x, y, nodeid, zoom, zoom, x, y, edge_buffer],
+                )
+            else:
+                arc = EARTHCIRCUM / ((1 << zoom) * PIXELSPERTILE)
+                distance = arc * float(config["clusterDistance"])
+                min_points = int(config["clusterMinPoints"])
+                distance = settings.CLUSTER_DISTANCE_MAX if distance > settings.CLUSTER_DISTANCE_MAX else distance
+                # geometries within the cluster distance of the tile can join clusters that fall inside it
+                cursor.execute(
+                    """WITH clusters(tileid, resourceinstanceid, nodeid, geom, cid)
+                    AS (
+                        SELECT m.*,
+                        ST_ClusterDBSCAN(geom, eps := %s, minpoints := %s) over () AS cid
+                        FROM (
+                            SELECT tileid,
+                                resourceinstanceid,
+                                nodeid,
+                                geom
+                            FROM geojson_geometries
+                            WHERE nodeid = %s and resourceinstanceid not in %s
+                            AND geom && ST_Expand(TileBBox(%s, %s, %s, 3857), %s)
+                        ) m
+                    )
+
+                    SELECT ST_AsMVT(
+                        tile,
+                         %s,
+                        4096,
+                        'geom',
+                        'id'
+                    ) FROM (
+                        SELECT resourceinstanceid::text,
+                            row_number() over () as id,
+                            1 as total,
+                            ST_AsMVTGeom(
+                                geom,
+                                TileBBox(%s, %s, %s, 3857)
+                            ) AS geom,
+                            '' AS extent
+                        FROM clusters
+                        WHERE cid is NULL
+                        UNION
+                        SELECT NULL as resourceinstanceid,
+                            row_number() over () as id,
+                            count(*) as total,
+                            ST_AsMVTGeom(
+                                ST_Centroid(
+                                    ST_Collect(geom)
+                                ),
+                                TileBBox(%s, %s, %s, 3857)
+                            ) AS geom,
+                            ST_AsGeoJSON(
+                                ST_Extent(geom)
+                            ) AS extent
+                        FROM clusters
+                        WHERE cid IS NOT NULL
+                        GROUP BY cid
+                    ) as tile;""",
+                    [
+                        distance,
+                        min_points,
+                        nodeid,
+                        resource_ids,
+                        zoom,
+                        x,
+                        y,
+                        distance + edge_buffer,
+                        nodeid,
+                        zoom,
+                        x,
+                        y,
+                        zoom,
+                        x,
+                        y,
+                    ],
+                )
+        else:
+            cursor.execute(
+                """SELECT ST_AsMVT(tile, %s, 4096, 'geom', 'id') FROM (SELECT tileid,
+                    id,
+                    resourceinstanceid,
+                    nodeid,
+                    ST_AsMVTGeom(
+                        geom,
+                        TileBBox(%s, %s, %s, 3857)
+                    ) AS geom,
+                    1 AS total
+                FROM geojson_geometries
+                WHERE nodeid = %s and resourceinstanceid not in %s
+                AND geom && ST_Expand(TileBBox(%s, %s, %s, 3857), %s)) AS tile;""",
+                [nodeid, zoom, x, y, nodeid, resource_ids, zoom, x, y, edge_buffer],
+            )
+        return bytes(cursor.fetchone()[0])
+
+
+def invalidate_tiles(node, extent):
+    """
+    Removes the cached tiles of a node that cover the given extent, all cached tiles at
+    clustered zoom levels are removed because clusters can reach beyond the extent
+
+    Arguments:
+    node -- the geojson-feature-collection node that changed
+    extent -- (minx, miny, maxx, maxy) of the changed geometries in EPSG:3857
+
+    """
+
+    if extent is None or None in extent:
+        return
+    minx, miny, maxx, maxy = extent
+    half = EARTHCIRCUM / 2
+    with connection.cursor() as cursor:
+        # the extent is widened by the tile buffer (256 of 4096 units) at each zoom
+        cursor.execute(
+            """DELETE FROM mvt_tile_cache
+            WHERE nodeid = %(nodeid)s
+            AND (
+                zoom <= %(clustermaxzoom)s
+                OR (
+                    x BETWEEN floor((%(minx)s + %(half)s) / (%(circum)s / 2 ^ zoom) - 0.0625)
+                        AND floor((%(maxx)s + %(half)s) / (%(circum)s / 2 ^ zoom) + 0.0625)
+                    AND y BETWEEN floor((%(half)s - %(maxy)s) / (%(circum)s / 2 ^ zoom) - 0.0625)
+                        AND floor((%(half)s - %(miny)s) / (%(circum)s / 2 ^ zoom) + 0.0625)
+                )
+            );""",
+            {
+                "nodeid": node.pk,
+                "clustermaxzoom": int(node.config.get("clusterMaxZoom", -1)),
+                "minx": minx,
+                "miny": miny,
+                "maxx": maxx,
+                "maxy": maxy,
+                "half": half,
+                "circum": EARTHCIRCUM,
+            },
+        )
+
+
+def get_geometry_extents(tileid):
+    """
+    Returns the extent (in EPSG:3857) of each node's geometries in a tile as a dict keyed by nodeid
+
+    """
+
+    return _get_geometry_extents("tileid", tileid)
+
+
+def get_resource_geometry_extents(resourceinstanceid):
+    """
+    Returns the extent (in EPSG:3857) of each node's geometries in all the tiles of a resource as a dict keyed by nodeid
+
+    """
+
+    return _get_geometry_extents("resourceinstanceid", resourceinstanceid)
+
+
+def _get_geometry_extents(column, value):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT nodeid, ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent)
+            FROM (
+                SELECT nodeid, ST_Extent(geom) AS extent FROM geojson_geometries WHERE {0} = %s GROUP BY nodeid
+            ) extents;""".format(column),
+            [value],
+        )
+        return {str(row[0]): row[1:] for row in cursor.fetchall()}
+
+
+def clear_tiles(nodeid=None):
+    """
+    Removes all cached tiles, or just those of one node
+
+    """
+
+    cached_tiles = models.MVTTileCache.objects.all()
+    if nodeid is not None:
+        cached_tiles = cached_tiles.filter(node_id=nodeid)
+    cached_tiles.delete()
+
+
+def invalidate_clusters(node, extent):
+    """
+    Marks the precomputed clusters of a node that are affected by geometries changed within an extent as out of date,
+    tiles overlapping them are clustered on request until the clusters are refreshed along with all the geometries
+    (eg: by the refresh_geojson_geometries task), the clusters elsewhere are still used
+
+    Arguments:
+    node -- the geojson-feature-collection node that changed
+    extent -- (minx, miny, maxx, maxy) of the changed geometries in EPSG:3857
+
+    """
+
+    if settings.MVT_PRECOMPUTED_CLUSTERS is not True or extent is None or None in extent:
+        return
+    minx, miny, maxx, maxy = extent
+    with connection.cursor() as cursor:
+        # at each zoom, geometries within the cluster distance of the extent can join or leave the clusters they reach,
+        # so the out of date area also covers the bounding boxes of those clusters (which hold their centroids)
+        cursor.execute(
+            """WITH areas AS (
+                SELECT z.zoom,
+                    ST_Expand(
+                        ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 3857),
+                        LEAST(%(circum)s / ((1 << z.zoom) * %(pixels)s) * %(clusterdistance)s, %(maxdistance)s)
+                    ) AS area
+                FROM generate_series(0, %(clustermaxzoom)s) AS z(zoom)
+                WHERE EXISTS (SELECT 1 FROM geojson_geometry_clusters c WHERE c.nodeid = %(nodeid)s AND c.zoom = z.zoom)
+            )
+            INSERT INTO geojson_geometry_cluster_invalidations (nodeid, zoom, geom)
+            SELECT %(nodeid)s,
+                a.zoom,
+                ST_SetSRID(ST_Extent(ST_Collect(a.area, COALESCE(c.bbox, a.area)))::geometry, 3857)
+            FROM areas a
+            LEFT JOIN geojson_geometry_clusters c ON c.nodeid = %(nodeid)s AND c.zoom = a.zoom AND c.bbox && a.area
+            GROUP BY a.zoom;""",
+            {
+                "nodeid": node.pk,
+                "clustermaxzoom": int(node.config.get("clusterMaxZoom", -1)),
+                "clusterdistance": float(node.config.get("clusterDistance", 0)),
+                "maxdistance": settings.CLUSTER_DISTANCE_MAX,
+                "minx": minx,
+                "miny": miny,
+                "maxx": maxx,
+                "maxy": maxy,
+                "circum": EARTHCIRCUM,
+                "pixels": PIXELSPERTILE,
+            },
+        )
+
+
+def purge_tiles(resource_ids):
+    """
+    Removes cached tiles that have expired or that leave out a different set of restricted resources,
+    returns the number of tiles removed (stale copies of a tile are also removed whenever it's cached again)
+
+    Arguments:
+    resource_ids -- the ids of the resources currently left out of tiles
+
+    """
+
+    stale = ~Q(fingerprint=get_permission_fingerprint(resource_ids))
+    if settings.TILE_CACHE_TIMEOUT is not None:
+        stale |= Q(createdtime__lt=datetime.now() - timedelta(seconds=settings.TILE_CACHE_TIMEOUT))
+    return models.MVTTileCache.objects.filter(stale).delete()[0]
+
+
+def seed_tiles(node, min_zoom, max_zoom, resource_ids, use_multiprocessing=False, max_subprocesses=0):
+    """
+    Creates and caches every tile covering the geometries of a node between the given zoom levels,
+    returns the number of tiles created
+
+    Arguments:
+    node -- the geojson-feature-collection node to create tiles for
+    min_zoom, max_zoom -- the range of zoom levels to create tiles for
+    resource_ids -- the ids of resources to leave out of the tiles
+
+    Keyword Arguments:
+    use_multiprocessing -- True to create the tiles in several processes
+    max_subprocesses -- the number of processes to use, 0 to use one less than the number of cpus
+
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent)
+            FROM (SELECT ST_Extent(geom) AS extent FROM geojson_geometries WHERE nodeid = %s) extents;""",
+            [node.pk],
+        )
+        minx, miny, maxx, maxy = cursor.fetchone()
+    if minx is None:
+        return 0
+
+    half = EARTHCIRCUM / 2
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        size = EARTHCIRCUM / (1 << zoom)
+        last = (1 << zoom) - 1
+        for x in range(max(int(math.floor((minx + half) / size)), 0), min(int(math.floor((maxx + half) / size)), last) + 1):
+            for y in range(max(int(math.floor((half - maxy) / size)), 0), min(int(math.floor((half - miny) / size)), last) + 1):
+                tiles.append((zoom, x, y))
+
+    if use_multiprocessing is True:
+        process_count = max_subprocesses if max_subprocesses > 0 else max(multiprocessing.cpu_count() - 1, 1)
+        connections.close_all()
+        with multiprocessing.Pool(processes=process_count, initializer=_init_seed_worker, initargs=(node.pk, resource_ids)) as pool:
+            pool.map(_seed_tile, tiles, chunksize=64)
+    else:
+        fingerprint = get_permission_fingerprint(resource_ids)
+        for zoom, x, y in tiles:
+            cache_tile(node.pk, zoom, x, y, fingerprint, create_tile(node, zoom, x, y, resource_ids))
+    return len(tiles)
+
+
+def _init_seed_worker(nodeid, resource_ids):
+    global _worker_node, _worker_resource_ids
+    connections.close_all()
+    _worker_node = models.Node.objects.get(pk=nodeid)
+    _worker_resource_ids = resource_ids
+
+
+def _seed_tile(coordinates):
+    zoom, x, y = coordinates
+    tile = create_tile(_worker_node, zoom, x, y, _worker_resource_ids)
+    cache_tile(_worker_node.pk, zoom, x, y, get_permission_fingerprint(_worker_resource_ids), tile)
@@ -1,12 +1,13 @@
-from arches.app.models.models import Node, TileModel, EditLog
+from arches.app.models.models import Node, NodeGroup, TileModel, EditLog
 from arches.app.models.system_settings import settings
 from guardian.backends import check_support
 from guardian.backends import ObjectPermissionBackend
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.core.exceptions import ObjectDoesNotExist
 from guardian.core import ObjectPermissionChecker
 from guardian.shortcuts import (
     get_perms,
-    get_objects_for_user,
     get_group_perms,
     get_user_perms,
     get_users_with_perms,
@@ -16,10 +17,15 @@ from guardian.shortcuts import (
 from guardian.models import GroupObjectPermission, UserObjectPermission
 from guardian.exceptions import WrongAppError
 from django.contrib.auth.models import User, Group, Permission
+from django.contrib.contenttypes.models import ContentType
 from arches.app.models.models import ResourceInstance
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Bool, Query, Terms, Nested
 from arches.app.search.mappings import RESOURCES_INDEX
+from arches.app.utils.cache_version import get_cache_version, incr_cache_version_now_and_on_commit
+
+# incremented whenever node group permissions are cleared in this process, so permissions memoised on user objects are reloaded
+_nodegroup_permissions_generation = 0
 
 
 class PermissionBackend(ObjectPermissionBackend):
@@ -34,6 +40,9 @@ class PermissionBackend(ObjectPermissionBackend):
             if app_label != obj._meta.app_label:
                 raise WrongAppError("Passed perm has app label of '%s' and " "given obj has '%s'" % (app_label, obj._meta.app_label))
 
+        if isinstance(obj, NodeGroup) and perm in NODEGROUP_PERMISSIONS:
+            return _has_nodegroup_perm(get_nodegroup_permissions(user_obj), perm, str(obj.pk))
+
         explicitly_defined_perms = get_perms(user_obj, obj)
         if len(explicitly_defined_perms) > 0:
             if "no_access_to_nodegroup" in explicitly_defined_perms:
@@ -85,40 +94,144 @@ def get_restricted_users(resource):
     return result
 
 
+def get_restricted_users_by_resource(resourceinstanceids):
+    """
+    Bulk version of get_restricted_users, identifies which users are explicitly restricted from
+    reading, editing, deleting, or accessing each of the given resource instances using a constant
+    number of queries
+    returns a dictionary of the get_restricted_users result keyed by resourceinstanceid
+
+    Arguments:
+    resourceinstanceids -- a list of resource instance ids
+
+    """
+
+    resourceinstanceids = [str(resourceinstanceid) for resourceinstanceid in resourceinstanceids]
+    content_type = ContentType.objects.get_for_model(ResourceInstance)
+    user_perms = {}
+    user_and_group_perms = {}
+
+    for resourceinstanceid, userid, codename in UserObjectPermission.objects.filter(
+        content_type=content_type, object_pk__in=resourceinstanceids
+    ).values_list("object_pk", "user_id", "permission__codename"):
+        user_perms.setdefault(resourceinstanceid, {}).setdefault(userid, set()).add(codename)
+        user_and_group_perms.setdefault(resourceinstanceid, {}).setdefault(userid, set()).add(codename)
+
+    group_perms = {}
+    for resourceinstanceid, groupid, codename in GroupObjectPermission.objects.filter(
+        content_type=content_type, object_pk__in=resourceinstanceids
+    ).values_list("object_pk", "group_id", "permission__codename"):
+        group_perms.setdefault(resourceinstanceid, {}).setdefault(groupid, set()).add(codename)
+
+    group_members = {}
+    groupids = {groupid for perms in group_perms.values() for groupid in perms}
+    for groupid, userid in User.groups.through.objects.filter(group_id__in=groupids).values_list("group_id", "user_id"):
+        group_members.setdefault(groupid, []).append(userid)
+
+    for resourceinstanceid, perms_by_group in group_perms.items():
+        for groupid, codenames in perms_by_group.items():
+            for userid in group_members.get(groupid, []):
+                user_and_group_perms.setdefault(resourceinstanceid, {}).setdefault(userid, set()).update(codenames)
+
+    userids = {userid for perms in user_and_group_perms.values() for userid in perms}
+    users = {
+        userid: (is_superuser, is_active)
+        for userid, is_superuser, is_active in User.objects.filter(id__in=userids).values_list("id", "is_superuser", "is_active")
+    }
+
+    ret = {}
+    for resourceinstanceid in resourceinstanceids:
+        result = {
+            "no_access": [],
+            "cannot_read": [],
+            "cannot_write": [],
+            "cannot_delete": [],
+        }
+        resource_user_perms = user_perms.get(resourceinstanceid, {})
+        for userid, perms in user_and_group_perms.get(resourceinstanceid, {}).items():
+            is_superuser, is_active = users[userid]
+            if is_superuser:
+                pass
+            elif userid in resource_user_perms and "no_access_to_resourceinstance" in resource_user_perms[userid]:
+                for k, v in result.items():
+                    v.append(userid)
+            else:
+                # guardian reports no permissions for inactive users
+                perms = perms if is_active else set()
+                if "view_resourceinstance" not in perms:
+                    result["cannot_read"].append(userid)
+                if "change_resourceinstance" not in perms:
+                    result["cannot_write"].append(userid)
+                if "delete_resourceinstance" not in perms:
+                    result["cannot_delete"].append(userid)
+                if "no_access_to_resourceinstance" in perms and len(perms) == 1:
+                    result["no_access"].append(userid)
+        ret[resourceinstanceid] = result
+
+    return ret
+
+
 def get_restricted_instances(user, search_engine=None, allresources=False):
+    """
+    returns a set of the ids of resource instances that a user has no access to
+
+    Arguments:
+    user -- the user to check
+
+    Keyword Arguments:
+    search_engine -- the search engine to query for the user's restricted resources
+    allresources -- True to return every resource instance that is restricted for any user,
+        this set is cached until resource instance permissions change
+
+    """
+
     if allresources is False and user.is_superuser is True:
-        return []
+        return set()
 
     if allresources is True:
-        restricted_group_instances = {
-            perm["object_pk"]
-            for perm in GroupObjectPermission.objects.filter(permission__codename="no_access_to_resourceinstance").values("object_pk")
-        }
-        restricted_user_instances = {
-            perm["object_pk"]
-            for perm in UserObjectPermission.objects.filter(permission__codename="no_access_to_resourceinstance").values("object_pk")
-        }
-        all_restricted_instances = list(restricted_group_instances | restricted_user_instances)
-        return all_restricted_instances
+        cache_key = "restricted_instances_{0}".format(get_cache_version("restricted_instances"))
+        restricted_instances = cache.get(cache_key)
+        if restricted_instances is None:
+            restricted_user_instances = UserObjectPermission.objects.filter(permission__codename="no_access_to_resourceinstance")
+            restricted_group_instances = GroupObjectPermission.objects.filter(permission__codename="no_access_to_resourceinstance")
+            restricted_instances = set(
+                restricted_user_instances.values_list("object_pk", flat=True).union(
+                    restricted_group_instances.values_list("object_pk", flat=True)
+                )
+            )
+            # permissions read inside a transaction may yet be rolled back, so they aren't shared
+            if not connection.in_atomic_block:
+                cache.set(cache_key, restricted_instances, settings.RESTRICTED_INSTANCES_CACHE_TIMEOUT)
+        return set(restricted_instances)
     else:
+        # only the ids are needed, so page through the hits with search_after rather than a scroll of whole documents
         terms = Terms(field="permissions.users_with_no_access", terms=[str(user.id)])
-        query = Query(search_engine, start=0, limit=settings.SEARCH_RESULT_LIMIT)
+        query = Query(search_engine if search_engine is not None else SearchEngineInstance, start=0, limit=settings.SEARCH_RESULT_LIMIT)
         has_access = Bool()
         nested_term_filter = Nested(path="permissions", query=terms)
         has_access.must(nested_term_filter)
         query.add_query(has_access)
-        results = query.search(index=RESOURCES_INDEX, scroll="1m")
-        scroll_id = results["_scroll_id"]
-        total = results["hits"]["total"]["value"]
-        if total > settings.SEARCH_RESULT_LIMIT:
-            pages = total // settings.SEARCH_RESULT_LIMIT
-            for page in range(pages):
-                results_scrolled = query.se.es.scroll(scroll_id=scroll_id, scroll="1m")
-                results["hits"]["hits"] += results_scrolled["hits"]["hits"]
-        restricted_ids = [res["_id"] for res in results["hits"]["hits"]]
+        query.dsl["_source"] = False
+        query.sort("resourceinstanceid", {"order": "asc"})
+        restricted_ids = set()
+        while True:
+            hits = query.search(index=RESOURCES_INDEX)["hits"]["hits"]
+            restricted_ids.update(hit["_id"] for hit in hits)
+            if len(hits) < settings.SEARCH_RESULT_LIMIT:
+                break
+            query.dsl["search_after"] = hits[-1]["sort"]
         return restricted_ids
 
 
+def clear_restricted_instances_cache():
+    """
+    Removes the cached set of restricted resource instances (in every process)
+
+    """
+
+    incr_cache_version_now_and_on_commit("restricted_instances")
+
+
 def get_groups_for_object(perm, obj):
     """
     returns a list of group objects that have the given permission on the given object
@@ -167,6 +280,9 @@ def get_users_for_object(perm, obj):
     return ret
 
 
+NODEGROUP_PERMISSIONS = ["read_nodegroup", "write_nodegroup", "delete_nodegroup", "no_access_to_nodegroup"]
+
+
 def get_nodegroups_by_perm(user, perms, any_perm=True):
     """
     returns a list of node groups that a user has the given permission on
@@ -178,17 +294,143 @@ def get_nodegroups_by_perm(user, perms, any_perm=True):
 
     """
 
-    A = set(
-        get_objects_for_user(
-            user,
-            ["models.read_nodegroup", "models.write_nodegroup", "models.delete_nodegroup", "models.no_access_to_nodegroup"],
-            accept_global_perms=False,
-            any_perm=True,
-        )
-    )
-    B = set(get_objects_for_user(user, perms, accept_global_perms=False, any_perm=any_perm))
-    C = set(get_objects_for_user(user, perms, accept_global_perms=True, any_perm=any_perm))
-    return list(C - A | B)
+    return list(NodeGroup.objects.filter(pk__in=get_nodegroup_ids_by_perm(user, perms, any_perm=any_perm)))
+
+
+def get_nodegroup_ids_by_perm(user, perms, any_perm=True):
+    """
+    returns a set of the ids (as strings) of node groups that a user has the given permission on,
+    explicit permissions on a node group take precedence over the user's (or their groups') model permissions
+
+    Arguments:
+    user -- the user to check
+    perms -- the permssion string eg: "read_nodegroup" or list of strings
+    any_perm -- True to check ANY perm in "perms" or False to check ALL perms
+
+    """
+
+    if isinstance(perms, str):
+        perms = [perms]
+    codenames = {perm.split(".")[-1] for perm in perms}
+
+    def has_perms(granted):
+        return len(codenames & granted) > 0 if any_perm else codenames <= granted
+
+    snapshot = get_nodegroup_permissions(user)
+    explicit = {nodegroupid for nodegroupid, granted in snapshot["explicit"].items() if has_perms(granted)}
+    if snapshot["superuser"]:
+        return set(snapshot["all"])
+    if has_perms(snapshot["global"]):
+        return (snapshot["all"] - set(snapshot["explicit"])) | explicit
+    return explicit
+
+
+def has_perms(user, perm, objs):
+    """
+    Bulk version of user.has_perm for node groups, checks a permission on many node groups using the user's
+    node group permissions snapshot (no queries once the snapshot is loaded)
+    returns a list of booleans in the order of objs
+
+    Arguments:
+    user -- the user to check
+    perm -- the permssion string eg: "read_nodegroup"
+    objs -- a list of node groups or node group ids
+
+    """
+
+    perm = perm.split(".")[-1]
+    if user.is_active and user.is_superuser:
+        return [True] * len(objs)
+    if perm not in NODEGROUP_PERMISSIONS:
+        return [user.has_perm(perm, obj if isinstance(obj, NodeGroup) else NodeGroup(pk=obj)) for obj in objs]
+
+    support, user = check_support(user, NodeGroup())
+    if not support:
+        return [False] * len(objs)
+    snapshot = get_nodegroup_permissions(user)
+    return [_has_nodegroup_perm(snapshot, perm, str(obj.pk if isinstance(obj, NodeGroup) else obj)) for obj in objs]
+
+
+def _has_nodegroup_perm(snapshot, perm, nodegroupid):
+    if snapshot["superuser"]:
+        return True
+    # explicit permissions on a node group take precedence over the user's (or their groups') model permissions
+    explicit = snapshot["explicit"].get(nodegroupid)
+    if explicit:
+        if "no_access_to_nodegroup" in explicit:
+            return False
+        return perm in explicit
+    return perm in snapshot["global"]
+
+
+def get_nodegroup_permissions(user):
+    """
+    returns a snapshot of a user's node group permissions, cached until permissions or group memberships change
+    and memoised on the user object for the rest of the request
+    superuser -- True if the user is an active superuser and so has every permission
+    global -- the node group permissions the user (or one of their groups) has on the model
+    explicit -- a dict of node group id to the permissions assigned to the user (or one of their groups) on that node group
+    all -- the ids of all node groups, only included when the user has model permissions
+
+    Arguments:
+    user -- the user to get permissions for
+
+    """
+
+    memoised = getattr(user, "_nodegroup_permissions", None)
+    if memoised is not None and memoised[0] == _nodegroup_permissions_generation:
+        return memoised[1]
+
+    generation = _nodegroup_permissions_generation
+    cache_key = _get_nodegroup_permissions_cache_key(user)
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        content_type = ContentType.objects.get_for_model(NodeGroup)
+        user_perms = UserObjectPermission.objects.filter(
+            user=user, content_type=content_type, permission__codename__in=NODEGROUP_PERMISSIONS
+        ).values_list("object_pk", "permission__codename")
+        group_perms = GroupObjectPermission.objects.filter(
+            group__user=user, content_type=content_type, permission__codename__in=NODEGROUP_PERMISSIONS
+        ).values_list("object_pk", "permission__codename")
+        explicit = {}
+        for nodegroupid, codename in user_perms.union(group_perms, all=True):
+            explicit.setdefault(nodegroupid, set()).add(codename)
+
+        global_perms = {perm.split(".")[-1] for perm in user.get_all_permissions() if perm.split(".")[-1] in NODEGROUP_PERMISSIONS}
+        superuser = user.is_active and user.is_superuser
+        snapshot = {"superuser": superuser, "global": global_perms, "explicit": explicit, "all": set()}
+        if superuser or len(global_perms) > 0:
+            snapshot["all"] = {str(nodegroupid) for nodegroupid in NodeGroup.objects.values_list("pk", flat=True)}
+        # permissions read inside a transaction may yet be rolled back, so they aren't shared
+        if not connection.in_atomic_block:
+            cache.set(cache_key, snapshot, settings.NODEGROUP_PERMISSIONS_CACHE_TIMEOUT)
+    user._nodegroup_permissions = (generation, snapshot)
+    return snapshot
+
+
+def clear_nodegroup_permissions_cache(user=None):
+    """
+    Removes cached node group permissions, of a single user if one is given otherwise of all users
+
+    """
+
+    def clear():
+        global _nodegroup_permissions_generation
+        _nodegroup_permissions_generation += 1
+        if user is not None:
+            # the key includes the user's superuser and active flags, so a user saved in another process gets a new key
+            cache.delete(_get_nodegroup_permissions_cache_key(user))
+
+    # the user's snapshot and those memoised on user objects may be loaded again before the change is committed
+    clear()
+    transaction.on_commit(clear)
+    if user is None:
+        incr_cache_version_now_and_on_commit("nodegroup_permissions")
+
+
+def _get_nodegroup_permissions_cache_key(user):
+    version = get_cache_version("nodegroup_permissions")
+    return f"nodegroup_permissions_{version}_{user.pk}_{user.is_superuser:d}{user.is_active:d}"
 
 
 def get_editable_resource_types(user):
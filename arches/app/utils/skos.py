@@ -27,7 +27,7 @@ from rdflib.namespace import SKOS, DCTERMS
 from rdflib.graph import Graph
 from time import time
 from arches.app.models import models
-from arches.app.models.concept import Concept
+from arches.app.models.concept import Concept, clear_preflabel_cache, refresh_concept_closure
 from arches.app.models.system_settings import settings
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 
@@ -330,6 +330,10 @@ class SKOSReader(object):
                 except IntegrityError as e:
                     self.logger.warning(e)
 
+            # labels may have been overwritten without saving a ConceptValue
+            clear_preflabel_cache()
+            # rebuild the hierarchies of the imported concepts now rather than on the next read
+            refresh_concept_closure()
             return scheme_node
         else:
             raise Exception("graph argument should be of type rdflib.graph.Graph")
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 def reverse_edit_log_entries(transaction_id):
     transaction_changes = EditLog.objects.filter(transactionid=transaction_id).order_by("-timestamp").all()
     number_of_db_changes = 0
+    # the oldest value of each edited tile, the tiles are restored together once the deletions are done
+    restored_values = {}
     try:
         with transaction.atomic():
             for edit_log in transaction_changes:
@@ -23,10 +25,12 @@ def reverse_edit_log_entries(transaction_id):
                         obj.delete()
                         number_of_db_changes += 1
                 elif edit_log.edittype == "tile edit":
-                    for obj in Tile.objects.filter(tileid=edit_log.tileinstanceid):
-                        obj.data = edit_log.oldvalue
-                        obj.save()
-                        number_of_db_changes += 1
+                    restored_values[str(edit_log.tileinstanceid)] = edit_log.oldvalue
+                    number_of_db_changes += Tile.objects.filter(tileid=edit_log.tileinstanceid).count()
+            tiles = list(Tile.objects.filter(tileid__in=list(restored_values.keys())))
+            for tile in tiles:
+                tile.data = restored_values[str(tile.tileid)]
+            Tile.bulk_save(tiles)
     except DatabaseError:
         logger.error("Error connecting to database")
 
@@ -29,18 +29,31 @@ def create_zip_file(files_for_export, filekey):
     """
 
     buffer = BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip:
-        for f in files_for_export:
-            f[filekey].seek(0)
-            zip.writestr(f["name"], f[filekey].read())
-
-    zip.close()
+    write_zip_file(files_for_export, filekey, buffer)
     buffer.flush()
     zip_stream = buffer.getvalue()
     buffer.close()
     return zip_stream
 
 
+def write_zip_file(files_for_export, filekey, dest):
+    """
+    Takes a list of dictionaries, each with a file object and a name, and zips up all the files with those names into dest (a file like object).
+    Files that exist on disk are copied into the zip in chunks rather than read into memory.
+    """
+
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zip:
+        for f in files_for_export:
+            filename = getattr(f[filekey], "name", None)
+            if isinstance(filename, str) and os.path.isfile(filename):
+                if hasattr(f[filekey], "flush"):
+                    f[filekey].flush()
+                zip.write(filename, f["name"])
+            else:
+                f[filekey].seek(0)
+                zip.writestr(f["name"], f[filekey].read())
+
+
 def zip_response(files_for_export, zip_file_name=None, filekey="outputfile"):
     """
     Takes a list of dictionaries, each with a file object and a name, returns an HttpResponse object with a zip file.
@@ -18,12 +18,11 @@ from urllib import parse
 from django.contrib.auth import authenticate
 from django.shortcuts import render
 from django.views.generic import View
-from django.db import transaction, connection
+from django.db import transaction
 from django.db.models import Q
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.http.request import QueryDict
 from django.core import management
-from django.core.cache import cache
 from django.forms.models import model_to_dict
 from django.urls import reverse
 from django.utils.translation import ugettext as _
@@ -33,7 +32,6 @@ from django.utils.decorators import method_decorator
 from arches.app.models import models
 from arches.app.models.concept import Concept
 from arches.app.models.card import Card as CardProxyModel
-from arches.app.models.graph import Graph
 from arches.app.models.mobile_survey import MobileSurvey
 from arches.app.models.resource import Resource
 from arches.app.models.system_settings import settings
@@ -56,11 +54,14 @@ from arches.app.utils.permission_backend import (
     get_restricted_instances,
     check_resource_instance_permissions,
     get_nodegroups_by_perm,
+    has_perms,
 )
 from arches.app.utils.geo_utils import GeoUtils
+from arches.app.utils import mvt
+from arches.app.utils.graph_schema import get_graph, get_serialized_graph
 from arches.app.search.components.base import SearchFilterFactory
 from arches.app.datatypes.datatypes import DataTypeFactory
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.search_export import SearchResultsExporter
 
 
@@ -260,7 +261,7 @@ class Surveys(APIBase):
 
 
 class GeoJSON(APIBase):
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
 
     def get_name(self, resource):
         module = importlib.import_module("arches.app.functions.primary_descriptors")
@@ -387,9 +388,6 @@ class GeoJSON(APIBase):
 
 
 class MVT(APIBase):
-    EARTHCIRCUM = 40075016.6856
-    PIXELSPERTILE = 256
-
     def get(self, request, nodeid, zoom, x, y):
         if hasattr(request.user, "userprofile") is not True:
             models.UserProfile.objects.create(user=request.user)
@@ -398,88 +396,8 @@ class MVT(APIBase):
             node = models.Node.objects.get(nodeid=nodeid, nodegroup_id__in=viewable_nodegroups)
         except models.Node.DoesNotExist:
             raise Http404()
-        config = node.config
-        cache_key = f"mvt_{nodeid}_{zoom}_{x}_{y}"
-        tile = cache.get(cache_key)
-        if tile is None:
-            resource_ids = get_restricted_instances(request.user, allresources=True)
-            if len(resource_ids) == 0:
-                resource_ids.append("10000000-0000-0000-0000-000000000001")  # This must have a uuid that will never be a resource id.
-            resource_ids = tuple(resource_ids)
-            with connection.cursor() as cursor:
-                if int(zoom) <= int(config["clusterMaxZoom"]):
-                    arc = self.EARTHCIRCUM / ((1 << int(zoom)) * self.PIXELSPERTILE)
-                    distance = arc * float(config["clusterDistance"])
-                    min_points = int(config["clusterMinPoints"])
-                    distance = settings.CLUSTER_DISTANCE_MAX if distance > settings.CLUSTER_DISTANCE_MAX else distance
-                    cursor.execute(
-                        """WITH clusters(tileid, resourceinstanceid, nodeid, geom, cid)
-                        AS (
-                            SELECT m.*,
-                            ST_ClusterDBSCAN(geom, eps := %s, minpoints := %s) over () AS cid
-                            FROM (
-                                SELECT tileid,
-                                    resourceinstanceid,
-                                    nodeid,
-                                    geom
-                                FROM geojson_geometries
-                                WHERE nodeid = %s and resourceinstanceid not in %s
-                            ) m
-                        )
-
-                        SELECT ST_AsMVT(
-                            tile,
-                             %s,
-                            4096,
-                            'geom',
-                            'id'
-                        ) FROM (
-                            SELECT resourceinstanceid::text,
-                                row_number() over () as id,
-                                1 as total,
-                                ST_AsMVTGeom(
-                                    geom,
-                                    TileBBox(%s, %s, %s, 3857)
-                                ) AS geom,
-                                '' AS extent
-                            FROM clusters
-                            WHERE cid is NULL
-                            UNION
-                            SELECT NULL as resourceinstanceid,
-                                row_number() over () as id,
-                                count(*) as total,
-                                ST_AsMVTGeom(
-                                    ST_Centroid(
-                                        ST_Collect(geom)
-                                    ),
-                                    TileBBox(%s, %s, %s, 3857)
-                                ) AS geom,
-                                ST_AsGeoJSON(
-                                    ST_Extent(geom)
-                                ) AS extent
-                            FROM clusters
-                            WHERE cid IS NOT NULL
-                            GROUP BY cid
-                        ) as tile;""",
-                        [distance, min_points, nodeid, resource_ids, nodeid, zoom, x, y, zoom, x, y],
-                    )
-                else:
-                    cursor.execute(
-                        """SELECT ST_AsMVT(tile, %s, 4096, 'geom', 'id') FROM (SELECT tileid,
-                            id,
-                            resourceinstanceid,
-                            nodeid,
-                            ST_AsMVTGeom(
-                                geom,
-                                TileBBox(%s, %s, %s, 3857)
-                            ) AS geom,
-                            1 AS total
-                        FROM geojson_geometries
-                        WHERE nodeid = %s and resourceinstanceid not in %s) AS tile;""",
-                        [nodeid, zoom, x, y, nodeid, resource_ids],
-                    )
-                tile = bytes(cursor.fetchone()[0])
-                cache.set(cache_key, tile, settings.TILE_CACHE_TIMEOUT)
+        resource_ids = get_restricted_instances(request.user, allresources=True)
+        tile = mvt.get_tile(node, int(zoom), int(x), int(y), resource_ids)
         if not len(tile):
             raise Http404()
         return HttpResponse(tile, content_type="application/x-protobuf")
@@ -501,19 +419,15 @@ class Graphs(APIBase):
             exclusions = []
 
         perm = "read_nodegroup"
-        graph = cache.get(f"graph_{graph_id}")
         user = request.user
-
-        if graph is None:
-            graph = Graph.objects.get(graphid=graph_id)
-        graph = JSONSerializer().serializeToPython(graph, sort_keys=False, exclude=["is_editable", "functions"] + exclusions)
+        graph = get_serialized_graph(graph_id, exclude=["is_editable", "functions"] + exclusions)
 
         if get_cards:
             datatypes = models.DDataType.objects.all()
-            cards = CardProxyModel.objects.filter(graph_id=graph_id).order_by("sortorder")
+            cards = list(CardProxyModel.objects.filter(graph_id=graph_id).order_by("sortorder"))
             permitted_cards = []
-            for card in cards:
-                if user.has_perm(perm, card.nodegroup):
+            for card, permitted in zip(cards, has_perms(user, perm, [card.nodegroup_id for card in cards])):
+                if permitted:
                     card.filter_by_perm(user, perm)
                     permitted_cards.append(card)
             cardwidgets = [
@@ -957,15 +871,16 @@ class Card(APIBase):
 
         nodegroups = []
         editable_nodegroups = []
-        for node in nodes:
-            if node.is_collector:
-                added = False
-                if request.user.has_perm("write_nodegroup", node.nodegroup):
-                    editable_nodegroups.append(node.nodegroup)
-                    nodegroups.append(node.nodegroup)
-                    added = True
-                if not added and request.user.has_perm("read_nodegroup", node.nodegroup):
-                    nodegroups.append(node.nodegroup)
+        collectors = [node for node in nodes.select_related("nodegroup") if node.is_collector]
+        nodegroupids = [node.nodegroup_id for node in collectors]
+        writable = has_perms(request.user, "write_nodegroup", nodegroupids)
+        readable = has_perms(request.user, "read_nodegroup", nodegroupids)
+        for node, can_write, can_read in zip(collectors, writable, readable):
+            if can_write:
+                editable_nodegroups.append(node.nodegroup)
+                nodegroups.append(node.nodegroup)
+            elif can_read:
+                nodegroups.append(node.nodegroup)
 
         nodes = nodes.filter(nodegroup__in=nodegroups)
         cards = graph.cardmodel_set.order_by("sortorder").filter(nodegroup__in=nodegroups).prefetch_related("cardxnodexwidget_set")
@@ -1053,11 +968,12 @@ class SearchExport(View):
         exporter = SearchResultsExporter(search_request=request)
         export_files, export_info = exporter.export(format, report_link)
         if format == "geojson" and total <= download_limit:
-            if settings.EXPORT_DATA_FIELDS_IN_CARD_ORDER:
-                response = JSONResponse(export_files, sort_keys=False)
-            else:
-                response = JSONResponse(export_files)
-            return response
+            if len(export_files) > 0:
+                # the feature collection is streamed from the file it was written to, which is removed once it's sent
+                geojson_file = export_files[0]["outputfile"]
+                geojson_file.seek(0)
+                return StreamingHttpResponse(geojson_file, content_type="application/json")
+            return JSONResponse(export_files)
         return JSONResponse(status=404)
 
 
@@ -1215,7 +1131,7 @@ class ResourceReport(APIBase):
         perm = "read_nodegroup"
 
         resource = Resource.objects.get(pk=resourceid)
-        graph = Graph.objects.get(graphid=resource.graph_id)
+        graph = get_graph(resource.graph_id)
         template = models.ReportTemplate.objects.get(pk=graph.template_id)
 
         if not template.preload_resource_data:
@@ -1257,8 +1173,9 @@ class ResourceReport(APIBase):
 
         if "tiles" not in exclude:
             permitted_tiles = []
-            for tile in TileProxyModel.objects.filter(resourceinstance=resource).select_related("nodegroup").order_by("sortorder"):
-                if request.user.has_perm(perm, tile.nodegroup):
+            tiles = list(TileProxyModel.objects.filter(resourceinstance=resource).select_related("nodegroup").order_by("sortorder"))
+            for tile, permitted in zip(tiles, has_perms(request.user, perm, [tile.nodegroup_id for tile in tiles])):
+                if permitted:
                     tile.filter_by_perm(request.user, perm)
                     permitted_tiles.append(tile)
 
@@ -1266,8 +1183,9 @@ class ResourceReport(APIBase):
 
         if "cards" not in exclude:
             permitted_cards = []
-            for card in CardProxyModel.objects.filter(graph_id=resource.graph_id).select_related("nodegroup").order_by("sortorder"):
-                if request.user.has_perm(perm, card.nodegroup):
+            cards = list(CardProxyModel.objects.filter(graph_id=resource.graph_id).select_related("nodegroup").order_by("sortorder"))
+            for card, permitted in zip(cards, has_perms(request.user, perm, [card.nodegroup_id for card in cards])):
+                if permitted:
                     card.filter_by_perm(request.user, perm)
                     permitted_cards.append(card)
 
@@ -1338,28 +1256,13 @@ class BulkResourceReport(APIBase):
         else:
             exclusions = []
 
-        graph_ids_set = set(graph_ids)  # calls set to delete dups
-        graph_ids_not_in_cache = []
-
         graph_lookup = {}
-
-        for graph_id in graph_ids_set:
-            graph = cache.get("serialized_graph_{}".format(graph_id))
-
-            if graph:
-                graph_lookup[graph["graphid"]] = graph
-            else:
-                graph_ids_not_in_cache.append(graph_id)
-
-        if graph_ids_not_in_cache:
-            graphs_from_database = list(Graph.objects.filter(pk__in=graph_ids_not_in_cache))
-
-            for graph in graphs_from_database:
-                serialized_graph = JSONSerializer().serializeToPython(
-                    graph, sort_keys=False, exclude=["is_editable", "functions"] + exclusions
-                )
-                cache.set("serialized_graph_{}".format(graph.pk), serialized_graph)
-                graph_lookup[str(graph.pk)] = serialized_graph
+        for graph_id in set(graph_ids):  # calls set to delete dups
+            try:
+                graph = get_serialized_graph(graph_id, exclude=["is_editable", "functions"] + exclusions)
+            except models.GraphModel.DoesNotExist:
+                continue
+            graph_lookup[graph["graphid"]] = graph
 
         graph_ids_with_templates_that_preload_resource_data = []
         graph_ids_with_templates_that_do_not_preload_resource_data = []
@@ -1384,8 +1287,9 @@ class BulkResourceReport(APIBase):
             perm = "read_nodegroup"
             permitted_cards = []
 
-            for card in cards:
-                if request.user.has_perm(perm, card.nodegroup):
+            cards = list(cards)
+            for card, permitted in zip(cards, has_perms(request.user, perm, [card.nodegroup_id for card in cards])):
+                if permitted:
                     card.filter_by_perm(request.user, perm)
                     permitted_cards.append(card)
 
@@ -1427,9 +1331,9 @@ class BulkDisambiguatedResourceInstance(APIBase):
         compact = True
         if uncompacted_value == "true":
             compact = False
-        return JSONResponse(
-            {resource.pk: resource.to_json(compact=compact, version=version) for resource in Resource.objects.filter(pk__in=resource_ids)}
-        )
+        resources = list(Resource.objects.filter(pk__in=resource_ids))
+        Resource.load_tiles__bulk(resources)
+        return JSONResponse({resource.pk: resource.to_json(compact=compact, version=version) for resource in resources})
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -1452,10 +1356,40 @@ class Tile(APIBase):
         tileview.action = "update_tile"
         # check that no data is on POST or FILES before assigning body to POST (otherwise request fails)
         if len(dict(request.POST.items())) == 0 and len(dict(request.FILES.items())) == 0:
+            if request.body.lstrip().startswith(b"["):
+                return self.bulk_post(request, JSONDeserializer().deserialize(request.body))
             request.POST = request.POST.copy()
             request.POST["data"] = request.body
         return tileview.post(request)
 
+    def bulk_post(self, request, data):
+        """
+        Saves a list of tiles posted as json in a single transaction, see Tile.bulk_save
+
+        Querystring parameters:
+        transaction_id -- the id of the transaction the edits are logged under
+
+        """
+
+        transaction_id = request.GET.get("transaction_id", uuid.uuid1())
+        tiles = [TileProxyModel(tile) for tile in data]
+        if any(tile.filter_by_perm(request.user, "write_nodegroup") is None for tile in tiles):
+            return JSONResponse(_("User does not have permission to edit these tiles."), status=403)
+
+        resourceids = {str(tile.resourceinstance_id) for tile in tiles}
+        if models.ResourceInstance.objects.filter(pk__in=resourceids, graph__isactive=True).count() != len(resourceids):
+            return JSONResponse(_("Tiles can only be saved to existing resources of active models."), status=400)
+
+        try:
+            with transaction.atomic():
+                TileProxyModel.bulk_save(tiles, request=request, transaction_id=transaction_id)
+                for tile in tiles:
+                    tile.after_update_all()
+        except TileValidationError as e:
+            return JSONResponse({"title": e.title, "message": e.message}, status=400)
+
+        return JSONResponse(tiles, status=200)
+
 
 @method_decorator(csrf_exempt, name="dispatch")
 class Node(APIBase):
@@ -1489,7 +1423,7 @@ class Node(APIBase):
             try:
                 return graph_cache[graphid]
             except:
-                graph_cache[graphid] = Graph.objects.get(pk=node["graph_id"]).name
+                graph_cache[graphid] = models.GraphModel.objects.get(pk=node["graph_id"]).name
                 return graph_cache[graphid]
 
         # try to get nodes by attribute filter and then get nodes by passed in user perms
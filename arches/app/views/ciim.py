@@ -14,7 +14,6 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
 #import urllib2
-import json
 import requests
 import logging
 #from urlparse import urlparse
@@ -25,6 +24,7 @@ from arches.app.models.system_settings import settings
 from arches.app.utils.pagination import get_paginator
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from datetime import datetime
+from arches.app.utils import ciim_client
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger()
@@ -33,63 +33,37 @@ print = logger.info
 
 
 def get_count(request):
-
-	user = request.user
-	# if the user is in the private es group, use the private url. Else use public 
-	if user.groups.filter(name=settings.CIIM_PRIVATE_ES_GROUPS).exists(): 
-		url = settings.CIIM_ELASTICSEARCH_PRIVATE['url'] + "/_search"
-	else: 
-		url = settings.CIIM_ELASTICSEARCH_PUBLIC['url'] + "/_search"
-
 	uuid = request.GET.get('uuid')
+	try:
+		results = ciim_client.search(ciim_client.get_backend(request.user), ciim_client.get_count_query(uuid))
+	except requests.exceptions.RequestException as e:
+		return ciim_error(e)
 
-	json_q = json.dumps({"query":{"bool":{"must":[{"match":{"arches.sites.keyword":uuid}}],"must_not":[{"term":{"type.base":"site"}}, {"term": {"admin.status":"invalid"}}],"should":[]}},"from":0,"size":10,"sort":[],"aggs":{"type":{"terms":{"field":"type.base"}}}}) 
-	headers = {'Content-Type' : 'application/json'}
-
-	ret=requests.get(url, headers=headers,  data = json_q)  
-
-	return JsonResponse(ret.json(), safe=False) 
-
-def search(request):
-	user = request.user
-	if user.groups.filter(name=settings.CIIM_PRIVATE_ES_GROUPS).exists(): 
-		url = settings.CIIM_ELASTICSEARCH_PRIVATE['url'] + "/_search"
-	else: 
-		url = settings.CIIM_ELASTICSEARCH_PUBLIC['url'] + "/_search"
+	return JsonResponse(results, safe=False)
 
+def get_search_params(request):
 	#get page param from originating request
-	#page = 1 if request.GET.get('page') == '' else int(request.GET.get('page', 1))
 	if request.GET.get('page') == '':
 		page = 1
 	else:
 		page = int(request.GET.get('page', 1))
 
-	uuid = request.GET.get('uuid')
 	primaryFilter = request.GET.get('primaryFilter')
-	secondaryFilter = request.GET.get('secondaryFilter')
-
-	sortOrder = request.GET.get('sortOrder')
-
 	if primaryFilter is None:
 		primaryFilter = '*'
 
+	sortOrder = request.GET.get('sortOrder')
 	if sortOrder is None:
 		sortOrder = 'asc'
-	
-	if primaryFilter == '*':
-		json_q = json.dumps({"query":{"bool":{"must":[{"match":{"arches.sites.keyword":uuid}}],"must_not":[{"term":{"type.base":"site"}}, {"term": {"admin.status":"invalid"}}],"should":[]}},"from":(settings.SEARCH_ITEMS_PER_PAGE * (page - 1)),"size":settings.SEARCH_ITEMS_PER_PAGE,"sort":[{"arches.primarySort.keyword":{"order":sortOrder}}],"aggs":{"type":{"terms":{"field":"type.base"}},"primaryFilter":{"terms":{"field":"arches.primaryFilter.keyword"}}}}) 
-	else:
-		json_q = json.dumps({"query":{"bool":{"must":[{"match":{"arches.sites.keyword":uuid}},{"match":{"arches.primaryFilter":primaryFilter}}],"must_not":[{"term":{"type.base":"site"}}, {"term": {"admin.status":"invalid"}}],"should":[]}},"from":(settings.SEARCH_ITEMS_PER_PAGE * (page - 1)),"size":settings.SEARCH_ITEMS_PER_PAGE,"sort":[{"arches.primarySort.keyword":{"order":sortOrder}}],"aggs":{"type":{"terms":{"field":"type.base"}},"primaryFilter":{"terms":{"field":"arches.primaryFilter.keyword"}}}}) 
-	
-	headers = {'Content-Type' : 'application/json'}
-	results=requests.get(url, headers=headers,  data = json_q).json()
 
-	
+	return page, primaryFilter, request.GET.get('secondaryFilter'), sortOrder
+
+def format_search_results(request, results, page, primaryFilter, secondaryFilter, sortOrder):
+	ret = {}
 	if results is not None:
 
 		total = results['hits']['total']
 
-		ret = {}
 		ret['results'] = results
 		
 		if primaryFilter is not None:
@@ -116,17 +90,27 @@ def search(request):
 		ret['paginator']['per_page'] = settings.SEARCH_ITEMS_PER_PAGE
 		ret['paginator']['pages'] = pages
 
-	return JsonResponse(ret, safe=False) 
+	return ret
+
+def search(request):
+	uuid = request.GET.get('uuid')
+	page, primaryFilter, secondaryFilter, sortOrder = get_search_params(request)
+	try:
+		results = ciim_client.search(ciim_client.get_backend(request.user), ciim_client.get_search_query(uuid, page, primaryFilter, sortOrder))
+	except requests.exceptions.RequestException as e:
+		return ciim_error(e)
+
+	return JsonResponse(format_search_results(request, results, page, primaryFilter, secondaryFilter, sortOrder), safe=False)
 
 def lookup(request):
-	user = request.user
-	if user.groups.filter(name=settings.CIIM_PRIVATE_ES_GROUPS).exists(): 
-		url = settings.CIIM_ELASTICSEARCH_PRIVATE['url']+ "/_search"
-	else: 
-		url = settings.CIIM_ELASTICSEARCH_PUBLIC['url'] + "/_search"
 	uuid = request.GET.get('uuid')
-	json_q = json.dumps({"query":{"bool":{"must":[{"match":{"admin.uuid":uuid}}],"must_not":[],"should":[]}},"from":0,"size":1,"sort":[]}) 
-	headers = {'Content-Type' : 'application/json'}
-	ret=requests.get(url, headers=headers,  data = json_q)  
+	try:
+		results = ciim_client.search(ciim_client.get_backend(request.user), ciim_client.get_lookup_query(uuid))
+	except requests.exceptions.RequestException as e:
+		return ciim_error(e)
+
+	return JsonResponse(results, safe=False)
 
-	return JsonResponse(ret.json(), safe=False) 
\ No newline at end of file
+def ciim_error(e):
+	logger.error('Unable to search the CIIM index: %s' % e)
+	return JsonResponse({'error': 'Unable to search the CIIM index'}, status=502)
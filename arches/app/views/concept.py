@@ -410,7 +410,7 @@ def search(request):
 
     ids = []
     if removechildren is not None:
-        ids = [concept[0] for concept in Concept().get_child_concepts(removechildren, columns="conceptidto::text")]
+        ids = Concept().get_child_conceptids(removechildren)
         ids.append(removechildren)
 
     newresults = []
@@ -31,7 +31,7 @@ from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializ
 from arches.app.utils.decorators import group_required
 from arches.app.utils.response import JSONResponse
 from arches.app.utils.permission_backend import get_users_for_object, get_groups_for_object
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Query, Bool, GeoBoundsAgg, Term
 from arches.app.search.mappings import RESOURCES_INDEX
 
@@ -39,7 +39,7 @@ from arches.app.search.mappings import RESOURCES_INDEX
 @method_decorator(group_required("Application Administrator"), name="dispatch")
 class MapLayerManagerView(MapBaseManagerView):
     def get(self, request):
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         datatype_factory = DataTypeFactory()
         datatypes = models.DDataType.objects.all()
         widgets = models.Widget.objects.all()
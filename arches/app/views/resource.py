@@ -37,7 +37,6 @@ from django.utils.translation import ugettext as _
 from django.views.generic import View
 from arches.app.models import models
 from arches.app.models.card import Card
-from arches.app.models.graph import Graph
 from arches.app.models.tile import Tile
 from arches.app.models.resource import Resource, ModelInactiveError
 from arches.app.models.system_settings import settings
@@ -54,9 +53,10 @@ from arches.app.utils.permission_backend import (
     user_can_delete_resource,
     user_can_edit_resource,
     user_can_read_resource,
+    has_perms,
 )
 from arches.app.utils.response import JSONResponse, JSONErrorResponse
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Query, Terms
 from arches.app.search.mappings import RESOURCES_INDEX
 from arches.app.views.base import BaseManagerView, MapBaseManagerView
@@ -212,15 +212,16 @@ class ResourceEditorView(MapBaseManagerView):
         relationship_type_values = get_resource_relationship_types()
         nodegroups = []
         editable_nodegroups = []
-        for node in nodes:
-            if node.is_collector:
-                added = False
-                if request.user.has_perm("write_nodegroup", node.nodegroup):
-                    editable_nodegroups.append(node.nodegroup)
-                    nodegroups.append(node.nodegroup)
-                    added = True
-                if not added and request.user.has_perm("read_nodegroup", node.nodegroup):
-                    nodegroups.append(node.nodegroup)
+        collectors = [node for node in nodes.select_related("nodegroup") if node.is_collector]
+        nodegroupids = [node.nodegroup_id for node in collectors]
+        writable = has_perms(request.user, "write_nodegroup", nodegroupids)
+        readable = has_perms(request.user, "read_nodegroup", nodegroupids)
+        for node, can_write, can_read in zip(collectors, writable, readable):
+            if can_write:
+                editable_nodegroups.append(node.nodegroup)
+                nodegroups.append(node.nodegroup)
+            elif can_read:
+                nodegroups.append(node.nodegroup)
 
         nodes = nodes.filter(nodegroup__in=nodegroups)
         cards = graph.cardmodel_set.order_by("sortorder").filter(nodegroup__in=nodegroups).prefetch_related("cardxnodexwidget_set")
@@ -722,7 +723,7 @@ class ResourceDescriptors(View):
         if Resource.objects.filter(pk=resourceid).exclude(pk=settings.SYSTEM_SETTINGS_RESOURCE_ID).exists():
             try:
                 resource = Resource.objects.get(pk=resourceid)
-                se = SearchEngineFactory().create()
+                se = SearchEngineInstance
                 document = se.search(index=RESOURCES_INDEX, id=resourceid)
                 return JSONResponse(
                     {
@@ -746,7 +747,7 @@ class ResourceDescriptors(View):
 class ResourceReportView(MapBaseManagerView):
     def get(self, request, resourceid=None):
         resource = Resource.objects.only("graph_id").get(pk=resourceid)
-        graph = Graph.objects.only("name", "iconclass").get(graphid=resource.graph_id)
+        graph = models.GraphModel.objects.only("name", "iconclass").get(graphid=resource.graph_id)
 
         try:
             map_layers = models.MapLayer.objects.all()
@@ -862,7 +863,7 @@ class RelatedResourcesView(BaseManagerView):
 
     def delete(self, request, resourceid=None):
         lang = request.GET.get("lang", request.LANGUAGE_CODE)
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         req = dict(request.GET)
         ids_to_delete = req["resourcexids[]"]
         root_resourceinstanceid = req["root_resourceinstanceid"]
@@ -885,7 +886,7 @@ class RelatedResourcesView(BaseManagerView):
 
     def post(self, request, resourceid=None):
         lang = request.GET.get("lang", request.LANGUAGE_CODE)
-        se = SearchEngineFactory().create()
+        se = SearchEngineInstance
         res = dict(request.POST)
         relationshiptype = res["relationship_properties[relationshiptype]"][0]
         datefrom = res["relationship_properties[datestarted]"][0]
@@ -34,14 +34,14 @@ from arches.app.models.system_settings import settings
 from arches.app.utils.response import JSONResponse, JSONErrorResponse
 from arches.app.datatypes.datatypes import DataTypeFactory
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Bool, Match, Query, Nested, Terms, MaxAgg, Aggregation
 from arches.app.search.search_export import SearchResultsExporter
 from arches.app.search.time_wheel import TimeWheel
 from arches.app.search.components.base import SearchFilterFactory
 from arches.app.search.mappings import RESOURCES_INDEX
 from arches.app.views.base import MapBaseManagerView
-from arches.app.models.concept import get_preflabel_from_conceptid
+from arches.app.models.concept import get_preflabels
 from arches.app.utils.permission_backend import get_nodegroups_by_perm, user_is_resource_reviewer
 import arches.app.utils.zip as zip_utils
 import arches.app.utils.task_management as task_management
@@ -127,12 +127,13 @@ def home_page(request):
 
 def search_terms(request):
     lang = request.GET.get("lang", request.LANGUAGE_CODE)
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     searchString = request.GET.get("q", "")
     user_is_reviewer = user_is_resource_reviewer(request.user)
 
     i = 0
     ret = {}
+    queries = {}
     for index in ["terms", "concepts"]:
         query = Query(se, start=0, limit=0)
         boolquery = Bool()
@@ -159,15 +160,27 @@ def search_terms(request):
         base_agg.add_aggregation(top_concept_agg)
         base_agg.add_aggregation(nodegroupid_agg)
         query.add_aggregation(base_agg)
+        query.prepare()
+        queries[index] = query
+
+    # both indexes are searched in a single request
+    responses = se.msearch([(index, query.dsl) for index, query in queries.items()])
+    # the labels of the top concepts of every bucket are looked up together
+    top_concept_ids = set()
+    for results in responses:
+        if results is not None and "aggregations" in results:
+            for result in results["aggregations"]["value_agg"]["buckets"]:
+                top_concept_ids.update(top_concept["key"] for top_concept in result["top_concept"]["buckets"])
+    top_concept_labels = get_preflabels(top_concept_ids, lang)
 
+    for index, results in zip(queries, responses):
         ret[index] = []
-        results = query.search(index=index)
         if results is not None:
             for result in results["aggregations"]["value_agg"]["buckets"]:
                 if len(result["top_concept"]["buckets"]) > 0:
                     for top_concept in result["top_concept"]["buckets"]:
                         top_concept_id = top_concept["key"]
-                        top_concept_label = get_preflabel_from_conceptid(top_concept["key"], lang)["value"]
+                        top_concept_label = top_concept_labels[str(top_concept_id)]["value"]
                         for concept in top_concept["conceptid"]["buckets"]:
                             ret[index].append(
                                 {
@@ -298,11 +311,11 @@ def search_results(request, returnDsl=False):
             load_tiles = json.loads(load_tiles)
         except TypeError:
             pass
-    se = SearchEngineFactory().create()
+    se = SearchEngineInstance
     permitted_nodegroups = get_permitted_nodegroups(request.user)
     include_provisional = get_provisional_type(request)
     search_filter_factory = SearchFilterFactory(request)
-    search_results_object = {"query": Query(se)}
+    search_results_object = {"query": Query(se, track_total_hits=settings.SEARCH_TRACK_TOTAL_HITS)}
 
     try:
         for filter_type, querystring in list(request.GET.items()) + [("search-results", "")]:
@@ -348,11 +361,15 @@ def search_results(request, returnDsl=False):
 
     ret = {}
     if results is not None:
+        total_results = None
         if "hits" not in results:
             if "docs" in results:
                 results = {"hits": {"hits": results["docs"]}}
             else:
                 results = {"hits": {"hits": [results]}}
+        else:
+            # the search counts the matching documents (see settings.SEARCH_TRACK_TOTAL_HITS), so a separate count isn't needed
+            total_results = results["hits"]["total"]["value"]
 
         # allow filters to modify the results
         for filter_type, querystring in list(request.GET.items()) + [("search-results", "")]:
@@ -367,7 +384,7 @@ def search_results(request, returnDsl=False):
 
         ret["reviewer"] = user_is_resource_reviewer(request.user)
         ret["timestamp"] = datetime.now()
-        ret["total_results"] = dsl.count(index=RESOURCES_INDEX)
+        ret["total_results"] = total_results if total_results is not None else dsl.count(index=RESOURCES_INDEX)
         ret["userid"] = request.user.id
         return JSONResponse(ret)
 
@@ -449,8 +466,7 @@ def _buffer(geojson, width=0, unit="ft"):
 
 def _get_child_concepts(conceptid):
     ret = {conceptid}
-    for row in Concept().get_child_concepts(conceptid, ["prefLabel"]):
-        ret.add(row[0])
+    ret.update(Concept().get_child_conceptids(conceptid))
     return list(ret)
 
 
@@ -16,11 +16,12 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+from arches.app.models import models
 from arches.app.models.graph import Graph
-from arches.app.models.system_settings import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.core.cache import cache
 from arches.app.utils.betterJSONSerializer import JSONSerializer
+from arches.app.utils.graph_schema import get_graph, get_serialized_graph
 
 
 class Command(BaseCommand):
@@ -46,15 +47,15 @@ class Command(BaseCommand):
         cache.clear()
 
     def cache_graphs(self):
-        graphs = Graph.objects.all()
-        for graph in graphs:
-            print("caching", graph.name)
-            cache.set(f"graph_{graph.graphid}", JSONSerializer().serializeToPython(graph), settings.GRAPH_MODEL_CACHE_TIMEOUT)
+        for graphid, name in models.GraphModel.objects.values_list("graphid", "name"):
+            print("caching", name)
+            get_graph(graphid)
+            # the serialized graph used by the graph and report apis
+            get_serialized_graph(graphid, exclude=["is_editable", "functions"])
 
     def verify_cache(self):
         graphs = Graph.objects.all()
         for graph in graphs:
-            graphc = cache.get(f"graph_{graph.graphid}")
-            graph_from_cache = JSONSerializer().serialize(graphc)
-            graph_from_db = JSONSerializer().serialize(graph)
+            graph_from_cache = JSONSerializer().serialize(get_serialized_graph(graph.graphid, exclude=["is_editable", "functions"]))
+            graph_from_db = JSONSerializer().serialize(graph, sort_keys=False, exclude=["is_editable", "functions"])
             print(f"Cache for {graph.name} is valid: {len(graph_from_cache) == len(graph_from_db)}")
@@ -21,6 +21,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 from django.core.management.base import BaseCommand
 from arches.app.models.system_settings import settings
 from arches.app.search.base_index import get_index
+from arches.app.search import index_queue
 from arches.app.search.mappings import (
     prepare_terms_index,
     prepare_concepts_index,
@@ -56,6 +57,8 @@ class Command(BaseCommand):
                 "index_resource_relations",
                 "add_index",
                 "delete_index",
+                "process_index_queue",
+                "index_queue_status",
             ],
             help="Operation Type; "
             + "'setup_indexes'=Creates the indexes in Elastic Search needed by the system"
@@ -67,7 +70,9 @@ class Command(BaseCommand):
             + "'index_resources_by_type'=Indexes only resources of a given resource_model/graph"
             + "'index_resource_relations'=Indexes all resource to resource relation records"
             + "'add_index'=Register a new index in Elasticsearch"
-            + "'delete_index'=Deletes a named index from Elasticsearch",
+            + "'delete_index'=Deletes a named index from Elasticsearch"
+            + "'process_index_queue'=Indexes all resources waiting in the deferred indexing queue"
+            + "'index_queue_status'=Reports the depth and lag of the deferred indexing queue",
         )
 
         parser.add_argument(
@@ -115,6 +120,24 @@ class Command(BaseCommand):
             help="Silences the status bar output during certain operations, use in celery operations for example",
         )
 
+        parser.add_argument(
+            "--use_multiprocessing",
+            action="store_true",
+            dest="use_multiprocessing",
+            default=False,
+            help="Indexes resources in parallel by splitting each resource type into ranges of resources handled by a pool of processes",
+        )
+
+        parser.add_argument(
+            "-mp",
+            "--max_subprocesses",
+            action="store",
+            dest="max_subprocesses",
+            type=int,
+            default=0,
+            help="The number of processes to use when indexing with --use_multiprocessing, 0(default) uses one process per cpu",
+        )
+
         parser.add_argument("-n", "--name ", action="store", dest="name", default=None, help="Name of the custom index")
 
     def handle(self, *args, **options):
@@ -132,18 +155,33 @@ class Command(BaseCommand):
 
         if options["operation"] == "index_database":
             self.index_database(
-                batch_size=options["batch_size"], clear_index=options["clear_index"], name=options["name"], quiet=options["quiet"]
+                batch_size=options["batch_size"],
+                clear_index=options["clear_index"],
+                name=options["name"],
+                quiet=options["quiet"],
+                use_multiprocessing=options["use_multiprocessing"],
+                max_subprocesses=options["max_subprocesses"],
             )
 
         if options["operation"] == "reindex_database":
-            self.reindex_database(batch_size=options["batch_size"], name=options["name"], quiet=options["quiet"])
+            self.reindex_database(
+                batch_size=options["batch_size"],
+                name=options["name"],
+                quiet=options["quiet"],
+                use_multiprocessing=options["use_multiprocessing"],
+                max_subprocesses=options["max_subprocesses"],
+            )
 
         if options["operation"] == "index_concepts":
             index_database_util.index_concepts(clear_index=options["clear_index"], batch_size=options["batch_size"])
 
         if options["operation"] == "index_resources":
             index_database_util.index_resources(
-                clear_index=options["clear_index"], batch_size=options["batch_size"], quiet=options["quiet"]
+                clear_index=options["clear_index"],
+                batch_size=options["batch_size"],
+                quiet=options["quiet"],
+                use_multiprocessing=options["use_multiprocessing"],
+                max_subprocesses=options["max_subprocesses"],
             )
 
         if options["operation"] == "index_resources_by_type":
@@ -152,11 +190,20 @@ class Command(BaseCommand):
                 clear_index=options["clear_index"],
                 batch_size=options["batch_size"],
                 quiet=options["quiet"],
+                use_multiprocessing=options["use_multiprocessing"],
+                max_subprocesses=options["max_subprocesses"],
             )
 
         if options["operation"] == "index_resource_relations":
             index_database_util.index_resource_relations(clear_index=options["clear_index"], batch_size=options["batch_size"])
 
+        if options["operation"] == "process_index_queue":
+            index_queue.process_queue(batch_size=options["batch_size"])
+
+        if options["operation"] == "index_queue_status":
+            stats = index_queue.get_queue_stats()
+            print("Queued edits: {0}, Resources: {1}, Lag: {2:.2f} seconds".format(stats["depth"], stats["resources"], stats["lag"]))
+
     def register_index(self, name):
         es_index = get_index(name)
         es_index.prepare_index()
@@ -165,16 +212,29 @@ class Command(BaseCommand):
         es_index = get_index(name)
         es_index.delete_index()
 
-    def index_database(self, batch_size, clear_index=True, name=None, quiet=False):
+    def index_database(self, batch_size, clear_index=True, name=None, quiet=False, use_multiprocessing=False, max_subprocesses=0):
         if name is not None:
             index_database_util.index_custom_indexes(index_name=name, clear_index=clear_index, batch_size=batch_size, quiet=quiet)
         else:
-            index_database_util.index_db(clear_index=clear_index, batch_size=batch_size, quiet=quiet)
+            index_database_util.index_db(
+                clear_index=clear_index,
+                batch_size=batch_size,
+                quiet=quiet,
+                use_multiprocessing=use_multiprocessing,
+                max_subprocesses=max_subprocesses,
+            )
 
-    def reindex_database(self, batch_size, name=None, quiet=False):
+    def reindex_database(self, batch_size, name=None, quiet=False, use_multiprocessing=False, max_subprocesses=0):
         self.delete_indexes(name=name)
         self.setup_indexes(name=name)
-        self.index_database(batch_size=batch_size, clear_index=False, name=name, quiet=quiet)
+        self.index_database(
+            batch_size=batch_size,
+            clear_index=False,
+            name=name,
+            quiet=quiet,
+            use_multiprocessing=use_multiprocessing,
+            max_subprocesses=max_subprocesses,
+        )
 
     def setup_indexes(self, name=None):
         if name is None:
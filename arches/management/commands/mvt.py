@@ -0,0 +1,92 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from time import time
+from django.core.management.base import BaseCommand, CommandError
+from arches.app.models import models
+from arches.app.utils import mvt
+from arches.app.utils.permission_backend import get_restricted_instances
+
+
+class Command(BaseCommand):
+    """
+    Commands for managing the cache of map (vector) tiles
+
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "operation",
+            nargs="?",
+            choices=["seed", "clear", "purge"],
+            help="Operation Type; "
+            + "'seed'=Creates and caches the tiles covering a node's geometries for a range of zoom levels "
+            + "'clear'=Removes cached tiles, of a single node if one is given "
+            + "'purge'=Removes cached tiles that have expired or leave out resources that are no longer restricted",
+        )
+        parser.add_argument("-n", "--nodeid", action="store", dest="nodeid", help="The id of a geojson-feature-collection node")
+        parser.add_argument("--min_zoom", action="store", dest="min_zoom", type=int, default=0, help="The lowest zoom level to seed")
+        parser.add_argument("--max_zoom", action="store", dest="max_zoom", type=int, default=14, help="The highest zoom level to seed")
+        parser.add_argument(
+            "--use_multiprocessing",
+            action="store_true",
+            dest="use_multiprocessing",
+            help="Create tiles in several processes",
+        )
+        parser.add_argument(
+            "-mp",
+            "--max_subprocesses",
+            action="store",
+            type=int,
+            dest="max_subprocesses",
+            default=0,
+            help="Changes the process count if multiprocessing is used",
+        )
+
+    def handle(self, *args, **options):
+        if options["operation"] == "seed":
+            if options["nodeid"] is None:
+                raise CommandError("A nodeid is required to seed tiles")
+            self.seed(
+                options["nodeid"],
+                options["min_zoom"],
+                options["max_zoom"],
+                use_multiprocessing=options["use_multiprocessing"],
+                max_subprocesses=options["max_subprocesses"],
+            )
+
+        if options["operation"] == "clear":
+            mvt.clear_tiles(nodeid=options["nodeid"])
+
+        if options["operation"] == "purge":
+            count = mvt.purge_tiles(get_restricted_instances(None, allresources=True))
+            print("Removed {0} stale tiles".format(count))
+
+    def seed(self, nodeid, min_zoom, max_zoom, use_multiprocessing=False, max_subprocesses=0):
+        try:
+            node = models.Node.objects.get(pk=nodeid, datatype="geojson-feature-collection")
+        except models.Node.DoesNotExist:
+            raise CommandError("No geojson-feature-collection node with the id {0}".format(nodeid))
+
+        start = time()
+        # map tiles leave out every restricted resource regardless of the user requesting them
+        resource_ids = get_restricted_instances(None, allresources=True)
+        count = mvt.seed_tiles(
+            node, min_zoom, max_zoom, resource_ids, use_multiprocessing=use_multiprocessing, max_subprocesses=max_subprocesses
+        )
+        print("Seeded {0} tiles for {1} in {2:.2f} seconds".format(count, node.name, time() - start))
@@ -13,7 +13,7 @@ import logging
 import requests
 from arches.setup import unzip_file
 from arches.management.commands import utils
-from arches.app.utils import import_class_from_string
+from arches.app.utils import import_class_from_string, mvt
 from arches.app.utils.skos import SKOSReader
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from arches.app.utils.system_metadata import system_metadata
@@ -846,6 +846,9 @@ class Command(BaseCommand):
         def update_resource_geojson_geometries():
             with connection.cursor() as cursor:
                 cursor.execute("SELECT * FROM refresh_geojson_geometries();")
+                if settings.MVT_PRECOMPUTED_CLUSTERS is True:
+                    cursor.execute("SELECT * FROM refresh_geojson_geometry_clusters(%s);", [settings.CLUSTER_DISTANCE_MAX])
+            mvt.clear_tiles()
 
         def load_apps(package_dir):
             package_apps = glob.glob(os.path.join(package_dir, "apps", "*"))
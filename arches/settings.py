@@ -61,7 +61,8 @@ ELASTICSEARCH_TEMP_HTTP_ENDPOINT = "http://localhost:9200"
 SEARCH_BACKEND = "arches.app.search.search.SearchEngine"
 # see http://elasticsearch-py.readthedocs.org/en/master/api.html#elasticsearch.Elasticsearch
 ELASTICSEARCH_HOSTS = [{"host": "localhost", "port": ELASTICSEARCH_HTTP_PORT}]
-ELASTICSEARCH_CONNECTION_OPTIONS = {"timeout": 30}
+# maxsize is the number of connections kept open (per host) in the shared client's connection pool
+ELASTICSEARCH_CONNECTION_OPTIONS = {"timeout": 30, "maxsize": 25, "max_retries": 3, "retry_on_timeout": True}
 # a prefix to append to all elasticsearch indexes, note: must be lower case
 ELASTICSEARCH_PREFIX = "arches"
 
@@ -75,6 +76,12 @@ CIIM_ELASTICSEARCH_PRIVATE = {'url': 'http://localhost:9200/private'}
 
 CIIM_PRIVATE_ES_GROUPS = ("Ciim Private ES")
 
+# timeout is the number of seconds to wait for a CIIM search, maxsize is the number of connections kept open to each CIIM index
+CIIM_CONNECTION_OPTIONS = {"timeout": 30, "maxsize": 10}
+
+# the number of seconds CIIM search responses are cached for
+CIIM_CACHE_TIMEOUT = 60
+
 
 
 # a list of objects of the form below
@@ -493,6 +500,13 @@ TIMEWHEEL_DATE_TIERS = None
 # Identify the usernames and duration (seconds) for which you want to cache the timewheel
 CACHE_BY_USER = {"anonymous": 3600 * 24}
 
+# Set to True to index resources outside of the request, edits add the resource to a queue that is processed
+# by a celery worker (or by a background thread when celery isn't available) once the edit has been committed
+DEFER_RESOURCE_INDEXING = False
+
+# Set to False to rebuild the whole resource document on every tile save instead of only the entries that belong to the saved tile
+INCREMENTAL_TILE_INDEXING = True
+
 BYPASS_CARDINALITY_TILE_VALIDATION = True
 BYPASS_UNIQUE_CONSTRAINT_TILE_VALIDATION = False
 BYPASS_REQUIRED_VALUE_TILE_VALIDATION = False
@@ -549,6 +563,9 @@ SEARCH_TERM_SENSITIVITY = 3
 
 WORDS_PER_SEARCH_TERM = 10  # set to None for unlimited number of words allowed for search terms
 SEARCH_RESULT_LIMIT = 10000  # should be less than or equal to elasticsearch configuration, index.max_result_window (default = 10,000)
+# whether searches count every matching resource (True) or stop counting at the given number (eg: 10000),
+# a lower number makes searches of large datasets faster but the total number of results is then a lower bound
+SEARCH_TRACK_TOTAL_HITS = True
 
 ETL_USERNAME = "ETL"  # override this setting in your packages settings.py file
 
@@ -653,9 +670,23 @@ CELERY_BEAT_SCHEDULE = {
 CELERY_CHECK_ONLY_INSPECT_BROKER = False
 
 AUTO_REFRESH_GEOM_VIEW = True
-TILE_CACHE_TIMEOUT = 600  # seconds
+TILE_CACHE_TIMEOUT = 86400  # seconds, map tiles are also removed from the cache when their geometries are edited
 CLUSTER_DISTANCE_MAX = 5000  # meters
+# Set to True to serve clustered map tiles from clusters precomputed for each node and zoom level when
+# geojson geometries are refreshed. Editing a geometry marks the clusters around it as out of date, tiles
+# covering that area are clustered on request again until the next full refresh.
+MVT_PRECOMPUTED_CLUSTERS = False
 GRAPH_MODEL_CACHE_TIMEOUT = None  # seconds * hours * days = ~1mo
+# how long to cache each user's node group permissions, the cache is cleared (in every process) when permissions or group
+# memberships change, with a cache backend that isn't shared between processes (eg: LocMemCache) checking that costs a query
+NODEGROUP_PERMISSIONS_CACHE_TIMEOUT = 3600  # seconds
+# how long to cache the set of resource instances that are restricted for any user (the set is also cleared, in every process,
+# when they change)
+RESTRICTED_INSTANCES_CACHE_TIMEOUT = 3600  # seconds
+# how long to cache the preferred labels of concepts (they're also cleared, in every process, when labels change)
+# and the number of concepts (and value ids) to keep labels for in each process
+CONCEPT_PREFLABEL_CACHE_TIMEOUT = 3600  # seconds
+CONCEPT_PREFLABEL_CACHE_SIZE = 10000
 
 CANTALOUPE_DIR = os.path.join(ROOT_DIR, "uploadedfiles")
 CANTALOUPE_HTTP_ENDPOINT = "http://localhost:8182/"
@@ -0,0 +1,182 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import uuid
+import tempfile
+from django.test import TransactionTestCase
+from tests import test_settings
+from tests.base_test import ArchesTestCase
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches.app.utils.data_management.resource_graphs.importer import import_graph as ResourceGraphImporter
+from arches.app.utils.data_management.resources.importer import BusinessDataImporter, import_resource_chunk, read_jsonl_chunks
+
+# these tests can be run from the command line via
+# python manage.py test tests/importer/jsonl_import_tests.py --pattern="*.py" --settings="tests.test_settings"
+
+GRAPHID = "c9b37a14-17b3-11eb-a708-acde48001122"
+CREATION_DATE_NODEID = "c9b38568-17b3-11eb-a708-acde48001122"
+
+
+def load_graph():
+    with open(os.path.join("tests/fixtures/resource_graphs/Resource Test Model.json"), "rU") as f:
+        archesfile = JSONDeserializer().deserialize(f)
+    ResourceGraphImporter(archesfile["graph"])
+
+
+def get_line(resourceinstanceid, graphid=GRAPHID, legacyid=None, tiles=[]):
+    return json.dumps(
+        {"resourceinstance": {"resourceinstanceid": str(resourceinstanceid), "graph_id": graphid, "legacyid": legacyid}, "tiles": tiles}
+    )
+
+
+def get_date_tile(resourceinstanceid, tileid):
+    return {
+        "tileid": str(tileid),
+        "resourceinstance_id": str(resourceinstanceid),
+        "nodegroup_id": CREATION_DATE_NODEID,
+        "parenttile_id": None,
+        "data": {CREATION_DATE_NODEID: "2020-01-01"},
+    }
+
+
+def write_jsonl(test, lines):
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+        f.write("\n".join(lines) + "\n")
+    test.addCleanup(os.remove, f.name)
+    return f.name
+
+
+class JsonlImportTests(ArchesTestCase):
+    @classmethod
+    def setUpClass(cls):
+        load_graph()
+
+    @classmethod
+    def tearDownClass(cls):
+        models.GraphModel.objects.filter(pk=GRAPHID).delete()
+
+    def test_read_jsonl_chunks(self):
+        """
+        Test that a jsonl file is read in chunks of lines, skipping blank lines but keeping the line numbers
+
+        """
+
+        path = write_jsonl(self, ["a", "", "b", "c"])
+        chunks = [[(line_number, line.strip()) for line_number, line in chunk] for chunk in read_jsonl_chunks(path, chunk_size=2)]
+        self.assertEqual(chunks, [[(1, "a"), (3, "b")], [(4, "c")]])
+
+    def test_import_resource_chunk(self):
+        """
+        Test that a chunk imports new resources, updates existing ones in append mode
+        and reports lines that aren't valid json or whose resource model doesn't exist, in line order
+
+        """
+
+        existing = Resource(graph_id=GRAPHID, legacyid="jsonl-existing")
+        existing.save(index=False)
+        newid = uuid.uuid4()
+        lines = [
+            (1, get_line(newid)),
+            (2, "{not json"),
+            (3, get_line(uuid.uuid4(), graphid=str(uuid.uuid4()))),
+            (4, get_line(existing.pk, legacyid="jsonl-updated")),
+        ]
+
+        result = import_resource_chunk(lines, overwrite="append")
+
+        self.assertEqual(sorted(result["resourceids"]), sorted([str(newid), str(existing.pk)]))
+        self.assertTrue(models.ResourceInstance.objects.filter(pk=newid).exists())
+        self.assertEqual(models.ResourceInstance.objects.get(pk=existing.pk).legacyid, "jsonl-updated")
+        self.assertEqual(models.ResourceInstance.objects.filter(legacyid__in=["jsonl-existing", "jsonl-updated"]).count(), 1)
+        messages = [error["message"] for error in result["errors"]]
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith("Line 2 is not valid json"))
+        self.assertTrue(messages[1].startswith("Line 3: resource was not imported"))
+
+    def test_import_resource_chunk_bulk(self):
+        """
+        Test that new resources are only inserted with Resource.bulk_save when bulk is True,
+        otherwise each tile is saved (and its edit logged) on its own
+
+        """
+
+        for bulk, edittype in [(False, "tile create"), (True, "bulk_create")]:
+            resourceid = uuid.uuid4()
+            tileid = uuid.uuid4()
+            result = import_resource_chunk([(1, get_line(resourceid, tiles=[get_date_tile(resourceid, tileid)]))], bulk=bulk)
+
+            self.assertEqual(result["resourceids"], [str(resourceid)])
+            self.assertEqual(result["errors"], [])
+            self.assertTrue(models.TileModel.objects.filter(pk=tileid, resourceinstance_id=resourceid).exists())
+            self.assertEqual(models.EditLog.objects.filter(tileinstanceid=tileid, edittype="tile create").exists(), bulk is False)
+            self.assertTrue(models.EditLog.objects.filter(resourceinstanceid=resourceid, edittype=edittype).exists())
+
+    def test_import_jsonl(self):
+        """
+        Test that a jsonl file is imported and its errors reported,
+        multiprocessing falls back to a single process inside a transaction
+
+        """
+
+        resourceids = [uuid.uuid4() for i in range(3)]
+        path = write_jsonl(self, [get_line(resourceid) for resourceid in resourceids] + ["{not json"])
+
+        reader = BusinessDataImporter(path).import_jsonl(path, use_multiprocessing=True, prevent_indexing=True)
+
+        self.assertEqual(models.ResourceInstance.objects.filter(pk__in=resourceids).count(), 3)
+        self.assertEqual(len(reader.errors), 1)
+        self.assertTrue(reader.errors[0]["message"].startswith("Line 4 is not valid json"))
+
+
+class JsonlMultiprocessingImportTests(TransactionTestCase):
+    """
+    Worker processes only see committed data, so these tests commit their changes
+    (the data the database starts with is restored for the next test)
+
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        load_graph()
+
+    def tearDown(self):
+        models.ResourceInstance.objects.filter(graph_id=GRAPHID).delete()
+        models.GraphModel.objects.filter(pk=GRAPHID).delete()
+
+    def test_import_jsonl_with_multiprocessing(self):
+        """
+        Test that the chunks of a jsonl file are imported by a pool of processes and their errors collected in line order
+
+        """
+
+        resourceids = [uuid.uuid4() for i in range(3)]
+        lines = [get_line(resourceids[0]), "{not json", get_line(resourceids[1]), get_line(uuid.uuid4(), graphid=str(uuid.uuid4()))]
+        path = write_jsonl(self, lines + [get_line(resourceids[2])])
+
+        reader = BusinessDataImporter(path).import_jsonl(path, use_multiprocessing=True, prevent_indexing=True)
+
+        self.assertEqual(models.ResourceInstance.objects.filter(pk__in=resourceids).count(), 3)
+        messages = [error["message"] for error in reader.errors]
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith("Line 2 is not valid json"))
+        self.assertTrue(messages[1].startswith("Line 4: resource was not imported"))
@@ -20,7 +20,7 @@ from tests import test_settings
 from tests.base_test import ArchesTestCase
 from arches.app.models import models
 from arches.app.models.concept import Concept
-from arches.app.models.concept import ConceptValue
+from arches.app.models.concept import ConceptValue, get_preflabels, get_preflabels_from_valueids
 
 # these tests can be run from the command line via
 # python manage.py test tests/models/concept_model_tests.py --pattern="*.py" --settings="tests.test_settings"
@@ -163,3 +163,69 @@ class ConceptModelTests(ArchesTestCase):
         self.assertEqual(pl.type, "prefLabel")
         self.assertEqual(pl.value, "bier" or "beer")
         self.assertEqual(pl.language, "nl" or "es-SP")
+
+    def test_get_preflabels(self):
+        """
+        Test that the preferred labels of several concepts (and of the values of those concepts) are returned in the requested language
+
+        """
+
+        concepts = []
+        for name in ["one", "two"]:
+            concept = Concept()
+            concept.values = [
+                ConceptValue({"type": "prefLabel", "category": "label", "value": f"{name} en-US", "language": "en-US"}),
+                ConceptValue({"type": "prefLabel", "category": "label", "value": f"{name} es", "language": "es-SP"}),
+                ConceptValue({"type": "altLabel", "category": "label", "value": f"{name} alt", "language": "en-US"}),
+            ]
+            concept.save()
+            concepts.append(concept)
+
+        labels = get_preflabels([concept.id for concept in concepts], "es")
+        self.assertEqual(labels[concepts[0].id]["value"], "one es")
+        self.assertEqual(labels[concepts[1].id]["value"], "two es")
+
+        valueids = [concepts[0].values[2].id, "00000000-0000-0000-0000-000000000000"]
+        labels = get_preflabels_from_valueids(valueids, "en-US")
+        self.assertEqual(labels[valueids[0]]["value"], "one en-US")
+        self.assertIsNone(labels[valueids[1]])
+
+        concepts[0].values[0].value = "updated en-US"
+        concepts[0].values[0].save()
+        self.assertEqual(get_preflabels([concepts[0].id], "en-US")[concepts[0].id]["value"], "updated en-US")
+
+    def test_child_edges_from_concept_closure(self):
+        """
+        Test that the concepts below a concept are found (in order) from the concept closure as relations and labels change
+
+        """
+
+        concepts = {}
+        for name in ["parent", "beta", "alpha", "gamma"]:
+            concept = Concept()
+            concept.values = [ConceptValue({"type": "prefLabel", "category": "label", "value": name, "language": "en-US"})]
+            concept.save()
+            concepts[name] = concept
+        for conceptfrom, conceptto in [("parent", "beta"), ("parent", "alpha"), ("beta", "gamma")]:
+            models.Relation.objects.create(
+                conceptfrom_id=concepts[conceptfrom].id, conceptto_id=concepts[conceptto].id, relationtype_id="narrower"
+            )
+
+        def get_ordered_labels():
+            rows = Concept().get_child_edges(concepts["parent"].id, ["narrower"], order_hierarchically=True, languageid="en-US")
+            return [(row[0]["value"], row[1]) for row in rows]
+
+        self.assertEqual(get_ordered_labels(), [("alpha", 1), ("beta", 1), ("gamma", 2)])
+        self.assertEqual(
+            set(Concept().get_child_conceptids(concepts["parent"].id)), {concepts[name].id for name in ["alpha", "beta", "gamma"]}
+        )
+        self.assertEqual(
+            set(Concept().get_child_conceptids(concepts["parent"].id, depth_limit=1)), {concepts["alpha"].id, concepts["beta"].id}
+        )
+
+        concepts["alpha"].values[0].value = "zeta"
+        concepts["alpha"].values[0].save()
+        self.assertEqual(get_ordered_labels(), [("beta", 1), ("gamma", 2), ("zeta", 1)])
+
+        models.Relation.objects.filter(conceptfrom_id=concepts["beta"].id, conceptto_id=concepts["gamma"].id).delete()
+        self.assertEqual(get_ordered_labels(), [("beta", 1), ("zeta", 1)])
@@ -24,6 +24,7 @@ from arches.app.models import models
 from arches.app.models.graph import Graph, GraphValidationError
 from arches.app.models.card import Card
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
+from arches.app.utils.graph_schema import get_graph, get_serialized_graph
 
 # these tests can be run from the command line via
 # python manage.py test tests/models/graph_tests.py --pattern="*.py" --settings="tests.test_settings"
@@ -696,6 +697,48 @@ class GraphTests(ArchesTestCase):
         for edge_id, edge in list(graph.edges.items()):
             self.assertTrue(edge.ontologyproperty is None)
 
+    def test_get_nodegroups_with_tiles(self):
+        """
+        test that the node groups with tiles are found with one query and agree with the per card and per node checks
+
+        """
+
+        graph = Graph.objects.get(pk=self.rootNode.graph.graphid)
+        graph.append_branch("http://www.cidoc-crm.org/cidoc-crm/P1_is_identified_by", graphid=self.NODE_NODETYPE_GRAPHID)
+        graph.save()
+        self.assertEqual(graph.get_nodegroups_with_tiles(), set())
+
+        nodegroupid = [node.nodegroup_id for node in graph.nodes.values() if node.nodegroup_id is not None][0]
+        resource = models.ResourceInstance.objects.create(graph_id=graph.graphid)
+        models.TileModel.objects.create(resourceinstance=resource, nodegroup_id=nodegroupid, data={})
+
+        with self.assertNumQueries(1):
+            nodegroups_with_tiles = graph.get_nodegroups_with_tiles()
+        self.assertEqual(nodegroups_with_tiles, {str(nodegroupid)})
+        for node in graph.nodes.values():
+            self.assertEqual(node.is_editable(nodegroups_with_tiles), node.is_editable())
+        for card in graph.cards.values():
+            self.assertEqual(card.is_editable(nodegroups_with_tiles), card.is_editable())
+
+    def test_serialized_graph_cache(self):
+        """
+        test that cached graphs match the graph in the db and are replaced when the graph changes
+
+        """
+
+        graph = Graph.objects.get(pk=self.rootNode.graph.graphid)
+        graph.append_branch("http://www.cidoc-crm.org/cidoc-crm/P1_is_identified_by", graphid=self.NODE_NODETYPE_GRAPHID)
+        graph.save()
+
+        expected = JSONSerializer().serializeToPython(graph, sort_keys=False, exclude=["is_editable", "functions"])
+        self.assertEqual(get_serialized_graph(graph.graphid, exclude=["functions", "is_editable"]), expected)
+        self.assertEqual(set(get_graph(graph.graphid).nodes), set(graph.nodes))
+
+        graph.name = "RENAMED TEST GRAPH"
+        graph.save()
+        self.assertEqual(get_serialized_graph(graph.graphid, exclude=["is_editable", "functions"])["name"], "RENAMED TEST GRAPH")
+        self.assertEqual(get_graph(graph.graphid).name, "RENAMED TEST GRAPH")
+
     def test_save_and_update_dont_orphan_records_in_the_db(self):
         """
         test that the proper number of nodes, edges, nodegroups, and cards are persisted
@@ -19,18 +19,26 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import json
 import os
 import time
+import uuid
 
 from tests import test_settings
 from django.contrib.auth.models import User, Group
 from django.core import management
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test.client import Client
 from guardian.shortcuts import assign_perm, get_perms
+from arches.app.datatypes.datatypes import DataTypeFactory
 from arches.app.models import models
 from arches.app.models.resource import Resource
 from arches.app.models.tile import Tile
+from arches.app.search.mappings import RESOURCES_INDEX, RESOURCE_RELATIONS_INDEX
+from arches.app.search.search_engine_factory import SearchEngineInstance as se
 from arches.app.utils.betterJSONSerializer import JSONSerializer, JSONDeserializer
 from arches.app.utils.data_management.resource_graphs.importer import import_graph as resource_graph_importer
+from arches.app.utils.data_management.resources.formats.format import Reader as RelationImporter
 from arches.app.utils.exceptions import InvalidNodeNameException, MultipleNodesFoundException
 from arches.app.utils.index_database import index_resources_by_type
 from tests.base_test import ArchesTestCase
@@ -123,6 +131,7 @@ class ResourceTests(ArchesTestCase):
         cls.test_resource.tiles.append(tile)
 
         cls.test_resource.save()
+        cls.node_datatypes = {str(nodeid): datatype for nodeid, datatype in models.Node.objects.values_list("nodeid", "datatype")}
 
         # add delay to allow for indexes to be updated
         time.sleep(1)
@@ -205,6 +214,70 @@ class ResourceTests(ArchesTestCase):
 
         self.assertEqual(result, "Passed")
 
+    def test_reindex_by_resource_type_in_parallel_inside_transaction(self):
+        """
+        Test re-index a resource by type falls back to indexing serially inside a transaction
+        """
+
+        time.sleep(1)
+        result = index_resources_by_type(
+            [self.search_model_graphid], clear_index=True, batch_size=1, use_multiprocessing=True, max_subprocesses=2
+        )
+
+        self.assertEqual(result, "Passed")
+
+    def test_bulk_documents_match_documents(self):
+        """
+        Test the bulk document builder produces the same document as building it for a single resource
+        """
+
+        resource = Resource.objects.get(pk=self.test_resource.pk)
+        document, terms = resource.get_documents_to_index(datatype_factory=DataTypeFactory(), node_datatypes=self.node_datatypes)
+        [(bulk_document, bulk_terms)] = Resource.get_documents_to_index__bulk(
+            [resource], datatype_factory=DataTypeFactory(), node_datatypes=self.node_datatypes
+        )
+
+        for key in ("displayname", "displaydescription", "map_popup", "root_ontology_class", "permissions", "provisional_resource"):
+            self.assertEqual(document[key], bulk_document[key])
+        self.assertEqual({str(tile.tileid) for tile in document["tiles"]}, {str(tile.tileid) for tile in bulk_document["tiles"]})
+        self.assertEqual(sorted(term["_id"] for term in terms), sorted(term["_id"] for term in bulk_terms))
+
+    def test_bulk_documents_query_count(self):
+        """
+        Test building documents in bulk needs fewer queries than building them one resource at a time
+        """
+
+        resources = [Resource.objects.get(pk=self.test_resource.pk) for i in range(10)]
+        with CaptureQueriesContext(connection) as single_resource_queries:
+            for resource in resources:
+                resource.get_documents_to_index(datatype_factory=DataTypeFactory(), node_datatypes=self.node_datatypes)
+        with CaptureQueriesContext(connection) as bulk_queries:
+            Resource.get_documents_to_index__bulk(resources, datatype_factory=DataTypeFactory(), node_datatypes=self.node_datatypes)
+
+        self.assertLess(len(bulk_queries), len(single_resource_queries))
+
+    def test_index_tile(self):
+        """
+        Test saving a tile replaces only the index entries that belong to that tile
+        """
+
+        resource = Resource(graph_id=self.search_model_graphid)
+        name_tile = Tile(data={self.search_model_name_nodeid: "Incremental Name"}, nodegroup_id=self.search_model_name_nodeid)
+        date_tile = Tile(data={self.search_model_creation_date_nodeid: "1941-01-01"}, nodegroup_id=self.search_model_creation_date_nodeid)
+        resource.tiles = [name_tile, date_tile]
+        resource.save()
+
+        name_tile = Tile.objects.get(pk=name_tile.tileid)
+        name_tile.data[self.search_model_name_nodeid] = "Updated Name"
+        name_tile.save()
+
+        document = se.search(index=RESOURCES_INDEX, id=str(resource.pk))["_source"]
+        strings = [string["string"] for string in document["strings"]]
+        self.assertIn("Updated Name", strings)
+        self.assertNotIn("Incremental Name", strings)
+        self.assertEqual(len(document["dates"]), 1)
+        self.assertEqual(len(document["tiles"]), 2)
+
     def test_creator_has_permissions(self):
         """
         Test user that created instance has full permissions
@@ -218,3 +291,99 @@ class ResourceTests(ArchesTestCase):
         test_resource.save(user=user)
         perms = set(get_perms(user, test_resource))
         self.assertEqual(perms, {"view_resourceinstance", "change_resourceinstance", "delete_resourceinstance"})
+
+    def test_related_resource_relation_counts(self):
+        """
+        Test that the relations of each related resource are counted once, including a relation of a resource to itself
+
+        """
+
+        resource = Resource(graph_id=self.search_model_graphid)
+        resource.save()
+        related_resource = Resource(graph_id=self.search_model_graphid)
+        related_resource.save()
+        for resourcefrom, resourceto in [(resource, related_resource), (related_resource, related_resource), (related_resource, resource)]:
+            models.ResourceXResource(resourceinstanceidfrom=resourcefrom, resourceinstanceidto=resourceto).save()
+        se.refresh(index=RESOURCE_RELATIONS_INDEX)
+
+        related_resources = resource.get_related_resources()["related_resources"]
+        self.assertEqual([related["resourceinstanceid"] for related in related_resources], [str(related_resource.pk)])
+        self.assertEqual(related_resources[0]["total_relations"], {"value": 3, "relation": "eq"})
+
+    def test_import_relations(self):
+        """
+        Test that relations are imported in bulk between resources identified by id or legacyid,
+        and that rows relating resources, tiles or nodes that don't exist are reported
+
+        """
+
+        resourcefrom = Resource(graph_id=self.search_model_graphid, legacyid="relation-test-from")
+        resourcefrom.save()
+        resourceto = Resource(graph_id=self.search_model_graphid)
+        resourceto.save()
+
+        def get_row(resourceinstanceidfrom, resourceinstanceidto, tileid=""):
+            return {
+                "resourceinstanceidfrom": resourceinstanceidfrom,
+                "resourceinstanceidto": resourceinstanceidto,
+                "tileid": tileid,
+                "relationshiptype": "",
+                "datestarted": "",
+                "dateended": "",
+                "notes": "",
+            }
+
+        importer = RelationImporter()
+        importer.import_relations(
+            [
+                get_row("relation-test-from", str(resourceto.pk)),
+                get_row(str(resourceto.pk), str(resourcefrom.pk)),
+                get_row("missing-legacyid", str(resourceto.pk)),
+                get_row(str(resourcefrom.pk), str(resourcefrom.pk), tileid=str(uuid.uuid4())),
+            ],
+            batch_size=2,
+        )
+
+        relations = models.ResourceXResource.objects.filter(resourceinstanceidfrom__in=[resourcefrom.pk, resourceto.pk])
+        self.assertEqual(relations.count(), 2)
+        for relation in relations:
+            self.assertEqual(str(relation.resourceinstancefrom_graphid_id), self.search_model_graphid)
+            self.assertEqual(str(relation.resourceinstanceto_graphid_id), self.search_model_graphid)
+        self.assertEqual(len(importer.errors), 2)
+        self.assertTrue(importer.errors[1]["message"].startswith("Row 5: relation not created, tileid"))
+
+
+class ResourceParallelIndexTests(TransactionTestCase):
+    """
+    Worker processes only see committed resources, so these tests commit their changes
+    (the data the database starts with is restored for the next test)
+
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        with open(os.path.join("tests/fixtures/resource_graphs/Resource Test Model.json"), "rU") as f:
+            archesfile = JSONDeserializer().deserialize(f)
+        resource_graph_importer(archesfile["graph"])
+
+        self.search_model_graphid = "c9b37a14-17b3-11eb-a708-acde48001122"
+        self.resources = [Resource(graph_id=self.search_model_graphid) for i in range(3)]
+        for resource in self.resources:
+            resource.save()
+
+    def tearDown(self):
+        for resource in self.resources:
+            resource.delete()
+        models.GraphModel.objects.filter(pk=self.search_model_graphid).delete()
+
+    def test_reindex_by_resource_type_in_parallel(self):
+        """
+        Test re-index a resource by type using a pool of worker processes
+        """
+
+        result = index_resources_by_type(
+            [self.search_model_graphid], clear_index=True, batch_size=1, use_multiprocessing=True, max_subprocesses=2
+        )
+
+        self.assertEqual(result, "Passed")
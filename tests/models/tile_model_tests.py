@@ -23,13 +23,17 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import uuid
 from tests import test_settings
 from tests.base_test import ArchesTestCase
 from django.db import connection
 from django.core import management
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.http import HttpRequest
-from arches.app.models.tile import Tile, TileCardinalityError
+from arches.app.models import models
+from arches.app.models.tile import Tile, TileCardinalityError, TileValidationError
+from arches.app.utils.graph_schema import get_graph_schema_for_nodegroup
 
 
 # these tests can be run from the command line via
@@ -306,6 +310,132 @@ class TileTests(ArchesTestCase):
         with self.assertRaises(TileCardinalityError):
             second_tile.save(index=False, request=request)
 
+    def test_unique_constraint(self):
+        """
+        Tests that the tile is not saved if it has the same value as a tile
+        of another resource for a node that must be unique to all instances
+
+        """
+
+        nodeid = "72048cb3-adbc-11e6-9ccf-14109fd34195"
+        card = models.CardModel.objects.get(nodegroup_id=nodeid)
+        constraint = models.ConstraintModel.objects.create(card=card, uniquetoallinstances=True)
+        models.ConstraintXNode.objects.create(constraint=constraint, node_id=nodeid)
+        other_resource = models.ResourceInstance.objects.create(graph_id="2f7f8e40-adbc-11e6-ac7f-14109fd34195")
+
+        request = HttpRequest()
+        request.user = User.objects.get(username="admin")
+        first_tile = Tile(
+            {
+                "resourceinstance_id": "40000000-0000-0000-0000-000000000000",
+                "parenttile_id": "",
+                "nodegroup_id": nodeid,
+                "tileid": "",
+                "data": {nodeid: "UNIQUE"},
+            }
+        )
+        first_tile.save(index=False, request=request)
+
+        second_tile = Tile(
+            {
+                "resourceinstance_id": str(other_resource.pk),
+                "parenttile_id": "",
+                "nodegroup_id": nodeid,
+                "tileid": "",
+                "data": {nodeid: "UNIQUE"},
+            }
+        )
+        with self.assertRaises(TileValidationError):
+            second_tile.save(index=False, request=request)
+
+        second_tile.data[nodeid] = "DIFFERENT"
+        second_tile.save(index=False, request=request)
+
+    def test_bulk_save(self):
+        """
+        Tests that many tiles can be created and updated at once and that each edit is logged
+
+        """
+
+        nodeid = "72048cb3-adbc-11e6-9ccf-14109fd34195"
+        request = HttpRequest()
+        request.user = User.objects.get(username="admin")
+        tiles = [
+            Tile(
+                {
+                    "resourceinstance_id": "40000000-0000-0000-0000-000000000000",
+                    "parenttile_id": "",
+                    "nodegroup_id": nodeid,
+                    "tileid": "",
+                    "data": {nodeid: value},
+                }
+            )
+            for value in ["TEST 1", "TEST 2"]
+        ]
+        transaction_id = uuid.uuid1()
+        Tile.bulk_save(tiles, request=request, transaction_id=transaction_id, index=False)
+        self.assertEqual(models.TileModel.objects.filter(nodegroup_id=nodeid).count(), 2)
+
+        tiles[0].data[nodeid] = "TEST 3"
+        Tile.bulk_save(tiles, request=request, transaction_id=transaction_id, index=False)
+        self.assertEqual(models.TileModel.objects.get(pk=tiles[0].tileid).data[nodeid], "TEST 3")
+        edits = models.EditLog.objects.filter(transactionid=transaction_id)
+        self.assertEqual(edits.filter(edittype="tile create").count(), 2)
+        self.assertEqual(edits.filter(edittype="tile edit").count(), 2)
+
+    def test_graph_schema_cache(self):
+        """
+        Tests that the schema used to save tiles is reused until the graph changes
+
+        """
+
+        nodeid = "72048cb3-adbc-11e6-9ccf-14109fd34195"
+        schema = get_graph_schema_for_nodegroup(nodeid)
+        self.assertIn(nodeid, schema.nodes)
+        self.assertIs(get_graph_schema_for_nodegroup(nodeid), schema)
+
+        node = models.Node.objects.get(pk=nodeid)
+        node.save()
+        self.assertIsNot(get_graph_schema_for_nodegroup(nodeid), schema)
+
+    def test_graph_schema_queries(self):
+        """
+        Tests that validating a tile again only reads the schema's version and that saving nodes in a transaction
+        only clears the schema again if it's been read since it was last cleared
+
+        """
+
+        nodeid = "72048cb3-adbc-11e6-9ccf-14109fd34195"
+        tile = Tile(
+            {
+                "resourceinstance_id": "40000000-0000-0000-0000-000000000000",
+                "parenttile_id": "",
+                "nodegroup_id": nodeid,
+                "tileid": "",
+                "data": {nodeid: "TEST 1"},
+            }
+        )
+        tile.validate()
+        with self.assertNumQueries(3):
+            for i in range(3):
+                tile.validate()
+
+        def count_version_updates(queries):
+            return len([query for query in queries if query["sql"].lstrip().startswith("INSERT INTO cache_versions")])
+
+        node = models.Node.objects.get(pk=nodeid)
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(3):
+                node.save()
+        self.assertEqual(count_version_updates(queries), 1)
+
+        schema = get_graph_schema_for_nodegroup(nodeid)
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(3):
+                node.save()
+        self.assertEqual(count_version_updates(queries), 1)
+        self.assertIsNot(get_graph_schema_for_nodegroup(nodeid), schema)
+
     def test_apply_provisional_edit(self):
         """
         Tests that provisional edit data is properly created
@@ -39,6 +39,10 @@ from arches.app.utils.permission_backend import user_can_edit_resource
 from arches.app.utils.permission_backend import user_can_read_concepts
 from arches.app.utils.permission_backend import user_has_resource_model_permissions
 from arches.app.utils.permission_backend import get_restricted_users
+from arches.app.utils.permission_backend import get_nodegroup_ids_by_perm
+from arches.app.utils.permission_backend import get_restricted_instances
+from arches.app.utils.permission_backend import has_perms
+from guardian.shortcuts import get_objects_for_user
 
 # these tests can be run from the command line via
 # python manage.py test tests/permissions/permission_tests.py --pattern="*.py" --settings="tests.test_settings"
@@ -154,3 +158,84 @@ class PermissionTests(ArchesTestCase):
         ]
 
         self.assertTrue(all(results) is True)
+
+    def test_get_nodegroup_ids_by_perm(self):
+        """
+        Tests that node group permissions from the permission snapshot match those found by guardian
+
+        """
+
+        resource = ResourceInstance.objects.get(resourceinstanceid=self.resource_instance_id)
+        nodegroups = [node.nodegroup for node in Node.objects.filter(graph_id=resource.graph_id) if node.nodegroup]
+        assign_perm("no_access_to_nodegroup", self.group, nodegroups[0])
+        assign_perm("read_nodegroup", User.objects.get(username="jim"), nodegroups[-1])
+
+        all_perms = ["models.read_nodegroup", "models.write_nodegroup", "models.delete_nodegroup", "models.no_access_to_nodegroup"]
+        for user in User.objects.filter(username__in=["ben", "jim", "sam", "admin"]):
+            for perm in ["models.read_nodegroup", "models.write_nodegroup", "models.delete_nodegroup"]:
+                A = set(get_objects_for_user(user, all_perms, accept_global_perms=False, any_perm=True))
+                B = set(get_objects_for_user(user, perm, accept_global_perms=False))
+                C = set(get_objects_for_user(user, perm, accept_global_perms=True))
+                expected = {str(nodegroup.pk) for nodegroup in C - A | B}
+                self.assertEqual(get_nodegroup_ids_by_perm(user, perm), expected)
+
+        self.assertNotIn(str(nodegroups[0].pk), get_nodegroup_ids_by_perm(self.user, "models.read_nodegroup"))
+
+    def test_has_perms(self):
+        """
+        Tests that node group permissions checked in bulk match those checked one at a time,
+        and that permissions memoised on a user are reloaded when they change
+
+        """
+
+        resource = ResourceInstance.objects.get(resourceinstanceid=self.resource_instance_id)
+        nodegroups = [node.nodegroup for node in Node.objects.filter(graph_id=resource.graph_id) if node.nodegroup]
+        self.assertTrue(has_perms(self.user, "read_nodegroup", nodegroups[:1])[0])
+
+        assign_perm("no_access_to_nodegroup", self.group, nodegroups[0])
+        assign_perm("read_nodegroup", User.objects.get(username="jim"), nodegroups[-1])
+        self.assertFalse(has_perms(self.user, "read_nodegroup", nodegroups[:1])[0])
+
+        def get_expected_perm(user, perm, nodegroup):
+            # permissions assigned on the node group take precedence over those of the user's groups
+            if user.is_active and user.is_superuser:
+                return True
+            explicit = get_perms(user, nodegroup)
+            if len(explicit) > 0:
+                return "no_access_to_nodegroup" not in explicit and perm in explicit
+            return any(perm in permission.codename for group in user.groups.all() for permission in group.permissions.all())
+
+        for user in User.objects.filter(username__in=["ben", "jim", "sam", "admin"]):
+            for perm in ["read_nodegroup", "write_nodegroup", "delete_nodegroup"]:
+                expected = [get_expected_perm(user, perm, nodegroup) for nodegroup in nodegroups]
+                self.assertEqual(has_perms(user, perm, nodegroups), expected)
+                self.assertEqual(has_perms(user, perm, [nodegroup.pk for nodegroup in nodegroups]), expected)
+
+        # a node group denied to one of the user's groups stays denied even with permissions assigned to the user
+        user = User.objects.get(username="ben")
+        assign_perm("read_nodegroup", user, nodegroups[0])
+        assign_perm("write_nodegroup", user, nodegroups[0])
+        for perm in ["read_nodegroup", "write_nodegroup", "delete_nodegroup"]:
+            self.assertFalse(get_expected_perm(user, perm, nodegroups[0]))
+            self.assertFalse(has_perms(user, perm, nodegroups[:1])[0])
+            self.assertFalse(user.has_perm(f"models.{perm}", nodegroups[0]))
+
+        # inactive superusers have no more permissions than any other inactive user
+        admin = User.objects.get(username="admin")
+        admin.is_active = False
+        admin.save()
+        admin = User.objects.get(username="admin")
+        for perm in ["read_nodegroup", "write_nodegroup", "delete_nodegroup"]:
+            self.assertFalse(any(has_perms(admin, perm, nodegroups)))
+            self.assertFalse(admin.has_perm(f"models.{perm}", nodegroups[0]))
+
+    def test_get_restricted_instances(self):
+        """
+        Tests that all resource instances restricted for a user or group are found
+
+        """
+
+        resource = ResourceInstance.objects.get(resourceinstanceid=self.resource_instance_id)
+        self.assertNotIn(self.resource_instance_id, get_restricted_instances(self.user, allresources=True))
+        assign_perm("no_access_to_resourceinstance", self.group, resource)
+        self.assertIn(self.resource_instance_id, get_restricted_instances(self.user, allresources=True))
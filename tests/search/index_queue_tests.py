@@ -0,0 +1,119 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+from unittest import mock
+from tests import test_settings
+from tests.base_test import ArchesTestCase
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.search import index_queue
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches.app.utils.data_management.resource_graphs.importer import import_graph as resource_graph_importer
+
+# these tests can be run from the command line via
+# python manage.py test tests/search/index_queue_tests.py --pattern="*.py" --settings="tests.test_settings"
+
+
+class IndexQueueTests(ArchesTestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join("tests/fixtures/resource_graphs/Resource Test Model.json"), "rU") as f:
+            archesfile = JSONDeserializer().deserialize(f)
+        resource_graph_importer(archesfile["graph"])
+        cls.graphid = "c9b37a14-17b3-11eb-a708-acde48001122"
+
+    @classmethod
+    def tearDownClass(cls):
+        models.GraphModel.objects.filter(pk=cls.graphid).delete()
+
+    def setUp(self):
+        models.ResourceIndexQueue.objects.all().delete()
+        self.resources = [Resource(graph_id=self.graphid) for i in range(2)]
+        for resource in self.resources:
+            resource.save(index=False)
+        # the first resource is edited twice before the queue is processed
+        index_queue.enqueue(self.resources[0].pk)
+        index_queue.enqueue([self.resources[0].pk, self.resources[1].pk])
+
+    def test_enqueue(self):
+        """
+        Test that each edit adds a row to the queue and that the stats count the distinct resources waiting
+
+        """
+
+        queued = models.ResourceIndexQueue.objects.values_list("resourceinstanceid", flat=True)
+        self.assertEqual(sorted(queued), sorted([self.resources[0].pk, self.resources[0].pk, self.resources[1].pk]))
+
+        stats = index_queue.get_queue_stats()
+        self.assertEqual(stats["depth"], 3)
+        self.assertEqual(stats["resources"], 2)
+        self.assertGreaterEqual(stats["lag"], 0)
+
+    def test_process_queue(self):
+        """
+        Test that queued edits are coalesced so each resource is indexed once per batch, and that processed rows are removed
+
+        """
+
+        with mock.patch("arches.app.search.index_queue.index_resources") as index_resources:
+            self.assertEqual(index_queue.process_queue(batch_size=10), 2)
+
+        index_resources.assert_called_once()
+        self.assertEqual(sorted(index_resources.call_args[0][0]), sorted(str(resource.pk) for resource in self.resources))
+        self.assertFalse(models.ResourceIndexQueue.objects.exists())
+        self.assertEqual(index_queue.get_queue_stats(), {"depth": 0, "resources": 0, "lag": 0})
+
+    def test_process_queue_in_batches(self):
+        """
+        Test that the queue is processed one batch of rows at a time until it's empty
+
+        """
+
+        with mock.patch("arches.app.search.index_queue.index_resources") as index_resources:
+            self.assertEqual(index_queue.process_queue(batch_size=2), 2)
+
+        batches = [call[0][0] for call in index_resources.call_args_list]
+        self.assertEqual(batches, [[str(self.resources[0].pk)], [str(self.resources[1].pk)]])
+        self.assertFalse(models.ResourceIndexQueue.objects.exists())
+
+    def test_failed_batch_is_retained(self):
+        """
+        Test that rows of a batch that couldn't be indexed stay in the queue to be retried
+
+        """
+
+        with mock.patch("arches.app.search.index_queue.index_resources", side_effect=Exception("unable to index")):
+            with self.assertRaises(Exception):
+                index_queue.process_queue(batch_size=10)
+
+        self.assertEqual(models.ResourceIndexQueue.objects.count(), 3)
+        self.assertEqual(index_queue.get_queue_stats()["resources"], 2)
+
+    def test_index_resources(self):
+        """
+        Test that queued resources are indexed and that ids of resources that no longer exist are skipped
+
+        """
+
+        with mock.patch("arches.app.search.index_queue.se") as se:
+            index_queue.index_resources([str(self.resources[0].pk), "00000000-0000-0000-0000-000000000000"])
+
+        documents = se.bulk_index.call_args_list[0][0][0]
+        self.assertEqual(len(documents), 1)
+        se.create_bulk_item.assert_any_call(index=mock.ANY, id=str(self.resources[0].pk), data=mock.ANY)
@@ -19,7 +19,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import time
 import uuid
 from tests.base_test import ArchesTestCase
-from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.search.search_engine_factory import SearchEngineFactory, SearchEngineInstance
 from arches.app.search.elasticsearch_dsl_builder import Bool, Match, Query, Nested, Terms, GeoShape, Range
 
 # these tests can be run from the command line via
@@ -91,3 +91,52 @@ class SearchTests(ArchesTestCase):
 
         count_after = se.count(index="bulk")
         self.assertEqual(count_after, 1001)
+
+    def test_request_stats(self):
+        """
+        Test that requests made through the search engine are counted per index
+
+        """
+
+        se = SearchEngineFactory().create()
+        se.create_index(index="test")
+        se.reset_stats()
+        se.count(index="test")
+        se.count(index="test")
+
+        stats = se.get_stats()
+        self.assertEqual(stats[se._add_prefix("test")]["requests"], 2)
+        self.assertEqual(stats[se._add_prefix("test")]["errors"], 0)
+
+    def test_shared_search_engine(self):
+        """
+        Test that the shared search engine reuses one client within a process
+
+        """
+
+        self.assertIs(SearchEngineInstance.get_engine(), SearchEngineInstance.get_engine())
+        self.assertIs(SearchEngineInstance.es, SearchEngineInstance.get_engine().es)
+
+    def test_msearch(self):
+        """
+        Test performing several searches in a single request
+
+        """
+
+        se = SearchEngineFactory().create()
+        se.create_index(index="test")
+        for i in range(5):
+            se.index_data(index="test", body={"id": i, "type": "prefLabel", "value": "test pref label"}, idfield="id", refresh=True)
+
+        pref_label_query = Query(se, start=0, limit=10)
+        pref_label_query.add_query(Match(field="type", query="prefLabel"))
+        pref_label_query.prepare()
+        alt_label_query = Query(se, start=0, limit=10)
+        alt_label_query.add_query(Match(field="type", query="altLabel"))
+        alt_label_query.prepare()
+
+        pref_label_results, alt_label_results = se.msearch([("test", pref_label_query.dsl), ("test", alt_label_query.dsl)])
+        self.assertEqual(
+            pref_label_results["hits"]["total"]["value"], se.count(index="test", body={"query": pref_label_query.dsl["query"]})
+        )
+        self.assertEqual(alt_label_results["hits"]["total"]["value"], 0)
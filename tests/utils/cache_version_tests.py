@@ -0,0 +1,123 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm
+from tests.base_test import ArchesTestCase
+from arches.app.models import models
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches.app.utils.cache_version import get_cache_version, incr_cache_version, incr_cache_version_now_and_on_commit
+from arches.app.utils.data_management.resource_graphs.importer import import_graph as resource_graph_importer
+from arches.app.utils.graph_schema import get_graph
+from arches.app.utils.permission_backend import get_nodegroup_permissions, _get_nodegroup_permissions_cache_key
+
+# these tests can be run from the command line via
+# python manage.py test tests/utils/cache_version_tests.py --pattern="*.py" --settings="tests.test_settings"
+
+# a cache kept in the memory of each process, so a change made in one process reaches the others through the cache_versions table
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache_version_tests"}}
+GRAPHID = "c9b37a14-17b3-11eb-a708-acde48001122"
+
+
+def load_graph():
+    with open(os.path.join("tests/fixtures/resource_graphs/Resource Test Model.json"), "rU") as f:
+        archesfile = JSONDeserializer().deserialize(f)
+    resource_graph_importer(archesfile["graph"])
+
+
+class CacheVersionTests(ArchesTestCase):
+    @classmethod
+    def setUpClass(cls):
+        load_graph()
+
+    @classmethod
+    def tearDownClass(cls):
+        models.GraphModel.objects.filter(pk=GRAPHID).delete()
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_graph_cached_until_changed_in_another_process(self):
+        """
+        Test that a cached graph is reused until another process changes the graph, which increments the shared version
+
+        """
+
+        cache.clear()
+        get_graph(GRAPHID)
+        with CaptureQueriesContext(connection) as queries:
+            get_graph(GRAPHID)
+        # only the version is read
+        self.assertEqual(len(queries), 1)
+
+        version = get_cache_version("graph_schema")
+        incr_cache_version("graph_schema")
+        self.assertGreater(get_cache_version("graph_schema"), version)
+        with CaptureQueriesContext(connection) as queries:
+            graph = get_graph(GRAPHID)
+        self.assertGreater(len(queries), 1)
+        self.assertEqual(str(graph.pk), GRAPHID)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheVersionTransactionTests(TransactionTestCase):
+    """
+    Versions are incremented again when changes are committed, so these tests commit their changes
+    (the data the database starts with is restored for the next test)
+
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+
+    def test_incr_cache_version_now_and_on_commit(self):
+        """
+        Test that the version is incremented inside the transaction and again once it's committed
+
+        """
+
+        version = get_cache_version("cache_version_test")
+        with transaction.atomic():
+            incr_cache_version_now_and_on_commit("cache_version_test")
+            in_transaction_version = get_cache_version("cache_version_test")
+            self.assertGreater(in_transaction_version, version)
+        self.assertGreater(get_cache_version("cache_version_test"), in_transaction_version)
+
+    def test_nodegroup_permissions_cleared_in_other_processes(self):
+        """
+        Test that a permission change moves every process on to a new cache key for node group permissions,
+        so snapshots cached (by this or any other process) before the change aren't used
+
+        """
+
+        user = User.objects.create_user("cache_version_test", "cache_version_test@archesproject.org", "test")
+        nodegroup = models.NodeGroup.objects.first()
+        snapshot = get_nodegroup_permissions(user)
+        key = _get_nodegroup_permissions_cache_key(user)
+        self.assertEqual(cache.get(key), snapshot)
+
+        assign_perm("read_nodegroup", user, nodegroup)
+
+        user = User.objects.get(pk=user.pk)
+        self.assertNotEqual(_get_nodegroup_permissions_cache_key(user), key)
+        self.assertEqual(get_nodegroup_permissions(user)["explicit"], {str(nodegroup.pk): {"read_nodegroup"}})
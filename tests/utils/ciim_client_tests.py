@@ -0,0 +1,104 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import requests
+from unittest import mock, TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.client import RequestFactory
+from arches.app.models.system_settings import settings
+from arches.app.utils import ciim_client
+from arches.app.views import ciim
+
+# these tests can be run from the command line via
+# python manage.py test tests/utils/ciim_client_tests.py --pattern="*.py" --settings="tests.test_settings"
+
+
+def get_user(private=False):
+    user = mock.Mock(_ciim_backend=None)
+    user.groups.filter.return_value.exists.return_value = private
+    return user
+
+
+def get_session(ok=True, hits=None):
+    session = mock.Mock()
+    session.get.return_value.ok = ok
+    session.get.return_value.json.return_value = {"hits": {"total": 0, "hits": hits or []}}
+    return session
+
+
+class CiimClientTests(TestCase):
+    def setUp(self):
+        self.cache = LocMemCache("ciim_client_tests", {})
+        patcher = mock.patch("arches.app.utils.ciim_client.cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_backend(self):
+        """
+        Test that members of the private search group use the private index and that a user's groups are only queried once
+
+        """
+
+        private_user = get_user(private=True)
+        self.assertEqual(ciim_client.get_backend(private_user), ciim_client.PRIVATE)
+        self.assertEqual(ciim_client.get_backend(private_user), ciim_client.PRIVATE)
+        private_user.groups.filter.assert_called_once_with(name=settings.CIIM_PRIVATE_ES_GROUPS)
+        self.assertEqual(ciim_client.get_backend(get_user()), ciim_client.PUBLIC)
+
+    def test_search_is_cached(self):
+        """
+        Test that successful responses are cached for each backend and query, and that errors aren't cached
+
+        """
+
+        session = get_session(hits=[{"_id": "1"}])
+        query = ciim_client.get_lookup_query("a")
+        with mock.patch("arches.app.utils.ciim_client.get_session", return_value=session):
+            self.assertEqual(ciim_client.search(ciim_client.PUBLIC, query), ciim_client.search(ciim_client.PUBLIC, query))
+            self.assertEqual(session.get.call_count, 1)
+            self.assertEqual(session.get.call_args[0][0], settings.CIIM_ELASTICSEARCH_PUBLIC["url"] + "/_search")
+            self.assertEqual(json.loads(session.get.call_args[1]["data"]), query)
+
+            ciim_client.search(ciim_client.PRIVATE, query)
+            ciim_client.search(ciim_client.PUBLIC, ciim_client.get_lookup_query("b"))
+            self.assertEqual(session.get.call_count, 3)
+            self.assertEqual(session.get.call_args_list[1][0][0], settings.CIIM_ELASTICSEARCH_PRIVATE["url"] + "/_search")
+
+        failing_session = get_session(ok=False)
+        query = ciim_client.get_lookup_query("c")
+        with mock.patch("arches.app.utils.ciim_client.get_session", return_value=failing_session):
+            ciim_client.search(ciim_client.PUBLIC, query)
+            ciim_client.search(ciim_client.PUBLIC, query)
+            self.assertEqual(failing_session.get.call_count, 2)
+
+    def test_search_view_returns_502_if_index_is_unavailable(self):
+        """
+        Test that the search views respond with a 502 rather than an error if the CIIM index can't be reached
+
+        """
+
+        session = mock.Mock()
+        session.get.side_effect = requests.exceptions.ConnectionError("connection refused")
+        with mock.patch("arches.app.utils.ciim_client.get_session", return_value=session):
+            for view in (ciim.get_count, ciim.search, ciim.lookup):
+                request = RequestFactory().get("/ciim", {"uuid": "a", "page": "1"})
+                request.user = get_user()
+                response = view(request)
+                self.assertEqual(response.status_code, 502)
+                self.assertEqual(json.loads(response.content), {"error": "Unable to search the CIIM index"})
@@ -119,14 +119,12 @@ class LabelBasedGraphTests(TestCase):
         cls.node_1 = LabelBasedNode(name="node_1_val", node_id="node_1_node_id", tile_id="node_1_tile_id", value="node_1_value")
         cls.node_2 = LabelBasedNode(name="node_2_val", node_id="node_2_node_id", tile_id="node_2_tile_id", value=None)
 
-    @mock.patch("arches.app.utils.label_based_graph.models.NodeGroup")
-    def test_generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(self, mock_NodeGroup):
+    @mock.patch("arches.app.utils.label_based_graph_v2.get_graph_schema")
+    def test_generate_node_ids_to_tiles_reference_and_nodegroup_cardinality_reference(self, mock_get_graph_schema):
         mock_tile = mock.Mock(data={self.node_1.node_id: "test_val"}, nodegroup_id=self.node_1.node_id)
         mock_cardinality = "1"
 
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": mock_tile.nodegroup_id, "cardinality": mock_cardinality}
-        ]
+        mock_get_graph_schema.return_value.nodegroups = {mock_tile.nodegroup_id: mock.Mock(cardinality=mock_cardinality)}
 
         (
             node_ids_to_tiles_reference,
@@ -138,13 +136,12 @@ class LabelBasedGraphTests(TestCase):
 
     @mock.patch.object(LabelBasedGraph, "_build_graph", side_effect=None)
     def test_from_tile(self, mock__build_graph):
-        with mock.patch("arches.app.utils.label_based_graph.models.Node", return_value=None):
+        with mock.patch("arches.app.utils.label_based_graph_v2.get_graph_schema_for_nodegroup"):
             LabelBasedGraph.from_tile(tile=mock.Mock(nodegroup_id=1), node_ids_to_tiles_reference=mock.Mock())
             mock__build_graph.assert_called_once()
 
 
-@mock.patch("arches.app.utils.label_based_graph.models.NodeGroup")
-@mock.patch("arches.app.utils.label_based_graph.models.Node")
+@mock.patch("arches.app.utils.label_based_graph_v2.get_graph_schema")
 class LabelBasedGraph_FromResourceTests(TestCase):
     @classmethod
     def setUp(cls):
@@ -172,7 +169,16 @@ class LabelBasedGraph_FromResourceTests(TestCase):
         # and complex to get `displayname`
         cls.test_resource = mock.Mock(displayname="Test Resource", tiles=[])
 
-    def test_smoke(self, mock_Node, mock_NodeGroup):
+    def get_graph_schema(self, cardinalities, child_nodes={}):
+        nodes = {str(node.pk): node for node in [self.grouping_node, self.string_node]}
+        graph_schema = mock.Mock(
+            nodegroups={nodegroupid: models.NodeGroup(cardinality=value) for nodegroupid, value in cardinalities.items()}
+        )
+        graph_schema.get_node.side_effect = lambda nodeid: nodes[str(nodeid)]
+        graph_schema.get_child_nodes.side_effect = lambda nodeid: child_nodes.get(str(nodeid), [])
+        return graph_schema
+
+    def test_smoke(self, mock_get_graph_schema):
         label_based_graph = LabelBasedGraph.from_resource(resource=self.test_resource, compact=False, hide_empty_nodes=False)
 
         self.assertEqual(
@@ -188,11 +194,8 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_node_with_single_value(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.return_value = self.string_node
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.string_tile.nodegroup_id, "cardinality": "1"}
-        ]
+    def test_handles_node_with_single_value(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema({self.string_tile.nodegroup_id: "1"})
 
         self.test_resource.tiles.append(self.string_tile)
 
@@ -217,11 +220,8 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_node_with_multiple_values(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.return_value = self.string_node
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.string_tile.nodegroup_id, "cardinality": "1"}
-        ]
+    def test_handles_node_with_multiple_values(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema({self.string_tile.nodegroup_id: "1"})
 
         duplicate_node_tile = models.TileModel(data={str(self.string_node.pk): "value_2"}, nodegroup_id=str(self.string_node.pk))
 
@@ -256,11 +256,8 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_empty_semantic_node(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.return_value = self.grouping_node
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.grouping_tile.nodegroup_id, "cardinality": "1"}
-        ]
+    def test_handles_empty_semantic_node(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema({self.grouping_tile.nodegroup_id: "1"})
 
         self.test_resource.tiles.append(self.grouping_tile)
 
@@ -284,13 +281,10 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_semantic_node_with_child(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.return_value = self.grouping_node
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.grouping_tile.nodegroup_id, "cardinality": "1"}
-        ]
-
-        self.grouping_node.get_direct_child_nodes = mock.Mock(return_value=[self.string_node])
+    def test_semantic_node_with_child(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema(
+            {self.grouping_tile.nodegroup_id: "1"}, child_nodes={str(self.grouping_node.pk): [self.string_node]}
+        )
 
         self.grouping_tile.data = {str(self.string_node.pk): "value_2"}
         self.test_resource.tiles.append(self.grouping_tile)
@@ -320,14 +314,11 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_node_grouped_in_separate_card(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.side_effect = [self.grouping_node, self.string_node]
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.grouping_tile.nodegroup_id, "cardinality": "1"},
-            {"nodegroupid": self.string_tile.nodegroup_id, "cardinality": "1"},
-        ]
-
-        self.grouping_node.get_direct_child_nodes = mock.Mock(return_value=[self.string_node])
+    def test_handles_node_grouped_in_separate_card(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema(
+            {self.grouping_tile.nodegroup_id: "1", self.string_tile.nodegroup_id: "1"},
+            child_nodes={str(self.grouping_node.pk): [self.string_node]},
+        )
 
         self.string_tile.parenttile = self.grouping_tile
 
@@ -359,14 +350,11 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_node_grouped_in_separate_card_with_cardinality_n(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.side_effect = [self.grouping_node, self.string_node]
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.grouping_tile.nodegroup_id, "cardinality": "1"},
-            {"nodegroupid": self.string_tile.nodegroup_id, "cardinality": "n"},
-        ]
-
-        self.grouping_node.get_direct_child_nodes = mock.Mock(return_value=[self.string_node])
+    def test_handles_node_grouped_in_separate_card_with_cardinality_n(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema(
+            {self.grouping_tile.nodegroup_id: "1", self.string_tile.nodegroup_id: "n"},
+            child_nodes={str(self.grouping_node.pk): [self.string_node]},
+        )
 
         self.string_tile.parenttile = self.grouping_tile
 
@@ -400,14 +388,11 @@ class LabelBasedGraph_FromResourceTests(TestCase):
             },
         )
 
-    def test_handles_empty_node_grouped_in_separate_card_with_cardinality_n(self, mock_Node, mock_NodeGroup):
-        mock_Node.objects.get.side_effect = [self.grouping_node, self.string_node]
-        mock_NodeGroup.objects.filter.return_value.values.return_value = [
-            {"nodegroupid": self.grouping_tile.nodegroup_id, "cardinality": "1"},
-            {"nodegroupid": self.string_tile.nodegroup_id, "cardinality": "n"},
-        ]
-
-        self.grouping_node.get_direct_child_nodes = mock.Mock(return_value=[self.string_node])
+    def test_handles_empty_node_grouped_in_separate_card_with_cardinality_n(self, mock_get_graph_schema):
+        mock_get_graph_schema.return_value = self.get_graph_schema(
+            {self.grouping_tile.nodegroup_id: "1", self.string_tile.nodegroup_id: "n"},
+            child_nodes={str(self.grouping_node.pk): [self.string_node]},
+        )
 
         self.string_tile.parenttile = self.grouping_tile
 
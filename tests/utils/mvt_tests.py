@@ -0,0 +1,197 @@
+"""
+ARCHES - a program developed to inventory and manage immovable cultural heritage.
+Copyright (C) 2013 J. Paul Getty Trust and World Monuments Fund
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+import os
+import uuid
+import mapbox_vector_tile
+from django.contrib.gis.geos import Point, Polygon
+from tests import test_settings
+from tests.base_test import ArchesTestCase
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.models.system_settings import settings
+from arches.app.models.tile import Tile
+from arches.app.utils import mvt
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches.app.utils.data_management.resource_graphs.importer import import_graph as resource_graph_importer
+
+# these tests can be run from the command line via
+# python manage.py test tests/utils/mvt_tests.py --pattern="*.py" --settings="tests.test_settings"
+
+
+class MVTTests(ArchesTestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join("tests/fixtures/resource_graphs/Resource Test Model.json"), "rU") as f:
+            archesfile = JSONDeserializer().deserialize(f)
+        resource_graph_importer(archesfile["graph"])
+
+        cls.graphid = "c9b37a14-17b3-11eb-a708-acde48001122"
+        cls.geom_nodeid = "c9b37f96-17b3-11eb-a708-acde48001122"
+
+    @classmethod
+    def tearDownClass(cls):
+        models.GraphModel.objects.filter(pk=cls.graphid).delete()
+
+    def setUp(self):
+        self.node = models.Node.objects.get(pk=self.geom_nodeid)
+        self.fingerprint = mvt.get_permission_fingerprint([])
+        # a point at 10°E 10°N, in EPSG:3857
+        self.point = (1113194.9079327357, 1118889.9748579597)
+
+    def get_tile_coordinates(self, zoom, point=None):
+        point = self.point if point is None else point
+        half = mvt.EARTHCIRCUM / 2
+        size = mvt.EARTHCIRCUM / (1 << zoom)
+        return zoom, int(math.floor((point[0] + half) / size)), int(math.floor((half - point[1]) / size))
+
+    def get_cached_tiles(self):
+        return set(models.MVTTileCache.objects.filter(node_id=self.geom_nodeid).values_list("zoom", "x", "y"))
+
+    def test_get_tile_from_cache(self):
+        """
+        Test that cached tiles are served and that a tile leaving out other resources replaces the stale copy
+
+        """
+
+        mvt.cache_tile(self.geom_nodeid, 18, 1, 2, self.fingerprint, b"cached tile")
+        self.assertEqual(mvt.get_tile(self.node, 18, 1, 2, []), b"cached tile")
+
+        resource_ids = [str(uuid.uuid4())]
+        self.assertNotEqual(mvt.get_tile(self.node, 18, 1, 2, resource_ids), b"cached tile")
+        fingerprints = models.MVTTileCache.objects.filter(node_id=self.geom_nodeid, zoom=18, x=1, y=2).values_list("fingerprint", flat=True)
+        self.assertEqual(list(fingerprints), [mvt.get_permission_fingerprint(resource_ids)])
+
+    def test_invalidate_tiles(self):
+        """
+        Test that only the cached tiles covering an extent (and every tile at clustered zoom levels) are removed
+
+        """
+
+        zoom, x, y = self.get_tile_coordinates(18)
+        for coordinates in [(zoom, x, y), (zoom, x + 10, y), (3, 0, 0)]:
+            mvt.cache_tile(self.geom_nodeid, *coordinates, self.fingerprint, b"tile")
+
+        mvt.invalidate_tiles(self.node, self.point + self.point)
+        self.assertEqual(self.get_cached_tiles(), {(zoom, x + 10, y)})
+
+    def test_clear_and_purge_tiles(self):
+        """
+        Test that stale tiles are purged and that clearing a node removes all its tiles
+
+        """
+
+        mvt.cache_tile(self.geom_nodeid, 18, 1, 2, self.fingerprint, b"tile")
+        mvt.cache_tile(self.geom_nodeid, 18, 3, 4, mvt.get_permission_fingerprint([str(uuid.uuid4())]), b"tile")
+        self.assertEqual(mvt.purge_tiles([]), 1)
+        self.assertEqual(self.get_cached_tiles(), {(18, 1, 2)})
+
+        mvt.clear_tiles(nodeid=self.geom_nodeid)
+        self.assertEqual(self.get_cached_tiles(), set())
+
+    def test_create_tile_from_precomputed_clusters(self):
+        """
+        Test that tiles at clustered zoom levels are made from the precomputed clusters within the tile's bounds,
+        unless some resources are left out of the tile
+
+        """
+
+        models.GeoJSONGeometryCluster.objects.create(node_id=self.geom_nodeid, zoom=3, total=5, geom=Point(*self.point, srid=3857))
+        models.GeoJSONGeometryCluster.objects.create(
+            node_id=self.geom_nodeid, zoom=3, total=3, geom=Point(-self.point[0], -self.point[1], srid=3857)
+        )
+        zoom, x, y = self.get_tile_coordinates(3)
+        precomputed_clusters = settings.MVT_PRECOMPUTED_CLUSTERS
+        settings.MVT_PRECOMPUTED_CLUSTERS = True
+        try:
+            features = mapbox_vector_tile.decode(mvt.create_tile(self.node, zoom, x, y, []))[self.geom_nodeid]["features"]
+            restricted_tile = mapbox_vector_tile.decode(mvt.create_tile(self.node, zoom, x, y, [str(uuid.uuid4())]))
+        finally:
+            settings.MVT_PRECOMPUTED_CLUSTERS = precomputed_clusters
+
+        self.assertEqual([feature["properties"]["total"] for feature in features], [5])
+        self.assertNotIn(self.geom_nodeid, restricted_tile)
+
+    def test_invalidate_clusters(self):
+        """
+        Test that tiles overlapping the clusters affected by an edit are clustered on request,
+        while the precomputed clusters elsewhere are still used
+
+        """
+
+        far_point = (-self.point[0], -self.point[1])
+        for zoom, total, point, bbox in [
+            (3, 5, self.point, Point(*self.point, srid=3857)),
+            (3, 3, far_point, Point(*far_point, srid=3857)),
+            # a cluster reaching the edited point from the far point
+            (4, 4, far_point, Polygon.from_bbox(far_point + self.point)),
+        ]:
+            bbox.srid = 3857
+            models.GeoJSONGeometryCluster.objects.create(
+                node_id=self.geom_nodeid, zoom=zoom, total=total, geom=Point(*point, srid=3857), bbox=bbox
+            )
+
+        precomputed_clusters = settings.MVT_PRECOMPUTED_CLUSTERS
+        settings.MVT_PRECOMPUTED_CLUSTERS = True
+        try:
+            mvt.invalidate_clusters(self.node, self.point + self.point)
+            tiles = {
+                (zoom, point): mapbox_vector_tile.decode(mvt.create_tile(self.node, *self.get_tile_coordinates(zoom, point), []))
+                for zoom, point in [(3, self.point), (3, far_point), (4, far_point)]
+            }
+        finally:
+            settings.MVT_PRECOMPUTED_CLUSTERS = precomputed_clusters
+
+        invalidations = models.GeoJSONGeometryClusterInvalidation.objects.filter(node_id=self.geom_nodeid)
+        self.assertEqual(sorted(invalidations.values_list("zoom", flat=True)), [3, 4])
+        self.assertNotIn(self.geom_nodeid, tiles[(3, self.point)])
+        self.assertEqual([feature["properties"]["total"] for feature in tiles[(3, far_point)][self.geom_nodeid]["features"]], [3])
+        self.assertNotIn(self.geom_nodeid, tiles[(4, far_point)])
+
+    def test_delete_resource_invalidates_tiles(self):
+        """
+        Test that deleting a resource removes the cached tiles covering its geometries and marks the clusters around them out of date
+
+        """
+
+        resource = Resource(graph_id=self.graphid)
+        geom = {
+            "type": "FeatureCollection",
+            "features": [{"geometry": {"type": "Point", "coordinates": [10, 10]}, "type": "Feature", "properties": {}}],
+        }
+        resource.tiles.append(Tile(data={self.geom_nodeid: geom}, nodegroup_id=self.geom_nodeid))
+        resource.save()
+        resource.tiles[0].after_update_all()
+
+        zoom, x, y = self.get_tile_coordinates(18)
+        for coordinates in [(zoom, x, y), (zoom, x + 10, y)]:
+            mvt.cache_tile(self.geom_nodeid, *coordinates, self.fingerprint, b"tile")
+
+        models.GeoJSONGeometryCluster.objects.create(node_id=self.geom_nodeid, zoom=3, total=2, geom=Point(*self.point, srid=3857))
+
+        precomputed_clusters = settings.MVT_PRECOMPUTED_CLUSTERS
+        settings.MVT_PRECOMPUTED_CLUSTERS = True
+        try:
+            resource.delete()
+        finally:
+            settings.MVT_PRECOMPUTED_CLUSTERS = precomputed_clusters
+        self.assertEqual(self.get_cached_tiles(), {(zoom, x + 10, y)})
+        self.assertTrue(models.GeoJSONGeometryCluster.objects.filter(node_id=self.geom_nodeid).exists())
+        invalidations = models.GeoJSONGeometryClusterInvalidation.objects.filter(node_id=self.geom_nodeid, zoom=3)
+        self.assertTrue(invalidations.filter(geom__intersects=Point(*self.point, srid=3857)).exists())
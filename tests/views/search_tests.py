@@ -24,12 +24,19 @@ Replace this with more appropriate tests for your application.
 """
 
 import os
+import csv
 import json
 import time
+import uuid
+import zipfile
+from io import BytesIO, StringIO
 from tests.base_test import ArchesTestCase
 from django.urls import reverse
 from django.contrib.auth.models import User, Group
-from django.test.client import Client
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test.client import Client, RequestFactory
+from arches.app.datatypes.datatypes import DataTypeFactory
 from arches.app.models import models
 from arches.app.models.resource import Resource
 from arches.app.models.tile import Tile
@@ -39,6 +46,8 @@ from guardian.shortcuts import assign_perm
 from arches.app.search.search_engine_factory import SearchEngineFactory
 from arches.app.search.elasticsearch_dsl_builder import Query, Term
 from arches.app.search.mappings import TERMS_INDEX, CONCEPTS_INDEX, RESOURCE_RELATIONS_INDEX, RESOURCES_INDEX
+from arches.app.search.search_export import SearchResultsExporter
+from arches.app.utils import zip as zip_utils
 
 # these tests can be run from the command line via
 # python manage.py test tests/views/search_tests.py --pattern="*.py" --settings="tests.test_settings"
@@ -484,6 +493,117 @@ class SearchTests(ArchesTestCase):
         self.assertEqual(response_json["results"]["hits"]["total"]["value"], 2)
         self.assertCountEqual(extract_pks(response_json), [str(self.date_resource.pk), str(self.date_and_cultural_period_resource.pk)])
 
+    def test_search_export_pages(self):
+        """
+        Export search results fetched over several pages, every hit is exported once in resourceinstanceid order
+        and the rows are streamed to a csv file that's zipped as is
+
+        """
+
+        request = RequestFactory().get("/search/resources", {"format": "tilecsv", "reportlink": "false"})
+        request.user = User.objects.get(username="admin")
+        exporter = SearchResultsExporter(search_request=request)
+        exporter.page_size = 3
+        resourceids = sorted(
+            str(resource.pk)
+            for resource in [self.cultural_period_resource, self.date_resource, self.date_and_cultural_period_resource, self.name_resource]
+        )
+
+        self.assertEqual([hit["_source"]["resourceinstanceid"] for hit in exporter.get_search_hits()], resourceids)
+
+        export_files, export_info = exporter.export("tilecsv", "false")
+        self.assertEqual(export_info.numberofinstances, 4)
+        self.assertEqual(len(export_files), 1)
+        export_files[0]["outputfile"].seek(0)
+        self.assertEqual([row["resourceid"] for row in csv.DictReader(export_files[0]["outputfile"])], resourceids)
+
+        with zipfile.ZipFile(BytesIO(zip_utils.create_zip_file(export_files, "outputfile"))) as export_zip:
+            self.assertEqual(export_zip.namelist(), [export_files[0]["name"]])
+            rows = list(csv.DictReader(StringIO(export_zip.read(export_files[0]["name"]).decode("utf-8"))))
+        self.assertEqual([row["resourceid"] for row in rows], resourceids)
+
+    def test_search_export_geojson(self):
+        """
+        Export search results fetched over several pages as geojson, features are streamed to a file
+        as each page arrives and resources without geometries are left out
+
+        """
+
+        models.Node.objects.filter(pk__in=[self.search_model_geom_nodeid, self.search_model_name_nodeid]).update(exportable=True)
+        request = RequestFactory().get("/search/resources", {"format": "geojson", "reportlink": "false"})
+        request.user = User.objects.get(username="admin")
+        exporter = SearchResultsExporter(search_request=request)
+        exporter.page_size = 3
+
+        export_files, export_info = exporter.export("geojson", "false")
+        self.assertEqual(len(export_files), 1)
+        self.assertEqual(export_files[0]["name"], "Search Test Model.geojson")
+        export_files[0]["outputfile"].seek(0)
+        feature_collection = json.load(export_files[0]["outputfile"])
+
+        self.assertEqual(feature_collection["type"], "FeatureCollection")
+        self.assertEqual(len(feature_collection["features"]), 1)
+        feature = feature_collection["features"][0]
+        self.assertEqual(feature["geometry"], {"type": "Point", "coordinates": [0.0, 0.0]})
+        self.assertEqual(feature["properties"], {"Name": "some test name"})
+
+    def test_search_export_prefetched_display_values(self):
+        """
+        Concept and related resource display values resolved in bulk for a page of hits match those resolved one at a time,
+        and resolving them in bulk takes a fixed number of queries
+
+        """
+
+        models.Node.objects.filter(pk=self.search_model_cultural_period_nodeid).update(exportable=True)
+        valueid = str(models.Value.objects.get(concept_id=self.conceptid, valuetype_id="prefLabel").pk)
+        related_nodeid = str(uuid.uuid4())
+        related_node = models.Node(nodeid=related_nodeid, name="Related Resource", datatype="resource-instance", exportable=True)
+        related_resources = [self.date_resource, self.name_resource]
+        hits = [
+            {
+                "_source": {
+                    "tiles": [
+                        {
+                            "tileid": str(uuid.uuid4()),
+                            "resourceinstance_id": str(uuid.uuid4()),
+                            "nodegroup_id": self.search_model_cultural_period_nodeid,
+                            "parenttile_id": None,
+                            "data": {
+                                self.search_model_cultural_period_nodeid: valueid,
+                                related_nodeid: [{"resourceId": str(related_resources[i % 2].pk)}],
+                            },
+                        }
+                    ]
+                }
+            }
+            for i in range(6)
+        ]
+
+        request = RequestFactory().get("/search/resources", {"format": "tilecsv"})
+        request.user = User.objects.get(username="admin")
+        datatype_factory = DataTypeFactory()
+
+        def export_hits(prefetch):
+            exporter = SearchResultsExporter(search_request=request)
+            exporter.get_node(self.search_model_cultural_period_nodeid)
+            exporter.node_lookup[related_nodeid] = related_node
+            for datatype in ("concept", "concept-list"):
+                datatype_factory.get_instance(datatype).value_lookup.clear()
+            with CaptureQueriesContext(connection) as queries:
+                if prefetch:
+                    exporter.prefetch_display_values(hits)
+                rows = [exporter.flatten_tiles(hit["_source"]["tiles"], datatype_factory) for hit in hits]
+            return rows, len(queries)
+
+        rows, query_count = export_hits(prefetch=False)
+        prefetched_rows, prefetched_query_count = export_hits(prefetch=True)
+
+        self.assertEqual(prefetched_rows, rows)
+        self.assertEqual(prefetched_rows[0]["Cultural Period Concept"], "Mock concept")
+        self.assertEqual(prefetched_rows[0]["Related Resource"], Resource.objects.get(pk=self.date_resource.pk).displayname)
+        self.assertLessEqual(prefetched_query_count, 1)
+        self.assertGreater(query_count, len(hits))
+
 
 def extract_pks(response_json):
     return [result["_source"]["resourceinstanceid"] for result in response_json["results"]["hits"]["hits"]]